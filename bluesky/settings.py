@@ -41,12 +41,32 @@ skydt = 60.0
 # Selective snap log dt [seconds]
 selsnapdt = 5.0
 
+# Profiler log dt [seconds]
+profdt = 10.0
+
 # Prefer compiled BlueSky modules (cgeo, casas)
 prefer_compiled = True
 
 # Limit the max number of cpu nodes for parallel simulation
 max_nnodes = 999
 
+# Keep the slots of deleted aircraft in the traffic arrays, and reuse them for
+# new aircraft. When False, deleted aircraft are removed from the arrays directly
+traf_slots = False
+
+# Fraction of free slots above which the traffic arrays are compacted
+traf_compact = 0.25
+
+# Store the float state of the traffic in one contiguous 2-D block, which
+# allows a copy of the full state in one operation (see traf.snapshot())
+traf_block = False
+
+# Interval [s] and time span [s] of the in-memory state frames for REWIND,
+# and the maximum memory [MB] of the frames (the oldest frames are dropped)
+rewind_dt    = 10.0
+rewind_span  = 1800.0
+rewind_maxmb = 500.0
+
 #=========================================================================
 #=  ASAS default settings
 #=========================================================================
@@ -66,6 +86,37 @@ asas_pzh = 1000.0
 # ASAS safety margin [-]
 asas_mar = 1.05
 
+# ASAS conflict detection only for pairs that can get within the PZ within the
+# lookahead time (spatial broad phase)
+asas_broadphase = True
+
+# ASAS conflict detection checks the candidate pairs in tiles of at most this
+# number of pairs, to limit the memory use (ASAS BLOCKSIZE)
+asas_blocksize = 1000000
+
+# ASAS adaptive conflict detection: each pair is only re-checked when it can
+# get within reach, or when one of the aircraft changes intent. The pairs that
+# can get within reach within asas_dthorizon seconds are tracked.
+asas_adaptive  = False
+asas_dthorizon = 60.0
+
+# ASAS conflict detection geometry: WGS84 (bearing and distance on the WGS'84
+# earth) or FLAT (local tangent plane per pair, several times cheaper; below
+# 2 m difference for pairs within 50 nm up to 52 degrees latitude, see
+# StateBasedCD.flatqdrdist)
+asas_cdgeom = "WGS84"
+
+# Number of threads for the ASAS conflict detection, which checks the tiles of
+# candidate pairs in parallel (1: no threads)
+asas_threads = 1
+
+# ASAS resolution cache: the resolution of an aircraft is reused as long as
+# the relative position [m] and velocity [m/s] of all its intruders follow the
+# prediction from the cached state within these tolerances (ASAS RESOCACHE)
+asas_resocache      = False
+asas_resocache_dpos = 50.0
+asas_resocache_dvel = 0.5
+
 #=============================================================================
 #=   QTGL Gui specific settings below
 #=   Pygame Gui options in /data/graphics/scr_cfg.dat
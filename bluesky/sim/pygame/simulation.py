@@ -1,6 +1,6 @@
 import time
 
-from ...tools import datalog, areafilter
+from ...tools import datalog, areafilter, profiler
 from ...tools.misc import txt2tim,tim2txt
 from ...traf import Traffic
 from ... import stack
@@ -109,22 +109,28 @@ class Simulation:
             if len(self.dts) > 20:
                     del self.dts[0]
 
-            stack.checkfile(self.simt)
+            with profiler.stage("checkfile"):
+                stack.checkfile(self.simt)
 
             # Update the Mode-S beast parsing
             self.beastfeed.update()
 
         # Always process stack
-        stack.process(self, self.traf, scr)
+        with profiler.stage("stack"):
+            stack.process(self, self.traf, scr)
 
         if self.mode == Simulation.op:
-            self.traf.update(self.simt, self.dt)
+            with profiler.stage("traf"):
+                self.traf.update(self.simt, self.dt)
 
             # Update metrics
-            self.metric.update(self)
+            with profiler.stage("metric"):
+                self.metric.update(self)
 
             # Update loggers
-            datalog.postupdate()
+            profiler.postupdate()
+            with profiler.stage("datalog"):
+                datalog.postupdate()
 
         # HOLD/Pause mode
         else:
@@ -218,11 +218,23 @@ class ScreenIO(QObject):
             data.confcpalon = self.sim.traf.asas.lonowncpa
             data.trk        = self.sim.traf.hdg
 
+            # Leave out the free slots of deleted aircraft
+            if self.sim.traf.freeslots:
+                idx             = np.where(self.sim.traf.active)[0]
+                data.id         = [data.id[i] for i in idx]
+                data.iconf      = [data.iconf[i] for i in idx]
+                data.lat        = data.lat[idx]
+                data.lon        = data.lon[idx]
+                data.alt        = data.alt[idx]
+                data.tas        = data.tas[idx]
+                data.cas        = data.cas[idx]
+                data.trk        = data.trk[idx]
+
             # Conflict statistics
-            data.nconf_tot  = len(self.sim.traf.asas.conflist_all)
-            data.nlos_tot   = len(self.sim.traf.asas.LOSlist_all)
-            data.nconf_exp  = len(self.sim.traf.asas.conflist_exp)
-            data.nlos_exp   = len(self.sim.traf.asas.LOSlist_exp)
+            data.nconf_tot  = self.sim.traf.asas.nconf_tot
+            data.nlos_tot   = self.sim.traf.asas.nlos_tot
+            data.nconf_exp  = self.sim.traf.asas.nconf_exp
+            data.nlos_exp   = self.sim.traf.asas.nlos_exp
             data.nconf_cur  = len(self.sim.traf.asas.conflist_now)
             data.nlos_cur   = len(self.sim.traf.asas.LOSlist_now)
 
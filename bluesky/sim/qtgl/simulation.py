@@ -16,7 +16,7 @@ from ... import stack
 from ...traf import Metric
 from ... import settings
 from ...tools.datafeed import Modesbeast
-from ...tools import datalog, areafilter
+from ...tools import datalog, areafilter, profiler
 from ...tools.misc import txt2tim, tim2txt
 
 onedayinsec = 24 * 3600  # [s] time of one day in seconds for clock time
@@ -98,20 +98,26 @@ class Simulation(QObject):
                         self.bencht = time.time()
 
             if self.state == Simulation.op:
-                stack.checkfile(self.simt)
+                with profiler.stage("checkfile"):
+                    stack.checkfile(self.simt)
 
             # Always update stack
-            stack.process(self, self.traf, self.screenio)
+            with profiler.stage("stack"):
+                stack.process(self, self.traf, self.screenio)
 
             if self.state == Simulation.op:
 
-                self.traf.update(self.simt, self.simdt)
+                with profiler.stage("traf"):
+                    self.traf.update(self.simt, self.simdt)
 
                 # Update metrics
-                self.metric.update(self)
+                with profiler.stage("metric"):
+                    self.metric.update(self)
 
                 # Update loggers
-                datalog.postupdate()
+                profiler.postupdate()
+                with profiler.stage("datalog"):
+                    datalog.postupdate()
 
                 # Update time for the next timestep
                 self.simt += self.simdt
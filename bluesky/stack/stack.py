@@ -22,11 +22,12 @@ import os
 import os.path
 import subprocess
 
-from ..tools import geo, areafilter
+from ..tools import geo, areafilter, profiler
 from ..tools.aero import kts, ft, fpm, tas2cas, density
 from ..tools.misc import txt2alt, cmdsplit
 from ..tools.position import txt2pos, islat
 from .. import settings
+from ..traf import checkpoint
 
 # Temporary fix for synthetic
 import synthetic as syn
@@ -121,8 +122,8 @@ def init(sim, traf, scr):
             "Define experiment area (area of interest)"
         ],
         "ASAS": [
-            "ASAS ON/OFF",
-            "[onoff]",
+            "ASAS ON/OFF, ASAS BROADPHASE/ADAPTIVE/RESOCACHE ON/OFF or ASAS BLOCKSIZE npairs",
+            "[onoff/txt,txt]",
             traf.asas.toggle,
             "Airborne Separation Assurance System switch"
         ],
@@ -156,6 +157,18 @@ def init(sim, traf, scr):
             traf.asas.SetCDmethod,
             "Set conflict detection method"
         ],
+        "CDGEOM": [
+            "CDGEOM [WGS84/FLAT]",
+            "[txt]",
+            traf.asas.SetCDgeom,
+            "Set geometry of conflict detection: WGS'84 or local flat earth"
+        ],
+        "CHECKPOINT": [
+            "CHECKPOINT filename",
+            "string",
+            lambda fname: checkpoint.save(fname, sim, traf),
+            "Save the complete simulation state in a binary file"
+        ],
         "CIRCLE": [
             "CIRCLE name,lat,lon,radius,[top,bottom]",
             "txt,latlon,float,[alt,alt]",
@@ -171,7 +184,7 @@ def init(sim, traf, scr):
         "DEL": [
             "DEL acid/WIND/shape",
             "txt",
-            lambda a:   traf.delete(a)    if traf.id.count(a) > 0 \
+            lambda a:   traf.delete(a)    if traf.id2idx(a) >= 0 \
                    else traf.wind.clear() if a=="WIND" \
                    else areafilter.deleteArea(scr, a),
             "Delete command (aircraft, wind, area)"
@@ -399,6 +412,12 @@ def init(sim, traf, scr):
             traf.asas.SetPrio,
             "Define priority rules (right of way) for conflict resolution"
         ],
+        "PROFILE": [
+            "PROFILE ON/OFF/REPORT",
+            "[txt]",
+            profiler.setcmd,
+            "Measure the duration of the stages of the simulation step"
+        ],
         "QUIT": [
             "QUIT",
             "",
@@ -435,6 +454,18 @@ def init(sim, traf, scr):
             traf.asas.SetResooff,
             "Switch for conflict resolution module"
         ],
+        "RESTORE": [
+            "RESTORE filename",
+            "string",
+            lambda fname: checkpoint.load(fname, sim, traf),
+            "Restore the simulation state saved with CHECKPOINT"
+        ],
+        "REWIND": [
+            "REWIND ON/OFF [dt,span] or REWIND sec",
+            "[txt,float,float]",
+            lambda *args: traf.rewind.setcmd(sim, *args),
+            "Store the state periodically in memory, or go back sec seconds"
+        ],
         "RMETHH": [
             "RMETHH [method]",
             "[txt]",
@@ -900,6 +931,10 @@ def saveic(fname, sim, traf):
     timtxt = "00:00:00.00>"
 
     for i in range(traf.ntraf):
+        # Skip the free slots of deleted aircraft
+        if not traf.active[i]:
+            continue
+
         # CRE acid,type,lat,lon,hdg,alt,spd
         cmdline = "CRE " + traf.id[i] + "," + traf.type[i] + "," + \
                   repr(traf.lat[i]) + "," + repr(traf.lon[i]) + "," + \
@@ -998,7 +1033,7 @@ def process(sim, traf, scr):
         cmd, args = cmdsplit(line.upper(), traf.id)
         numargs   = len(args)
         # Check if this is a POS command with only an aircraft id
-        if numargs == 0 and traf.id.count(cmd) > 0:
+        if numargs == 0 and traf.id2idx(cmd) >= 0:
             args    = [cmd]
             cmd     = 'POS'
             numargs = 1
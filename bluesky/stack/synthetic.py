@@ -134,8 +134,8 @@ def process(command, numargs, cmdargs, sim, traf, scr):
                 acidh="SPH"+str(i)+"HIG"
                 traf.create(acidh,"SUPER",lat,lon,track,highalt*ft,hispd)    
                 
-                idxl = traf.id.index(acidl)
-                idxh = traf.id.index(acidh)
+                idxl = traf.id2idx(acidl)
+                idxh = traf.id2idx(acidh)
                 
                 traf.vs[idxl]=vs
                 traf.vs[idxh]=-vs                
@@ -226,7 +226,7 @@ def process(command, numargs, cmdargs, sim, traf, scr):
         floorsep=1.1 #factor of extra spacing in the floor
         hseplat=hsep/mperdeg*floorsep
         traf.create("OWNSHIP","FLOOR",-1,0,90, (20000+altdif)*ft, 200)
-        idx = traf.id.index("OWNSHIP")
+        idx = traf.id2idx("OWNSHIP")
         traf.avs[idx]=-10
         traf.aalt[idx]=20000-altdif
         for i in range(20):
@@ -33,6 +33,7 @@ a0  = sqrt(gamma*R*T0)  # sea level speed of sound ISA
 #  International Standard Atmosphere up to 22 km
 #
 #   p,rho,T = vatmos(h)    # atmos as function of geopotential altitude h [m]
+#   vatmos(h, out=(p,rho,T))  # same, written into existing arrays p, rho, T
 #   a = vvsound(h)         # speed of sound [m/s] as function of h[m]
 #   p = vpressure(h)       # calls atmos but retruns only pressure [Pa]
 #   T = vtemperature(h)    # calculates temperature [K] (saves time rel to atmos)
@@ -55,7 +56,10 @@ a0  = sqrt(gamma*R*T0)  # sea level speed of sound ISA
 # ------------------------------------------------------------------------------
 # Vectorized aero functions
 # ------------------------------------------------------------------------------
-def vatmos(alt):  # alt in m
+def vatmos(alt, out=None):  # alt in m
+    if out is not None:
+        return vatmos_inplace(alt, *out)
+
     # Temp
     T = np.maximum(288.15 - 0.0065 * alt, 216.65)
 
@@ -70,6 +74,32 @@ def vatmos(alt):  # alt in m
     return p, rho, T
 
 
+def vatmos_inplace(alt, p, rho, T):
+    # vatmos written into the arrays p, rho and T, without new arrays. The
+    # order of operations is the same, so the results are identical.
+    # Temp
+    np.multiply(0.0065, alt, out=T)
+    np.subtract(288.15, T, out=T)
+    np.maximum(T, 216.65, out=T)
+
+    # Density (p holds the stratosphere factor)
+    np.divide(T, 288.15, out=rho)
+    np.power(rho, 4.256848030018761, out=rho)
+    np.multiply(1.225, rho, out=rho)
+    np.subtract(alt, 11000., out=p)
+    np.maximum(0., p, out=p)
+    np.negative(p, out=p)
+    np.divide(p, 6341.552161, out=p)
+    np.exp(p, out=p)
+    np.multiply(rho, p, out=rho)
+
+    # Pressure
+    np.multiply(rho, R, out=p)
+    np.multiply(p, T, out=p)
+
+    return p, rho, T
+
+
 def vtemp(alt):         # hinput [m]
     # Temp
     Tstrat = np.array(len(alt) * [216.65])  # max 22 km!
@@ -154,16 +184,11 @@ def vcas2mach(cas, h):
     return M
 
 def vcasormach(spd,alt):
-    if 0.1 < spd < 2.0:
-        # Interpret spd as Mach number
-        tas = vmach2tas(spd, alt)
-        cas = vmach2cas(spd, alt)
-        m   = spd
-    else:
-        # Interpret spd as CAS
-        tas = vcas2tas(spd,alt)
-        cas = spd
-        m   = vcas2mach(spd, alt)
+    # Interpret spd as Mach number where 0.1 < spd < 2.0, otherwise as CAS
+    ismach = (0.1 < spd) * (spd < 2.0)
+    tas = np.where(ismach, vmach2tas(spd, alt), vcas2tas(spd, alt))
+    cas = np.where(ismach, vmach2cas(spd, alt), spd)
+    m   = np.where(ismach, spd, vcas2mach(spd, alt))
     return tas, cas, m
 
 
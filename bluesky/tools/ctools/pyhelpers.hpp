@@ -6,6 +6,7 @@
 template<typename T> int atype();
 template<> int atype<double>() {return NPY_DOUBLE;};
 template<> int atype<npy_bool>() {return NPY_BOOL;};
+template<> int atype<npy_intp>() {return NPY_INTP;};
 
 struct PyAttr {
     PyObject* attr;
@@ -24,6 +25,8 @@ struct PyArrayAttr: public PyAttr {
     PyArrayAttr(PyObject* attr) : PyAttr(attr) {init();}
 
     void init() {
+        ptr_start = ptr = NULL;
+        arr = NULL;
         if (attr != NULL) {
             arr = (PyArrayObject*)PyArray_FROM_OTF(attr, atype<T>(), NPY_ARRAY_IN_ARRAY);
             if (arr != NULL) {
@@ -36,12 +39,13 @@ struct PyArrayAttr: public PyAttr {
         Py_XDECREF(arr);
     }
 
-    operator bool() const {return (attr != NULL);}
+    operator bool() const {return (arr != NULL);}
     npy_intp size() const {return PyArray_SIZE(arr);}
 };
 
 typedef PyArrayAttr<double> PyDoubleArrayAttr;
 typedef PyArrayAttr<npy_bool> PyBoolArrayAttr;
+typedef PyArrayAttr<npy_intp> PyIntpArrayAttr;
 
 struct PyListAttr: public PyAttr {
     PyListAttr(int size=0) : PyAttr(PyList_New(size)) {}
@@ -217,6 +217,7 @@ class Modesbeast(TcpSocket):
 
     def remove_outdated_ac(self):
         """House keeping, remove old entries (offline > 100s)"""
+        delidx = []
         for addr, ac in self.acpool.items():
             if 'ts' in ac:
                 # threshold, remove ac after 90 seconds of no-seen
@@ -224,7 +225,10 @@ class Modesbeast(TcpSocket):
                     del self.acpool[addr]
                     # remove from sim traffic
                     if 'callsign' in ac:
-                        stack.stack('DEL %s' % ac['callsign'])
+                        idx = self.traf.id2idx(ac['callsign'])
+                        if idx >= 0:
+                            delidx.append(idx)
+        self.traf.delete_many(delidx)
         return
 
     def debug(self):
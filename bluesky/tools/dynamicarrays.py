@@ -3,6 +3,11 @@ import numpy as np
 
 defaults = {"float": 0.0, "int": 0, "bool": False, "S": "", "str": ""}
 
+# Backing storage of the arrays is reserved in chunks that grow geometrically,
+# so appending an element is amortized O(1) instead of a copy of the full array
+mincapacity  = 16   # Initial number of reserved elements per array
+growthfactor = 2    # Growth factor of the capacity when an array is full
+
 
 class RegisterElementParameters():
     """ Class to use in 'with'-syntax. This class automatically
@@ -43,8 +48,98 @@ class DynamicArrays(object):
         self.LstVars = Lsts
         self.DynArrs = DynArrs
 
-    def create(self):
-        # Append one element (aircraft) to all lists and arrays
+        # Reserved storage of the arrays, and the views on the used part of
+        # this storage that are handed out as the actual parameter arrays
+        self.Bufs    = dict()
+        self.Views   = dict()
+        self.ArrDefs = dict()
+
+        # Optional 2-D block in which all float arrays are stored as rows,
+        # see useblock()
+        self.BlockVars = []
+        self.Block     = None
+
+    def useblock(self, swblock=True):
+        # Store all float arrays as rows of one contiguous 2-D block, so the
+        # full float state can be copied or sent in one operation (snapshot).
+        # The registered arrays are views on the rows of this block.
+        if swblock:
+            self.BlockVars = [v for v in self.ArrVars
+                              if self.Vars[v].dtype == np.float64]
+        else:
+            self.BlockVars = []
+        self.Block = None
+
+        # Storage is rebuilt at the next create or delete
+        for v in self.BlockVars:
+            self.Vars[v] = np.array(self.Vars[v])
+
+    def createblock(self, n):
+        # Append n elements to the float arrays in the block
+        size = len(self.Vars[self.BlockVars[0]])
+
+        # As with the separate arrays, used storage is never overwritten. A new
+        # block is allocated when it is full, when one of its arrays was
+        # replaced by another object (e.g. traf.vs = ...), or after the last
+        # elements were removed (see deleteblock).
+        block = self.Block
+        if block is None or block.shape[1] < size + n or \
+                any(self.Vars[v] is not self.Views.get(v) for v in self.BlockVars):
+            block = np.empty((len(self.BlockVars),
+                              max(mincapacity, growthfactor * size, size + n)))
+            for i, v in enumerate(self.BlockVars):
+                block[i, :size] = self.Vars[v]
+            self.Block = block
+
+        block[:, size:size + n] = 0.0
+        for i, v in enumerate(self.BlockVars):
+            self.Views[v] = self.Vars[v] = block[i, :size + n]
+
+    def deleteblock(self, idx):
+        # Remove elements idx from the float arrays in the block
+        size = len(self.Vars[self.BlockVars[0]])
+        if not np.isscalar(idx) and len(idx) > 0 and self.Block is not None \
+                and idx[0] == size - len(idx) and idx[-1] == size - 1 and \
+                all(self.Vars[v] is self.Views.get(v) for v in self.BlockVars):
+            # Removing the last elements: shrink the views. The removed part
+            # is not reused, old references to the arrays can still see it:
+            # without registered views, the next create allocates a new block.
+            for v in self.BlockVars:
+                self.Vars[v] = self.Vars[v][:idx[0]]
+                del self.Views[v]
+            return
+
+        keep = np.ones(size, dtype=np.bool)
+        keep[idx] = False
+        newsize = np.count_nonzero(keep)
+        block = np.empty((len(self.BlockVars), max(mincapacity, newsize)))
+        for i, v in enumerate(self.BlockVars):
+            block[i, :newsize] = self.Vars[v][keep]
+        self.Block = block
+
+        for i, v in enumerate(self.BlockVars):
+            self.Views[v] = self.Vars[v] = block[i, :newsize]
+
+    def snapshot(self):
+        # Copy of the float state as a 2-D array, one row per name in BlockVars
+        if not self.BlockVars:
+            return np.empty((0, 0))
+
+        size = len(self.Vars[self.BlockVars[0]])
+        if self.Block is None:
+            snap = np.empty((len(self.BlockVars), size))
+        else:
+            snap = self.Block[:, :size].copy()
+
+        # Arrays that were replaced since the last create/delete are not in
+        # the block (anymore)
+        for i, v in enumerate(self.BlockVars):
+            if self.Vars[v] is not self.Views.get(v):
+                snap[i] = self.Vars[v]
+        return snap
+
+    def create(self, n=1):
+        # Append n elements (aircraft) to all lists and arrays
 
         for v in self.LstVars:  # Lists (mostly used for strings)
 
@@ -57,42 +152,99 @@ class DynamicArrays(object):
             else:
                 defaultvalue = ""
 
-            self.Vars[v].append(defaultvalue)
+            self.Vars[v].extend([defaultvalue] * n)
+
+        if self.BlockVars:
+            self.createblock(n)
 
         for v in self.ArrVars:  # Numpy array
-            # Get type without byte length
-            fulltype = str(self.Vars[v].dtype)
-            vartype = ""
-            for c in fulltype:
-                if not c.isdigit():
-                    vartype = vartype + c
-
-            # Get default value
-            if vartype in defaults:
-                defaultvalue = defaults[vartype]
-            else:
-                defaultvalue = 0.0
+            if v in self.BlockVars:
+                continue
+
+            arr  = self.Vars[v]
+            size = len(arr)
+
+            if arr.dtype not in self.ArrDefs:
+                # Get type without byte length
+                fulltype = str(arr.dtype)
+                vartype = ""
+                for c in fulltype:
+                    if not c.isdigit():
+                        vartype = vartype + c
+
+                # Get default value
+                if vartype in defaults:
+                    self.ArrDefs[arr.dtype] = defaults[vartype]
+                else:
+                    self.ArrDefs[arr.dtype] = 0.0
 
-            self.Vars[v] = np.append(self.Vars[v], defaultvalue)
+            # Append in the reserved storage. New storage is only allocated when
+            # it is full, when the array was replaced by another object
+            # (e.g. self.lat = ...) or after the last elements were removed
+            # (see delete). Used storage is never overwritten, because other
+            # objects can still refer to it.
+            buf = self.Bufs.get(v)
+            if arr is not self.Views.get(v) or len(buf) < size + n:
+                buf = np.empty(max(mincapacity, growthfactor * size, size + n), dtype=arr.dtype)
+                buf[:size] = arr
+                self.Bufs[v] = buf
+
+            buf[size:size + n] = self.ArrDefs[arr.dtype]
+            self.Views[v] = self.Vars[v] = buf[:size + n]
 
         for v in self.DynArrs:
             pass
-            # The dynamic arrays refer to traf.parameter[-1] in their
-            # .create functions, so first set all traf.parameter[-1]
+            # The dynamic arrays refer to traf.parameter[-n:] in their
+            # .create functions, so first set all traf.parameter[-n:]
             # to the right value and AFTER that perform create for all
             # dynamic arrays manually
 
     def delete(self, idx):
-        # Remove element (aircraft) idx from all lists and arrays
-        for v in self.LstVars:
-            del self.Vars[v][idx]
+        # Remove element (aircraft) idx from all lists and arrays. idx can also
+        # be a sorted array of indices, to remove several elements in one pass
+        if np.isscalar(idx):
+            for v in self.LstVars:
+                del self.Vars[v][idx]
+        else:
+            for v in self.LstVars:
+                for i in reversed(idx):
+                    del self.Vars[v][i]
+
+        if self.BlockVars:
+            self.deleteblock(idx)
 
         for v in self.ArrVars:
-            self.Vars[v] = np.delete(self.Vars[v], idx)
+            if v in self.BlockVars:
+                continue
+
+            arr = self.Vars[v]
+            if not np.isscalar(idx) and len(idx) > 0 and arr is self.Views.get(v) \
+                    and idx[0] == len(arr) - len(idx) and idx[-1] == len(arr) - 1:
+                # Removing the last elements: shrink the view on the reserved
+                # storage. The removed part is not reused, because old
+                # references to the array can still see it: without a
+                # registered view, the next create allocates new storage.
+                self.Vars[v] = arr[:idx[0]]
+                del self.Views[v]
+            else:
+                self.Vars[v] = np.delete(arr, idx)
 
         for v in self.DynArrs:
             self.Vars[v].delete(idx)
 
+    def moveslots(self, src, dst):
+        # Copy elements (aircraft) src to elements dst in all lists and arrays
+        for v in self.LstVars:
+            lst = self.Vars[v]
+            for s, d in zip(src, dst):
+                lst[d] = lst[s]
+
+        for v in self.ArrVars:
+            self.Vars[v][dst] = self.Vars[v][src]
+
+        for v in self.DynArrs:
+            self.Vars[v].moveslots(src, dst)
+
     def reset(self):
         # Delete all elements from arrays and start at 0 aircraft
         for v in self.LstVars:
@@ -101,5 +253,10 @@ class DynamicArrays(object):
         for v in self.ArrVars:
             self.Vars[v] = np.array([], dtype=self.Vars[v].dtype)
 
+        # Release the reserved storage
+        self.Bufs.clear()
+        self.Views.clear()
+        self.Block = None
+
         for v in self.DynArrs:
             self.Vars[v].reset()
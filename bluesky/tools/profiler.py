@@ -0,0 +1,133 @@
+""" BlueSky profiler: duration of the stages of the simulation step
+
+    The stages are timed with 'with'-syntax:
+
+        with profiler.stage('asas'):
+            traf.asas.update(simt)
+
+    PROFILE ON/OFF switches the timing on and off, PROFILE REPORT gives the
+    number of calls and the mean and 99th percentile of the duration of each
+    stage, over the last samples. The periodic logger PROFLOG writes these
+    statistics to a log file.
+"""
+from collections import OrderedDict
+from timeit import default_timer as clock   # No monotonic clock in Python 2
+import numpy as np
+import datalog
+from .. import settings
+
+# Number of samples per stage for the rolling statistics
+window = 1000
+
+# Switch for the timing of the stages
+active = False
+
+# Dict with all stages, in order of first use
+stages = OrderedDict()
+
+# Statistics that are logged by PROFLOG
+stats  = None
+
+
+class Stage(object):
+    """ Timer of one stage, to use in 'with'-syntax """
+    def __init__(self, name):
+        self.name   = name
+        self.ncalls = 0
+        self.times  = np.zeros(window)   # [s] last durations, circular
+        self.t0     = None
+
+    def __enter__(self):
+        self.t0 = clock() if active else None
+
+    def __exit__(self, type, value, tb):
+        if self.t0 is not None:
+            self.times[self.ncalls % window] = clock() - self.t0
+            self.ncalls += 1
+
+    def reset(self):
+        self.ncalls = 0
+        self.t0     = None
+
+    def samples(self):
+        return self.times[:min(self.ncalls, window)]
+
+
+class Stats(object):
+    """ Statistics of all stages, registered for the PROFLOG logger """
+    def __init__(self):
+        with datalog.registerLogParameters('PROFLOG', self):
+            self.stage  = []            # Name of the stage
+            self.ncalls = np.array([])  # Number of calls
+            self.mean   = np.array([])  # [ms] mean duration
+            self.p99    = np.array([])  # [ms] 99th percentile of duration
+
+    def update(self):
+        self.stage  = stages.keys()
+        self.ncalls = np.array([s.ncalls for s in stages.itervalues()], dtype=int)
+        self.mean   = np.array([1000.0 * s.samples().mean() if s.ncalls else 0.0
+                                for s in stages.itervalues()])
+        self.p99    = np.array([1000.0 * np.percentile(s.samples(), 99.) if s.ncalls else 0.0
+                                for s in stages.itervalues()])
+
+
+def init():
+    """ Define the PROFLOG logger. Called once, at the creation of the traffic
+        object, like the other periodic loggers. """
+    global stats
+    if stats is None:
+        stats = Stats()
+        datalog.definePeriodicLogger('PROFLOG',
+            'PROFLOG logfile: calls, mean and 99th percentile duration [ms] per stage',
+            settings.profdt)
+
+
+def stage(name):
+    """ Timer of stage name, created at first use """
+    timer = stages.get(name)
+    if timer is None:
+        timer = stages[name] = Stage(name)
+    return timer
+
+
+def reset():
+    for timer in stages.itervalues():
+        timer.reset()
+
+
+def postupdate():
+    """ Update the statistics when the PROFLOG logger is about to write """
+    logger = datalog.allloggers.get('PROFLOG')
+    if stats is not None and logger.isopen() and logger.simt >= logger.tlog:
+        stats.update()
+
+
+def report():
+    stats.update()
+    lines = ["%-10s %8s %10s %10s" % ("Stage", "Calls", "Mean [ms]", "P99 [ms]")]
+    for i in range(len(stats.stage)):
+        lines.append("%-10s %8d %10.3f %10.3f" % (stats.stage[i], stats.ncalls[i],
+                                                 stats.mean[i], stats.p99[i]))
+    return "\n".join(lines)
+
+
+def setcmd(cmd=None):
+    """ PROFILE ON/OFF/REPORT """
+    global active
+    if cmd is None:
+        return True, "PROFILE ON/OFF/REPORT\nProfiler is " + ("ON" if active else "OFF")
+
+    cmd = cmd.upper()
+    if cmd == "ON":
+        reset()
+        active = True
+    elif cmd == "OFF":
+        active = False
+    elif cmd == "REPORT":
+        if stats is None or len(stages) == 0:
+            return True, "No profile data"
+        return True, report()
+    else:
+        return False, "PROFILE ON/OFF/REPORT"
+
+    return True
@@ -19,12 +19,15 @@ class Area:
         # Taxi switch
         self.swtaxi = False  # Default OFF: Doesn't do anything. See comments of setTaxi fucntion below.
 
-    def create(self):
-        self.inside = np.append(self.inside,False)
+    def create(self, n=1):
+        self.inside = np.append(self.inside, np.zeros(n, dtype=bool))
 
     def delete(self,idx):
         self.inside = np.delete(self.inside,idx)
 
+    def moveslots(self, src, dst):
+        self.inside[dst] = self.inside[src]
+
     def check(self,t):
         # ToDo: Add autodelete for descending with swTaxi:
         if self.swtaxi:
@@ -44,8 +47,7 @@ class Area:
             self.inside = inside
             
             # delete all aicraft in delAircraftidx and log their flight statistics
-            for acid in [self.traf.id[idx] for idx in delAircraftidx]:
-                self.traf.delete(acid)
+            self.traf.delete_many(delAircraftidx)
 
     def setArea(self, scr, args):
         ''' Set Experiment Area. Aicraft leaving the experiment area are deleted.
@@ -6,6 +6,10 @@ Created on Tue Mar 03 16:50:19 2015
 """
 import numpy as np
 from ...tools.aero import vtas2eas
+from StateBasedCD import firstrecords
+
+# The resolution of an aircraft only depends on its own conflicts (see ResoCache)
+cacheable = True
 
 
 def start(dbconf):
@@ -16,27 +20,8 @@ def resolve(dbconf, traf):
     if not dbconf.swasas:
         return
 
-    # required change in velocity
-    dv = np.zeros((traf.ntraf, 3))
-
-    #if possible, solve conflicts once and copy results for symmetrical conflicts,
-    #if that is not possible, solve each conflict twice, once for each A/C
-    if not traf.ADSBtrunc and not traf.ADSBtransnoise:
-        for conflict in dbconf.conflist_now:
-            id1, id2 = dbconf.ConflictToIndices(conflict)
-            if id1 != "Fail" and id2 != "Fail":
-                dv_eby = Eby_straight(traf, dbconf, id1, id2)
-                dv[id1] -= dv_eby
-                dv[id2] += dv_eby
-    else:
-        for i in range(dbconf.nconf):
-            confpair = dbconf.confpairs[i]
-            ac1      = confpair[0]
-            ac2      = confpair[1]
-            id1      = traf.id.index(ac1)
-            id2      = traf.id.index(ac2)
-            dv_eby   = Eby_straight(dbconf, id1, id2)
-            dv[id1] -= dv_eby
+    # required change in velocity per aircraft
+    dv = resolution(dbconf, traf)
 
     # now we have the change in speed vector for each aircraft.
     dv=np.transpose(dv)
@@ -57,21 +42,50 @@ def resolve(dbconf, traf):
     neweascapped=np.maximum(dbconf.vmin,np.minimum(dbconf.vmax,neweas))
     
     # now assign in the traf class
-    dbconf.hdg=newtrack
+    dbconf.trk=newtrack
     dbconf.spd=neweascapped
     dbconf.vs=newv[2,:]
     dbconf.alt=np.sign(dbconf.vs)*1e5
     
+
+def resolution(dbconf, traf):
+    """ Required change in velocity per aircraft (ntraf x 3 array) to solve
+        all current conflicts """
+
+    #if possible, solve conflicts once and copy results for symmetrical conflicts,
+    #if that is not possible, solve each conflict twice, once for each A/C
+    #(the CD then gives (id1, id2), (id2, id1) or both, and only the first
+    #record of each pair is used)
+    symmetric = not traf.adsb.truncated and not traf.adsb.transnoise
+    k = np.arange(dbconf.nconf)
+    if symmetric:
+        k = firstrecords(dbconf.iown, dbconf.ioth, traf.ntraf)
+    id1 = dbconf.iown[k]
+    id2 = dbconf.ioth[k]
+
+    # required change in velocity, of all conflicts at once
+    dv_eby = Eby_straight(traf, dbconf, id1, id2, k)
+
+    # required change in velocity per aircraft: id1 subtracts dv_eby, id2 adds it
+    dv = np.zeros((traf.ntraf, 3))
+    if symmetric:
+        np.add.at(dv, np.column_stack((id1, id2)).ravel(),
+                  np.stack((-dv_eby, dv_eby), axis=1).reshape(-1, 3))
+    else:
+        np.add.at(dv, id1, -dv_eby)
+    return dv
+
 #=================================== Eby Method ===============================
         
     # Resolution: Eby method assuming aircraft move straight forward, solving algebraically, only horizontally
-def Eby_straight(traf, dbconf, id1, id2):
-    traf=traf
-    dist=dbconf.dist[id1,id2]
-    qdr=dbconf.qdr[id1,id2]
+def Eby_straight(traf, dbconf, id1, id2, k):
+    """ Required change in velocity of the conflicts k of the CD, between id1
+        and id2 (arrays): n x 3 array """
+    dist=dbconf.dist[k]
+    qdr=dbconf.qdr[k]
     # from degrees to radians
     qdr=np.radians(qdr)
-    # relative position vector
+    # relative position vectors (3 x n)
     d=np.array([np.sin(qdr)*dist, \
         np.cos(qdr)*dist, \
         traf.alt[id2]-traf.alt[id1] ])
@@ -100,9 +114,9 @@ def Eby_straight(traf, dbconf, id1, id2):
     """
     # These terms are used to construct a,b,c of the quadratic formula
     R2=dbconf.Rm**2 # in meters
-    d2=np.dot(d,d) # distance vector length squared
-    v2=np.dot(v,v) # velocity vector length squared
-    dv=np.dot(d,v) # dot product of distance and velocity
+    d2=np.einsum('ij,ij->j',d,d) # distance vector length squared
+    v2=np.einsum('ij,ij->j',v,v) # velocity vector length squared
+    dv=np.einsum('ij,ij->j',d,v) # dot product of distance and velocity
     
     # Solving the quadratic formula
     a=R2*v2 - dv**2
@@ -110,29 +124,30 @@ def Eby_straight(traf, dbconf, id1, id2):
     c=R2*d2 - d2**2
     discrim=b**2 - 4*a*c
     
-    if discrim<0: # if the discriminant is negative, we're done as taking the square root will result in an error
-        discrim=0
+    # if the discriminant is negative, take zero, as taking the square root will result in an error
+    discrim=np.maximum(discrim,0)
     time1=(-b+np.sqrt(discrim))/(2*a)
     time2=(-b-np.sqrt(discrim))/(2*a)
 
     #time when the size of the conflict is largest relative to time to solve
-    tstar=min(abs(time1),abs(time2))
+    tstar=np.minimum(abs(time1),abs(time2))
 
     #find drel and absolute distance at tstar
     drelstar=d+v*tstar
-    dstarabs=np.linalg.norm(drelstar)
+    dstarabs=np.sqrt(np.einsum('ij,ij->j',drelstar,drelstar))
     #exception: if the two aircraft are on exact collision course 
     #(passing eachother within 10 meter), change drelstar
     exactcourse=10 #10 meter
     dif=exactcourse-dstarabs
-    if dif>0:
-        vperp=np.array([-v[1],v[0],0]) #rotate velocity 90 degrees in horizontal plane
-        drelstar+=dif*vperp/np.linalg.norm(vperp) #normalize to 10 m and add to drelstar
-        dstarabs=np.linalg.norm(drelstar)
+    exact=np.where(dif>0)[0]
+    if len(exact)>0:
+        vperp=np.array([-v[1,exact],v[0,exact],np.zeros(len(exact))]) #rotate velocity 90 degrees in horizontal plane
+        drelstar[:,exact]+=dif[exact]*vperp/np.sqrt(np.einsum('ij,ij->j',vperp,vperp)) #normalize to 10 m and add to drelstar
+        dstarabs[exact]=np.sqrt(np.einsum('ij,ij->j',drelstar[:,exact],drelstar[:,exact]))
         
     #intrusion at tstar
     i=dbconf.Rm-dstarabs
 
     #desired change in the plane's speed vector:
     dv=i*drelstar/(dstarabs*tstar)
-    return dv
\ No newline at end of file
+    return dv.T
@@ -6,6 +6,11 @@ Created on Tue Mar 03 16:50:19 2015
 """
 import numpy as np
 from ...tools.aero import ft
+import PrioRules
+from StateBasedCD import firstrecords
+
+# The resolution of an aircraft only depends on its own conflicts (see ResoCache)
+cacheable = True
 
 
 def start(dbconf):
@@ -18,77 +23,52 @@ def resolve(dbconf, traf):
     if not dbconf.swasas:
         return
 
-    # Initialize an array to store the resolution velocity vector for all A/C
-    dv = np.zeros((traf.ntraf,3)) 
-
-    # If possible, solve conflicts once and copy results for symmetrical conflicts
+    # Conflicts to resolve, as records of the CD, with own aircraft id1 and
+    # intruder id2.
+    # If possible, solve conflicts once and copy results for symmetrical conflicts:
+    # the CD then gives (id1, id2), (id2, id1) or both, and only the first
+    # record of each pair is used.
     # If that is not possible, solve each conflict twice, once for each A/C
-    if not traf.adsb.truncated and not traf.adsb.transnoise:
-        for conflict in dbconf.conflist_now:
-            
-            # Determine ac indexes from callsigns
-            ac1, ac2 = conflict.split(" ")
-            id1, id2 = traf.id2idx(ac1), traf.id2idx(ac2)
-            
-            # If A/C indexes are found, then apply MVP on this conflict pair
-            # Then use the MVP computed resolution to subtract and add dv_mvp 
-            # to id1 and id2, respectively
-            if id1 > -1 and id2 > -1:
-                dv_mvp = MVP(traf, dbconf, id1, id2)
-                
-                # Use priority rules if activated
-                if dbconf.swprio:
-                    dv[id1],dv[id2] = prioRules(traf, dbconf.priocode, dv_mvp, dv[id1], dv[id2], id1, id2)
-                else:
-                    dv[id1] = dv[id1] - dv_mvp
-                    dv[id2] = dv[id2] + dv_mvp 
-                
-                # Check the noreso aircraft. Nobody avoids noreso aircraft. 
-                # But noreso aircraft will avoid other aircraft
-                if dbconf.swnoreso:
-                    if ac1 in dbconf.noresolst: # -> Then id2 does not avoid id1. 
-                        dv[id2] = dv[id2] - dv_mvp
-                    if ac2 in dbconf.noresolst: # -> Then id1 does not avoid id2. 
-                        dv[id1] = dv[id1] + dv_mvp
-                
-                # Check the resooff aircraft. These aircraft will not do resolutions.
-                if dbconf.swresooff:
-                    if ac1 in dbconf.resoofflst: # -> Then id1 does not do any resolutions
-                        dv[id1] = 0.0
-                    if ac2 in dbconf.resoofflst: # -> Then id2 does not do any resolutions
-                        dv[id2] = 0.0    
-                    
-                                                               
+    symmetric = not traf.adsb.truncated and not traf.adsb.transnoise
+    k = np.arange(dbconf.nconf)
+    if symmetric:
+        k = firstrecords(dbconf.iown, dbconf.ioth, traf.ntraf)
+    id1 = dbconf.iown[k]
+    id2 = dbconf.ioth[k]
+
+    # MVP resolution of all conflicts: id1 has to subtract dv_mvp, and id2
+    # to add it
+    dv_mvp = MVP(traf, dbconf, id1, id2, k)
+
+    # Contributions of each conflict to the resolution of both aircraft,
+    # using priority rules if activated
+    if dbconf.swprio:
+        dv1, dv2 = PrioRules.apply(traf, dbconf.priocode, dv_mvp, id1, id2)
+    else:
+        dv1, dv2 = -dv_mvp, dv_mvp
+
+    # Check the noreso aircraft. Nobody avoids noreso aircraft.
+    # But noreso aircraft will avoid other aircraft. The MVP resolution is
+    # taken back after the priority rules, as in the per-conflict version.
+    if dbconf.swnoreso:
+        noreso = listed(traf, dbconf.noresolst)
+        dv1 = dv1 + dv_mvp * noreso[id2].reshape(-1, 1)  # -> id1 does not avoid id2
+        dv2 = dv2 - dv_mvp * noreso[id1].reshape(-1, 1)  # -> id2 does not avoid id1
+
+    # Initialize an array to store the resolution velocity vector for all A/C,
+    # and add the contributions of all conflicts, in order of the conflicts
+    dv = np.zeros((traf.ntraf, 3))
+    if symmetric:
+        np.add.at(dv, np.column_stack((id1, id2)).ravel(),
+                  np.stack((dv1, dv2), axis=1).reshape(-1, 3))
     else:
-        for i in range(dbconf.nconf):
-            confpair = dbconf.confpairs[i]
-            ac1      = confpair[0]
-            ac2      = confpair[1]
-            id1      = traf.id.index(ac1)
-            id2      = traf.id.index(ac2)
-            
-            # If A/C indexes are found, then apply MVP on this conflict pair
-            # Because ADSB is ON, this is done for each aircraft separately
-            if id1 >-1 and id2 > -1:
-                dv_mvp   = MVP(traf, dbconf, id1, id2)
-                
-                # Use priority rules if activated
-                if dbconf.swprio:
-                   dv[id1], foobar = prioRules(traf, dbconf.priocode, dv_mvp, dv[id1], dv[id2], id1, id2) 
-                else:
-                   dv[id1]  = dv[id1] - dv_mvp
-                   
-                # Check the noreso aircraft. Nobody avoids noreso aircraft. 
-                # But noreso aircraft will avoid other aircraft
-                if dbconf.swnoreso:
-                    if ac2 in dbconf.noresolst: # -> Then id1 does not avoid id2. 
-                        dv[id1] = dv[id1] + dv_mvp
-                
-                # Check the resooff aircraft. These aircraft will not do resolutions.
-                if dbconf.swresooff:
-                    if ac1 in dbconf.resoofflst: # -> Then id1 does not do any resolutions
-                        dv[id1] = 0.0                
-                
+        np.add.at(dv, id1, dv1)
+
+    # Check the resooff aircraft. These aircraft will not do resolutions.
+    # Every conflict of such an aircraft used to reset its dv after adding
+    # its contribution, which leaves the same zero as resetting it once here.
+    if dbconf.swresooff:
+        dv[listed(traf, dbconf.resoofflst)] = 0.0
 
     # Now we have the resolution velocity vector for all A/C, cartesian coordinates
     dv = np.transpose(dv)
@@ -103,7 +83,7 @@ def resolve(dbconf, traf):
     # direction: horizontal or vertical or horizontal+vertical
     if dbconf.swresohoriz: # horizontal resolutions
         if dbconf.swresospd and not dbconf.swresohdg: # SPD only
-            newtrack = traf.trk
+            newtrack = np.copy(traf.trk)
             newgs    = np.sqrt(newv[0,:]**2 + newv[1,:]**2)            
             newvs    = traf.vs           
         elif dbconf.swresohdg and not dbconf.swresospd: # HDG only
@@ -115,7 +95,7 @@ def resolve(dbconf, traf):
             newgs    = np.sqrt(newv[0,:]**2 + newv[1,:]**2)
             newvs    = traf.vs 
     elif dbconf.swresovert: # vertical resolutions
-        newtrack = traf.trk
+        newtrack = np.copy(traf.trk)
         newgs    = traf.gs
         newvs    = newv[2,:]       
     else: # horizontal + vertical
@@ -139,8 +119,8 @@ def resolve(dbconf, traf):
     # time. Therefore, asasalt should only be updated for those aircraft that have a 
     # tinconf that is between 0 and the lookahead time (i.e., for the ones that are 
     # in conflict). This is what the following code does:
-    altCondition = dbconf.tinconf.min(axis=1) < dbconf.dtlookahead
-    asasalttemp  = dbconf.vs*dbconf.tinconf.min(axis=1) + traf.alt
+    altCondition = dbconf.tinconfmin < dbconf.dtlookahead
+    asasalttemp  = dbconf.vs*dbconf.tinconfmin + traf.alt
     dbconf.alt[altCondition] = asasalttemp[altCondition]
     
     # If resolutions are limited in the horizontal direction, then asasalt should
@@ -150,155 +130,88 @@ def resolve(dbconf, traf):
     dbconf.alt = dbconf.alt*(1-dbconf.swresohoriz) + traf.apalt*dbconf.swresohoriz
     
            
+def listed(traf, acids):
+    """ Whether each aircraft is in the list of aircraft ids acids """
+    swlisted = np.zeros(traf.ntraf, dtype=bool)
+    idx = [traf.idmap[acid] for acid in acids if acid in traf.idmap]
+    swlisted[idx] = True
+    return swlisted
+
+
 #=================================== Modified Voltage Potential ===============
-           
 
-def MVP(traf, dbconf, id1, id2):
-    """Modified Voltage Potential (MVP) resolution method"""
-    
+
+def MVP(traf, dbconf, id1, id2, k):
+    """Modified Voltage Potential (MVP) resolution method, for the conflicts
+       k between id1 and id2 (arrays). Returns the resolution velocity
+       vector dv_mvp of each conflict (n x 3 array)"""
+
     # Get distance and qdr between id1 and id2
-    dist = dbconf.dist[id1,id2]
-    qdr  = dbconf.qdr[id1,id2]
-    
+    dist = dbconf.dist[k]
+    qdr  = dbconf.qdr[k]
+
     # Convert qdr from degrees to radians
     qdr = np.radians(qdr)
-   
+
     # Relative position vector between id1 and id2
     drel = np.array([np.sin(qdr)*dist, \
                 np.cos(qdr)*dist, \
                 traf.alt[id2]-traf.alt[id1]])
-       
-    # Write velocities as vectors and find relative velocity vector              
+
+    # Write velocities as vectors and find relative velocity vector
     v1 = np.array([traf.gseast[id1], traf.gsnorth[id1], traf.vs[id1]])
     v2 = np.array([traf.gseast[id2], traf.gsnorth[id2], traf.vs[id2]])
-    vrel = np.array(v2-v1) 
-    
+    vrel = np.array(v2-v1)
+
     # Find tcpa (or should it be tinconf, since tinconf decided whether its a conflict?)
-    tcpa = dbconf.tcpa[id1,id2] # dbconf.tinconf[id1,id2]
-    
+    tcpa = dbconf.tcpa[k] # dbconf.tinconf[k]
+
     # Find horizontal and vertical distances at the tcpa
     dcpa  = drel + vrel*tcpa
     dabsH = np.sqrt(dcpa[0]*dcpa[0]+dcpa[1]*dcpa[1])
-    dabsV = dcpa[2]
-    	
+    dabsV = dcpa[2].copy()
+
     # Compute horizontal and vertical intrusions
     iH = dbconf.Rm - dabsH
     iV = dbconf.dhm - dabsV
-        
+
     # If id1 and id2 are in intrusion, assume full intrusion to force max movement
-    if drel[0] < dbconf.Rm or drel[1] < dbconf.Rm:
-        iH = dbconf.Rm
-    if drel[2] < dbconf.dhm:
-        iV = dbconf.dhm
-    
+    iH = np.where((drel[0] < dbconf.Rm) + (drel[1] < dbconf.Rm), dbconf.Rm, iH)
+    iV = np.where(drel[2] < dbconf.dhm, dbconf.dhm, iV)
+
     # Exception handlers for head-on conflicts
     # This is done to prevent division by zero in the next step
-    if dabsH <= 10.:
-        dabsH = 10.
-        dcpa[0] = 10.
-        dcpa[1] = 10.
-    if dabsV <= 10.:
-        dabsV = 10. 
-        if dbconf.swresovert: # only trigger vertical resolution if it is the desired resolution direction
-            dcpa[2] = 10.
+    headon = dabsH <= 10.
+    dabsH[headon]   = 10.
+    dcpa[0, headon] = 10.
+    dcpa[1, headon] = 10.
+    vheadon = dabsV <= 10.
+    dabsV[vheadon] = 10.
+    if dbconf.swresovert: # only trigger vertical resolution if it is the desired resolution direction
+        dcpa[2, vheadon] = 10.
 
     # Compute the resolution velocity vector in all three directions
     dv1 = (iH*dcpa[0])/(abs(tcpa)*dabsH)  # abs(tcpa) since tinconf can be positive, while tcpa can be be negative (i.e.,conflcit is behind the two aircraft). A negative tcpa would direct dv in the wrong direction.
     dv2 = (iH*dcpa[1])/(abs(tcpa)*dabsH)
-    dv3 = (iV*dcpa[2])/(abs(tcpa)*dabsV)    
-    
-    # It is necessary to cap dv3 to prevent that a vertical conflict 
-    # is solved in 1 timestep, leading to a vertical separation that is too 
-    # high (high vs assumed in traf). If vertical dynamics are included to 
+    dv3 = (iV*dcpa[2])/(abs(tcpa)*dabsV)
+
+    # It is necessary to cap dv3 to prevent that a vertical conflict
+    # is solved in 1 timestep, leading to a vertical separation that is too
+    # high (high vs assumed in traf). If vertical dynamics are included to
     # aircraft  model in traffic.py, the below three lines should be deleted.
     mindv3 = -400./60.*ft # ~ 2.016 [m/s]
     maxdv3 = 400./60.*ft
     dv3 = np.maximum(mindv3,np.minimum(maxdv3,dv3))
 
-    # combine the dv components 
-    dv = np.array([dv1,dv2,dv3])    
+    # combine the dv components
+    dv = np.column_stack((dv1, dv2, dv3))
 
     #Extra factor necessary! ==================================================
-    # Intruder outside ownship IPZ
-    if dbconf.Rm<dist and dabsH<dist:
-        erratum=np.cos(np.arcsin(dbconf.Rm/dist)-np.arcsin(dabsH/dist))
-        dv_plus1 = dv[0]/erratum
-        dv_plus2 = dv[1]/erratum
-	   # combine dv_plus components. Note: erratum only applies to horizontal dv components
-        dv_plus = np.array([dv_plus1,dv_plus2,dv[2]])		
-    # Intruder inside ownship IPZ
-    else: 
-        dv_plus=dv
-          
-    return dv_plus
-    
-#============================= Priority Rules =================================    
-    
-def prioRules(traf, priocode, dv_mvp, dv1, dv2, id1, id2):
-    ''' Apply the desired priority setting to the resolution '''
-    
-    # Primary Free Flight prio rules (no priority)
-    if priocode == "FF1": 
-        dv1 = dv1 - dv_mvp
-        dv2 = dv2 + dv_mvp 
-    
-    # Secondary Free Flight (Cruising aircraft has priority, combined resolutions)    
-    if priocode == "FF2": 
-        # If aircraft 1 is cruising, and aircraft 2 is climbing/descending -> aircraft 2 solves conflict
-        if abs(traf.vs[id1])<0.1 and abs(traf.vs[id2]) > 0.1:
-            dv2 = dv2 + dv_mvp
-        # If aircraft 2 is cruising, and aircraft 1 is climbing -> aircraft 1 solves conflict
-        elif abs(traf.vs[id2])<0.1 and abs(traf.vs[id1]) > 0.1:
-            dv1 = dv1 - dv_mvp
-        else: # both are climbing/descending/cruising -> both aircraft solves the conflict
-            dv1 = dv1 - dv_mvp
-            dv2 = dv2 + dv_mvp
-    
-    # Tertiary Free Flight (Climbing/descending aircraft have priority and crusing solves with horizontal resolutions)          
-    elif priocode == "FF3": 
-        # If aircraft 1 is cruising, and aircraft 2 is climbing/descending -> aircraft 1 solves conflict horizontally
-        if abs(traf.vs[id1])<0.1 and abs(traf.vs[id2]) > 0.1:
-            dv1 = dv1 - dv_mvp
-            dv1[2] = 0.0 # -> set vertical speed to 0
-        # If aircraft 2 is cruising, and aircraft 1 is climbing -> aircraft 2 solves conflict horizontally
-        elif abs(traf.vs[id2])<0.1 and abs(traf.vs[id1]) > 0.1:
-            dv2 = dv2 + dv_mvp
-            dv2[2] = 0.0
-        else: # both are climbing/descending/cruising -> both aircraft solves the conflict, combined
-            dv1 = dv1 - dv_mvp
-            dv2 = dv2 + dv_mvp
-            
-    # Primary Layers (Cruising aircraft has priority and clmibing/descending solves. All conflicts solved horizontally)        
-    elif priocode == "LAY1": 
-        # If aircraft 1 is cruising, and aircraft 2 is climbing/descending -> aircraft 2 solves conflict horizontally
-        if abs(traf.vs[id1])<0.1 and abs(traf.vs[id2]) > 0.1:
-            dv2 = dv2 + dv_mvp
-            dv2[2] = 0.0
-        # If aircraft 2 is cruising, and aircraft 1 is climbing -> aircraft 1 solves conflict horizontally
-        elif abs(traf.vs[id2])<0.1 and abs(traf.vs[id1]) > 0.1:
-            dv1 = dv1 - dv_mvp
-            dv1[2] = 0.0
-        else: # both are climbing/descending/cruising -> both aircraft solves the conflict horizontally
-            dv1 = dv1 - dv_mvp
-            dv2 = dv2 + dv_mvp
-            dv1[2] = 0.0
-            dv2[2] = 0.0
-    
-    # Secondary Layers (Climbing/descending aircraft has priority and cruising solves. All conflicts solved horizontally)
-    elif priocode ==  "LAY2": 
-         # If aircraft 1 is cruising, and aircraft 2 is climbing/descending -> aircraft 1 solves conflict horizontally
-        if abs(traf.vs[id1])<0.1 and abs(traf.vs[id2]) > 0.1:
-            dv1 = dv1 - dv_mvp
-            dv1[2] = 0.0
-        # If aircraft 2 is cruising, and aircraft 1 is climbing -> aircraft 2 solves conflict horizontally
-        elif abs(traf.vs[id2])<0.1 and abs(traf.vs[id1]) > 0.1:
-            dv2 = dv2 + dv_mvp
-            dv2[2] = 0.0
-        else: # both are climbing/descending/cruising -> both aircraft solves the conflic horizontally
-            dv1 = dv1 - dv_mvp
-            dv2 = dv2 + dv_mvp
-            dv1[2] = 0.0
-            dv2[2] = 0.0
-    
-    return dv1, dv2
-    
+    # Intruder outside ownship IPZ: erratum only applies to horizontal dv components
+    # Intruder inside ownship IPZ: dv as is
+    outside = np.where((dbconf.Rm < dist) * (dabsH < dist))[0]
+    erratum = np.cos(np.arcsin(dbconf.Rm/dist[outside])-np.arcsin(dabsH[outside]/dist[outside]))
+    dv[outside, 0] = dv[outside, 0]/erratum
+    dv[outside, 1] = dv[outside, 1]/erratum
+
+    return dv
@@ -0,0 +1,103 @@
+""" Priority rules (right of way) for conflict resolution, see PRIORULES.
+
+    A priority rule is a vectorized function rule(pairs) of the attributes of
+    all conflicting pairs at once (ConflictPairs). It returns, per pair,
+    whether aircraft 1 and aircraft 2 solve the conflict, and whether they
+    only solve it horizontally: (solve1, solve2, horiz1, horiz2), as boolean
+    arrays. Rules are registered by priority code with addRule, or with
+    ASAS.addPrioRule.
+"""
+import numpy as np
+from collections import OrderedDict
+
+
+class ConflictPairs:
+    """ Flight phase and altitude attributes of the aircraft of the
+        conflicting pairs (id1, id2) """
+    def __init__(self, traf, id1, id2):
+        self.id1    = id1
+        self.id2    = id2
+        self.n      = len(id1)
+        self.alt1   = traf.alt[id1]         # [m] altitude
+        self.alt2   = traf.alt[id2]
+        self.vs1    = traf.vs[id1]          # [m/s] vertical speed
+        self.vs2    = traf.vs[id2]
+        self.phase1 = traf.perf.phase[id1]  # [-] flight phase: TO (1), IC (2), CR (3), AP (4), LD (5), GD (6)
+        self.phase2 = traf.perf.phase[id2]
+
+        # Cruising or climbing/descending
+        self.cruise1 = np.abs(self.vs1) < 0.1
+        self.cruise2 = np.abs(self.vs2) < 0.1
+        self.climb1  = np.abs(self.vs1) > 0.1
+        self.climb2  = np.abs(self.vs2) > 0.1
+
+        # Aircraft 1 is cruising, and aircraft 2 is climbing/descending, or the
+        # other way around. Otherwise both are climbing/descending/cruising.
+        self.case12 = self.cruise1 * self.climb2
+        self.case21 = self.cruise2 * self.climb1
+        self.both   = np.logical_not(self.case12 + self.case21)
+
+
+def FF1(pairs):
+    """ Primary Free Flight prio rules (no priority) """
+    solve = np.ones(pairs.n, dtype=bool)
+    horiz = np.zeros(pairs.n, dtype=bool)
+    return solve, solve, horiz, horiz
+
+
+def FF2(pairs):
+    """ Secondary Free Flight (Cruising aircraft has priority, combined resolutions) """
+    horiz = np.zeros(pairs.n, dtype=bool)
+    return pairs.case21 + pairs.both, pairs.case12 + pairs.both, horiz, horiz
+
+
+def FF3(pairs):
+    """ Tertiary Free Flight (Climbing/descending aircraft have priority and
+        crusing solves with horizontal resolutions) """
+    return pairs.case12 + pairs.both, pairs.case21 + pairs.both, pairs.case12, pairs.case21
+
+
+def LAY1(pairs):
+    """ Primary Layers (Cruising aircraft has priority and clmibing/descending
+        solves. All conflicts solved horizontally) """
+    solve1 = pairs.case21 + pairs.both
+    solve2 = pairs.case12 + pairs.both
+    return solve1, solve2, solve1, solve2
+
+
+def LAY2(pairs):
+    """ Secondary Layers (Climbing/descending aircraft has priority and
+        cruising solves. All conflicts solved horizontally) """
+    solve1 = pairs.case12 + pairs.both
+    solve2 = pairs.case21 + pairs.both
+    return solve1, solve2, solve1, solve2
+
+
+# Dictionary of priority rules: priority code -> (rule, description)
+rules = OrderedDict([
+    ("FF1",  (FF1,  "Free Flight Primary (No Prio)")),
+    ("FF2",  (FF2,  "Free Flight Secondary (Cruising has priority)")),
+    ("FF3",  (FF3,  "Free Flight Tertiary (Climbing/descending has priority)")),
+    ("LAY1", (LAY1, "Layers Primary (Cruising has priority + horizontal resolutions)")),
+    ("LAY2", (LAY2, "Layers Secondary (Climbing/descending has priority + horizontal resolutions)"))])
+
+
+def addRule(priocode, rule, description=""):
+    """ Register (or replace) the priority rule of priocode """
+    rules[priocode.upper()] = (rule, description)
+
+
+def apply(traf, priocode, dv, id1, id2):
+    """ Apply the priority rule of priocode to the resolutions dv (n x 3
+        array) of the conflicts between id1 and id2 (arrays), where id1 has
+        to subtract dv, and id2 to add it. Returns the contributions dv1 and
+        dv2 to the resolutions of id1 and id2 """
+    rule = rules[priocode][0]
+    solve1, solve2, horiz1, horiz2 = rule(ConflictPairs(traf, id1, id2))
+
+    dv1 = -dv * solve1.reshape(-1, 1)
+    dv2 =  dv * solve2.reshape(-1, 1)
+    dv1[horiz1, 2] = 0.0 # -> set vertical speed to 0
+    dv2[horiz2, 2] = 0.0
+
+    return dv1, dv2
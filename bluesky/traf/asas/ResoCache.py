@@ -0,0 +1,136 @@
+""" Cache of the conflict resolutions, see ASAS RESOCACHE.
+
+    The conflict records (own aircraft, intruder) of an aircraft are those of
+    which it is the own aircraft, and with ideal ADS-B also those of which it
+    is the intruder: the CR methods then solve each pair once, for both
+    aircraft. The entries are kept per aircraft and conflict record, with
+    the resolution time, the relative position and velocity of the intruder
+    at that time, the number of conflict records of the aircraft, and the
+    commanded trk, spd, vs and alt of the aircraft.
+
+    The command of an aircraft is reused when all its current conflict
+    records are the cached ones of its last resolution, and the relative
+    position and velocity of each intruder are within the tolerances of the
+    prediction from the cached state. Only the conflicts of the other
+    aircraft are then given to the CR method. The cache is cleared when the
+    resolution settings change.
+
+    Only for CR methods of which the resolution of an aircraft only depends
+    on its own conflicts (cacheable = True in the module, like MVP and EBY).
+"""
+import numpy as np
+from ... import settings
+
+
+class ResoCache:
+    def __init__(self):
+        self.entries   = dict()   # (id, (own id, intruder id)) -> (tres, nconf, drel, vrel, trk, spd, vs, alt)
+        self.signature = None     # resolution settings of the cached entries
+        self.dpos      = settings.asas_resocache_dpos  # [m] relative position tolerance
+        self.dvel      = settings.asas_resocache_dvel  # [m/s] relative velocity tolerance
+        self.nlookup   = 0        # number of aircraft in conflict that were looked up
+        self.nhit      = 0        # number of those that reused their command
+
+    def hitrate(self):
+        return 100. * self.nhit / max(self.nlookup, 1)
+
+    def resosettings(self, dbconf):
+        """ Settings that change the resolution of the same geometry """
+        return (dbconf.cr_name, dbconf.Rm, dbconf.dhm, dbconf.dtlookahead,
+                dbconf.vmin, dbconf.vmax, dbconf.vsmin, dbconf.vsmax,
+                dbconf.swresohoriz, dbconf.swresospd, dbconf.swresohdg, dbconf.swresovert,
+                dbconf.swprio, dbconf.priocode,
+                dbconf.swnoreso, tuple(dbconf.noresolst),
+                dbconf.swresooff, tuple(dbconf.resoofflst))
+
+    def resolve(self, dbconf, traf, simt):
+        """ Resolve the current conflicts with the CR method of dbconf, and
+            reuse the cached commands where possible """
+        signature = self.resosettings(dbconf)
+        if signature != self.signature:
+            self.entries.clear()
+            self.signature = signature
+
+        # Relative position and velocity of the intruder of each conflict record
+        iown, ioth = dbconf.iown, dbconf.ioth
+        qdrrad = np.radians(dbconf.qdr)
+        drel = np.column_stack((dbconf.dist * np.sin(qdrrad),
+                                dbconf.dist * np.cos(qdrrad),
+                                traf.alt[ioth] - traf.alt[iown]))
+        vrel = np.column_stack((traf.gseast[ioth] - traf.gseast[iown],
+                                traf.gsnorth[ioth] - traf.gsnorth[iown],
+                                traf.vs[ioth] - traf.vs[iown]))
+
+        # Aircraft ac and conflict record rec of each entry
+        rec = np.arange(dbconf.nconf)
+        ac  = iown
+        if not traf.adsb.truncated and not traf.adsb.transnoise:
+            rec = np.concatenate((rec, rec))
+            ac  = np.concatenate((iown, ioth))
+        nconf = np.bincount(ac, minlength=traf.ntraf)
+        keys  = [(traf.id[a], dbconf.confpairs[r]) for a, r in zip(ac, rec)]
+
+        # Look up the cached entries
+        cached = [self.entries.get(key) for key in keys]
+        found  = np.array([entry is not None for entry in cached], dtype=bool)
+        empty  = (simt, -1, np.zeros(3), np.zeros(3), 0., 0., 0., 0.)
+        tres, n, drel0, vrel0, trk, spd, vs, alt = \
+            [np.array(arr) for arr in zip(*[entry or empty for entry in cached])] \
+            if len(keys) > 0 else [np.array([])] * 8
+
+        # Hit of an entry: the aircraft has the same number of conflict
+        # records, and the geometry follows the prediction from the cached state
+        swhit = found * (n == nconf[ac])
+        if swhit.any():
+            dpred = drel[rec] - drel0 - vrel0 * (simt - tres).reshape(-1, 1)
+            swhit *= (np.sqrt((dpred**2).sum(axis=1)) < self.dpos) * \
+                (np.sqrt(((vrel[rec] - vrel0)**2).sum(axis=1)) < self.dvel)
+
+        # Hit of an aircraft: all its entries hit, from the same resolution
+        inconf = nconf > 0
+        hit = inconf.copy()
+        hit[ac[~swhit]] = False
+        tmin = np.ones(traf.ntraf) * np.inf
+        tmax = np.ones(traf.ntraf) * -np.inf
+        np.minimum.at(tmin, ac, tres)
+        np.maximum.at(tmax, ac, tres)
+        hit *= tmin == tmax
+        miss = inconf * ~hit
+
+        self.nlookup += np.count_nonzero(inconf)
+        self.nhit    += np.count_nonzero(hit)
+
+        # Resolve the conflicts of the aircraft that missed (and of their
+        # intruders, for the CR methods that solve each pair once)
+        k = np.where(miss[iown] + miss[ioth])[0]
+        records = ("nconf", "iown", "ioth", "qdr", "dist", "tcpa", "tinconf", "toutconf")
+        saved   = [getattr(dbconf, name) for name in records]
+        for name, arr in zip(records[1:], saved[1:]):
+            setattr(dbconf, name, arr[k])
+        dbconf.nconf = len(k)
+        try:
+            dbconf.cr.resolve(dbconf, traf)
+        finally:
+            for name, arr in zip(records, saved):
+                setattr(dbconf, name, arr)
+
+        # Reuse the cached commands, of an entry of each aircraft that hit
+        if hit.any():
+            entry = np.zeros(traf.ntraf, dtype=int)
+            entry[ac] = np.arange(len(ac))
+            first = entry[hit]
+            dbconf.trk[ac[first]] = trk[first]
+            dbconf.spd[ac[first]] = spd[first]
+            dbconf.vs[ac[first]]  = vs[first]
+            dbconf.alt[ac[first]] = alt[first]
+
+        # Cache the current entries: new ones for the aircraft that missed
+        entries = dict()
+        for e, (i, r) in enumerate(zip(ac, rec)):
+            if hit[i]:
+                entries[keys[e]] = cached[e]
+            else:
+                entries[keys[e]] = (simt, nconf[i], drel[r], vrel[r],
+                                    dbconf.trk[i], dbconf.spd[i], dbconf.vs[i],
+                                    dbconf.alt[i])
+        self.entries = entries
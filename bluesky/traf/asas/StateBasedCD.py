@@ -3,10 +3,30 @@ State-based conflict detection
 
 
 """
+from collections import deque
+from multiprocessing.pool import ThreadPool
 import numpy as np
+from ... import settings
 from ...tools import geo
 from ...tools.aero import nm
 
+# Compiled version of pairconflicts (casas/casas.cpp), if preferred and available
+casas = None
+if settings.prefer_compiled:
+    try:
+        import casas
+    except ImportError:
+        pass
+
+a = 6378137.0       # [m] Major semi-axis WGS-84
+b = 6356752.314245  # [m] Minor semi-axis WGS-84
+
+# Pool of threads for the conflict detection of the tiles, created at first use
+pool = None
+
+# Relative margin on the speed bounds of the adaptive CD
+vmargin = 0.1
+
 
 def detect(dbconf, traf, simt):
     if not dbconf.swasas:
@@ -23,56 +43,220 @@ def detect(dbconf, traf, simt):
     dbconf.LOSlist_now  = []
     dbconf.conflist_now = []
 
-    # Horizontal conflict ---------------------------------------------------------
+    if traf.ntraf == 0:
+        return
 
-    # qdlst is for [i,j] qdr from i to j, from perception of ADSB and own coordinates
-    qdlst = geo.qdrdist_matrix(np.mat(traf.lat), np.mat(traf.lon),
-                               np.mat(traf.adsb.lat), np.mat(traf.adsb.lon))
+    # Own and intruder velocities, per aircraft
+    trkrad = np.radians(traf.trk)
+    u      = traf.gs * np.sin(trkrad)  # m/s
+    v      = traf.gs * np.cos(trkrad)  # m/s
 
-    # Convert results from mat-> array
-    dbconf.qdr  = np.array(qdlst[0])  # degrees
-    I           = np.eye(traf.ntraf)  # Identity matric of order ntraf
-    dbconf.dist = np.array(qdlst[1]) * nm + 1e9 * I  # meters i to j
+    # parameters received through ADSB
+    adsbtrkrad = np.radians(traf.adsb.trk)
+    adsbu = traf.adsb.gs * np.sin(adsbtrkrad)  # m/s
+    adsbv = traf.adsb.gs * np.cos(adsbtrkrad)  # m/s
 
-    # Transmission noise
+    adsbalt = traf.adsb.alt
     if traf.adsb.transnoise:
-        # error in the determined bearing between two a/c
-        bearingerror = np.random.normal(0, traf.adsb.transerror[0], dbconf.qdr.shape)  # degrees
-        dbconf.qdr += bearingerror
-        # error in the perceived distance between two a/c
-        disterror = np.random.normal(0, traf.adsb.transerror[1], dbconf.dist.shape)  # meters
-        dbconf.dist += disterror
+        # error in the determined altitude of other a/c
+        alterror = np.random.normal(0, traf.adsb.transerror[2], traf.alt.shape)  # degrees
+        adsbalt += alterror
 
-    # Calculate horizontal closest point of approach (CPA)
-    qdrrad    = np.radians(dbconf.qdr)
-    dbconf.dx = dbconf.dist * np.sin(qdrrad)  # is pos j rel to i
-    dbconf.dy = dbconf.dist * np.cos(qdrrad)  # is pos j rel to i
+    # With ideal ADS-B (no noise, no truncation) the perceived state equals the
+    # true state, so pair (j, i) has the same distance as pair (i, j): only the
+    # pairs with i < j are generated, and each is checked in both directions.
+    symmetric = not traf.adsb.transnoise and not traf.adsb.truncated
+
+    # Check the candidate pairs in tiles of own aircraft, to limit the memory
+    # use to dbconf.blocksize pairs. Only the conflicts of each tile are kept.
+    own = (u, v, adsbu, adsbv, adsbalt)
+    if settings.asas_threads > 1:
+        tiles = list(threadtiles(dbconf, traf, simt, own, symmetric))
+    else:
+        tiles = [kernel()(dbconf, traf, i, j, own, transnoise(traf, len(i)), symmetric)
+                 for i, j in candidates(dbconf, traf, simt, symmetric)]
+    iown, ioth, qdr, dist, tcpa, tinconf, toutconf = \
+        [np.concatenate(arrs) for arrs in zip(*tiles)]
+
+    # Sort the conflicts on own aircraft and intruder
+    order = np.lexsort((ioth, iown))
+    iown, ioth, qdr, dist, tcpa, tinconf, toutconf = \
+        [arr[order] for arr in (iown, ioth, qdr, dist, tcpa, tinconf, toutconf)]
+
+    # Earliest time in conflict per own aircraft, of its conflicts only, so
+    # that it does not depend on the candidate pairs. Very large if none.
+    dbconf.tinconfmin = np.ones(traf.ntraf) * 1e8
+    np.minimum.at(dbconf.tinconfmin, iown, tinconf)
 
-    trkrad   = np.radians(traf.trk)
-    dbconf.u = traf.gs * np.sin(trkrad).reshape((1, len(trkrad)))  # m/s
-    dbconf.v = traf.gs * np.cos(trkrad).reshape((1, len(trkrad)))  # m/s
+    # ----------------------------------------------------------------------
+    # Update conflict lists
+    # ----------------------------------------------------------------------
 
-    # parameters received through ADSB
-    adsbtrkrad = np.radians(traf.adsb.trk)
-    adsbu = traf.adsb.gs * np.sin(adsbtrkrad).reshape((1, len(adsbtrkrad)))  # m/s
-    adsbv = traf.adsb.gs * np.cos(adsbtrkrad).reshape((1, len(adsbtrkrad)))  # m/s
+    # Store result: each a/c gets their own record, in order of own aircraft
+    # and intruder
+    dbconf.nconf    = len(iown)
+    dbconf.iown     = iown
+    dbconf.ioth     = ioth
+    dbconf.qdr      = qdr
+    dbconf.dist     = dist
+    dbconf.tcpa     = tcpa
+    dbconf.tinconf  = tinconf
+    dbconf.toutconf = toutconf
+
+    # Conflict records of each aircraft: consecutive, since sorted on own aircraft
+    bounds = np.searchsorted(iown, np.arange(traf.ntraf + 1))
+    dbconf.iconf     = [range(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    dbconf.confpairs = [(traf.id[i], traf.id[j]) for i, j in zip(iown, ioth)]
+
+    # Own position at CPA
+    rng = tcpa * traf.gs[iown] / nm
+    dbconf.latowncpa, dbconf.lonowncpa = geo.qdrpos(traf.lat[iown], traf.lon[iown],
+                                                    traf.trk[iown], rng)
+    dbconf.altowncpa = traf.alt[iown] + tcpa * traf.vs[iown]
+
+    # Loss of separation and intrusion severity
+    dx = (traf.lat[iown] - traf.lat[ioth]) * 111319.
+    dy = (traf.lon[iown] - traf.lon[ioth]) * 111319.
+
+    hdist2 = dx**2 + dy**2
+    hLOS   = hdist2 < dbconf.R**2
+    vdist  = np.abs(traf.alt[iown] - traf.alt[ioth])
+    vLOS   = vdist < dbconf.dh
+    LOS    = hLOS & vLOS
+
+    Ih = 1.0 - np.sqrt(hdist2) / dbconf.R
+    Iv = 1.0 - vdist / dbconf.dh
+    severity = np.minimum(Ih, Iv)
+
+    # Add to Conflict and LOSlist, to count total conflicts and LOS
+
+    # NB: if only one A/C detects a conflict, it is also added to these lists.
+    # Each pair is registered once, as (own, intruder) of its first record.
+    first = firstrecords(iown, ioth, traf.ntraf)
+    los   = first[LOS[first]]
+
+    experimenttime = simt > 2100 and simt < 5700  # These parameters may be
+    # changed to count only conflicts within a given expirement time window
+
+    dbconf.register(simt, experimenttime,
+                    [(traf.id[i], traf.id[j]) for i, j in zip(iown[first], ioth[first])],
+                    [(traf.id[i], traf.id[j]) for i, j in zip(iown[los], ioth[los])],
+                    zip(severity[los], Ih[los], Iv[los]))
+
+    # Calculate whether ASAS or A/P commands should be followed
+    APorASAS(dbconf, traf)
+
+
+def firstrecords(iown, ioth, ntraf):
+    """ Index of the first conflict record of each pair, in order of the
+        records: the records (i, j) and (j, i) are of the same pair """
+    pairid = np.minimum(iown, ioth) * ntraf + np.maximum(iown, ioth)
+    return np.sort(np.unique(pairid, return_index=True)[1])
+
+
+def threadtiles(dbconf, traf, simt, own, symmetric):
+    """ Generator of the results of pairconflicts for the tiles, computed by
+        the thread pool. Results are given in order of the tiles, with at most
+        two tiles per thread in progress. The noise is drawn in the same order
+        as without threads. """
+    global pool
+    if pool is None:
+        pool = ThreadPool(settings.asas_threads)
+
+    pending = deque()
+    for i, j in candidates(dbconf, traf, simt, symmetric):
+        pending.append(pool.apply_async(kernel(),
+            (dbconf, traf, i, j, own, transnoise(traf, len(i)), symmetric)))
+        if len(pending) >= 2 * settings.asas_threads:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def kernel():
+    """ pairconflicts function to use: the compiled one of casas, if
+        preferred and available. It releases the GIL, so the tiles of the
+        thread pool are then checked in parallel. """
+    if settings.prefer_compiled and casas is not None:
+        return casas.pairconflicts
+    return pairconflicts
+
+
+def transnoise(traf, npairs):
+    """ Bearing and distance errors of npairs pairs, if transmission noise is on """
+    if not traf.adsb.transnoise:
+        return None
+
+    # error in the determined bearing between two a/c
+    bearingerror = np.random.normal(0, traf.adsb.transerror[0], npairs)  # degrees
+    # error in the perceived distance between two a/c
+    disterror = np.random.normal(0, traf.adsb.transerror[1], npairs)  # meters
+    return bearingerror, disterror
+
+
+def pairconflicts(dbconf, traf, i, j, own, noise, symmetric=False):
+    """ Conflict detection for the candidate pairs (i, j), sorted on i, with
+        own = (u, v, adsbu, adsbv, adsbalt) per aircraft and the transmission
+        noise of the pairs (or None). Returns iown, ioth, qdr, dist, tcpa,
+        tinconf and toutconf of the conflicting pairs. If symmetric, the
+        mirrored pairs (j, i) are checked as well, with the distance of
+        (i, j): the conflicts of (i, j) are followed by those of (j, i). """
+    u, v, adsbu, adsbv, adsbalt = own
+
+    # qdr and dist from i to j, from perception of ADSB and own coordinates,
+    # and the bearing from j to i of the mirrored pairs
+    if dbconf.cdgeom == "FLAT":
+        geometry = flatqdrdist(traf.lat[i], traf.lon[i],
+                               traf.adsb.lat[j], traf.adsb.lon[j], symmetric)
+    else:
+        geometry = wgsqdrdist(traf.lat[i], traf.lon[i],
+                              traf.adsb.lat[j], traf.adsb.lon[j], symmetric)
+    qdr, dist = geometry[:2]
+
+    # Transmission noise
+    if noise is not None:
+        bearingerror, disterror = noise
+        qdr += bearingerror
+        dist += disterror
+
+    # Speed du[i,j], dv[i,j] is perceived eastern, northern speed of i to j
+    conflicts = pairdetect(dbconf, traf, i, j, qdr, dist,
+                           u[j] - adsbu[i], v[j] - adsbv[i],
+                           traf.alt[j] - adsbalt[i], traf.vs[j] - traf.adsb.vs[i])
+    if not symmetric:
+        return conflicts
+
+    # Mirrored pairs (j, i): the bearing from j to i, and the opposite
+    # relative velocity and altitude as perceived by j
+    conflictsback = pairdetect(dbconf, traf, j, i, geometry[2], dist,
+                               u[i] - adsbu[j], v[i] - adsbv[j],
+                               traf.alt[i] - adsbalt[j], traf.vs[i] - traf.adsb.vs[j])
+    return [np.concatenate(arrs) for arrs in zip(conflicts, conflictsback)]
+
+
+def pairdetect(dbconf, traf, i, j, qdr, dist, du, dv, dalt, dvs):
+    """ Conflict detection of the pairs (i, j) with own aircraft i, from the
+        bearing and distance of j, and the relative velocity and altitude of j
+        (arrays per pair). Returns iown, ioth, qdr, dist, tcpa, tinconf and
+        toutconf of the conflicting pairs. """
 
-    du = dbconf.u - adsbu.T  # Speed du[i,j] is perceived eastern speed of i to j
-    dv = dbconf.v - adsbv.T  # Speed dv[i,j] is perceived northern speed of i to j
+    # Horizontal conflict ---------------------------------------------------------
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx     = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy     = dist * np.cos(qdrrad)  # is pos j rel to i
 
     dv2 = du * du + dv * dv
     dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
 
     vrel = np.sqrt(dv2)
 
-    dbconf.tcpa = -(du * dbconf.dx + dv * dbconf.dy) / dv2 + 1e9 * I
-
-    # Calculate CPA positions
-    # xcpa = dbconf.tcpa * du
-    # ycpa = dbconf.tcpa * dv
+    tcpa = -(du * dx + dv * dy) / dv2
 
     # Calculate distance^2 at CPA (minimum distance^2)
-    dcpa2 = dbconf.dist * dbconf.dist - dbconf.tcpa * dbconf.tcpa * dv2
+    dcpa2 = dist * dist - tcpa * tcpa * dv2
 
     # Check for horizontal conflict
     R2 = dbconf.R * dbconf.R
@@ -82,143 +266,330 @@ def detect(dbconf, traf, simt):
     dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
     dtinhor = dxinhor / vrel
 
-    tinhor = np.where(swhorconf, dbconf.tcpa - dtinhor, 1e8)  # Set very large if no conf
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
 
-    touthor = np.where(swhorconf, dbconf.tcpa + dtinhor, -1e8)  # set very large if no conf
-    # swhorconf = swhorconf*(touthor>0)*(tinhor<dbconf.dtlook)
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
 
     # Vertical conflict -----------------------------------------------------------
 
-    # Vertical crossing of disk (-dh,+dh)
-    alt = traf.alt.reshape((1, traf.ntraf))
-    adsbalt = traf.adsb.alt.reshape((1, traf.ntraf))
-    if traf.adsb.transnoise:
-        # error in the determined altitude of other a/c
-        alterror = np.random.normal(0, traf.adsb.transerror[2], traf.alt.shape)  # degrees
-        adsbalt += alterror
-
-    dbconf.dalt = alt - adsbalt.T
-
-
-    vs = traf.vs.reshape(1, len(traf.vs))
-
-
-    avs = traf.adsb.vs.reshape(1, len(traf.adsb.vs))
-
-    dvs = vs - avs.T
-
-    # Check for passing through each others zone
+    # Check for passing through each others zone: vertical crossing of disk (-dh,+dh)
     dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
-    tcrosshi = (dbconf.dalt + dbconf.dh) / -dvs
-    tcrosslo = (dbconf.dalt - dbconf.dh) / -dvs
+    tcrosshi = (dalt + dbconf.dh) / -dvs
+    tcrosslo = (dalt - dbconf.dh) / -dvs
 
     tinver = np.minimum(tcrosshi, tcrosslo)
     toutver = np.maximum(tcrosshi, tcrosslo)
 
     # Combine vertical and horizontal conflict-------------------------------------
-    dbconf.tinconf = np.maximum(tinver, tinhor)
-
-    dbconf.toutconf = np.minimum(toutver, touthor)
-
-    swconfl = swhorconf * (dbconf.tinconf <= dbconf.toutconf) * \
-        (dbconf.toutconf > 0.) * (dbconf.tinconf < dbconf.dtlookahead) \
-        * (1. - I)
-
-    # ----------------------------------------------------------------------
-    # Update conflict lists
-    # ----------------------------------------------------------------------
-    if len(swconfl) == 0:
-        return
-    # Calculate CPA positions of traffic in lat/lon?
-
-    # Select conflicting pairs: each a/c gets their own record
-    confidxs            = np.where(swconfl)
-    iown                = confidxs[0]
-    ioth                = confidxs[1]
-
-    # Store result
-    dbconf.nconf        = len(confidxs[0])
-
-    for idx in range(dbconf.nconf):
-        i = iown[idx]
-        j = ioth[idx]
-        if i == j:
-            continue
-
-        dbconf.iconf[i].append(idx)
-        dbconf.confpairs.append((traf.id[i], traf.id[j]))
-
-        rng        = dbconf.tcpa[i, j] * traf.gs[i] / nm
-        lato, lono = geo.qdrpos(traf.lat[i], traf.lon[i], traf.trk[i], rng)
-        alto       = traf.alt[i] + dbconf.tcpa[i, j] * traf.vs[i]
-
-        dbconf.latowncpa.append(lato)
-        dbconf.lonowncpa.append(lono)
-        dbconf.altowncpa.append(alto)
-
-        dx = (traf.lat[i] - traf.lat[j]) * 111319.
-        dy = (traf.lon[i] - traf.lon[j]) * 111319.
-
-        hdist2 = dx**2 + dy**2
-        hLOS   = hdist2 < dbconf.R**2
-        vdist  = abs(traf.alt[i] - traf.alt[j])
-        vLOS   = vdist < dbconf.dh
-        LOS    = (hLOS & vLOS)
-
-        # Add to Conflict and LOSlist, to count total conflicts and LOS
-
-        # NB: if only one A/C detects a conflict, it is also added to these lists
-        combi = str(traf.id[i]) + " " + str(traf.id[j])
-        combi2 = str(traf.id[j]) + " " + str(traf.id[i])
-
-        experimenttime = simt > 2100 and simt < 5700  # These parameters may be
-        # changed to count only conflicts within a given expirement time window
-
-        if combi not in dbconf.conflist_all and combi2 not in dbconf.conflist_all:
-            dbconf.conflist_all.append(combi)
-
-        if combi not in dbconf.conflist_exp and combi2 not in dbconf.conflist_exp and experimenttime:
-            dbconf.conflist_exp.append(combi)
-
-        if combi not in dbconf.conflist_now and combi2 not in dbconf.conflist_now:
-            dbconf.conflist_now.append(combi)
-
-        if LOS:
-            if combi not in dbconf.LOSlist_all and combi2 not in dbconf.LOSlist_all:
-                dbconf.LOSlist_all.append(combi)
-                dbconf.LOSmaxsev.append(0.)
-                dbconf.LOShmaxsev.append(0.)
-                dbconf.LOSvmaxsev.append(0.)
-
-            if combi not in dbconf.LOSlist_exp and combi2 not in dbconf.LOSlist_exp and experimenttime:
-                dbconf.LOSlist_exp.append(combi)
-
-            if combi not in dbconf.LOSlist_now and combi2 not in dbconf.LOSlist_now:
-                dbconf.LOSlist_now.append(combi)
-
-            # Now, we measure intrusion and store it if it is the most severe
-            Ih = 1.0 - np.sqrt(hdist2) / dbconf.R
-            Iv = 1.0 - vdist / dbconf.dh
-            severity = min(Ih, Iv)
-
-            try:  # Only continue if combi is found in LOSlist (and not combi2)
-                idx = dbconf.LOSlist_all.index(combi)
-            except:
-                idx = -1
-
-            if idx >= 0:
-                if severity > dbconf.LOSmaxsev[idx]:
-                    dbconf.LOSmaxsev[idx]  = severity
-                    dbconf.LOShmaxsev[idx] = Ih
-                    dbconf.LOSvmaxsev[idx] = Iv
-
-    # Convert to numpy arrays for vectorisation
-    dbconf.latowncpa = np.array(dbconf.latowncpa)
-    dbconf.lonowncpa = np.array(dbconf.lonowncpa)
-    dbconf.altowncpa = np.array(dbconf.altowncpa)
-
-    # Calculate whether ASAS or A/P commands should be followed
-    APorASAS(dbconf, traf)
+    tinconf = np.maximum(tinver, tinhor)
+
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf * (tinconf <= toutconf) * \
+        (toutconf > 0.) * (tinconf < dbconf.dtlookahead)
+
+    # Select conflicting pairs
+    confidxs = np.where(swconfl)[0]
+    return [arr[confidxs] for arr in (i, j, qdr, dist, tcpa, tinconf, toutconf)]
+
+
+def candidates(dbconf, traf, simt, symmetric=False):
+    """ Generator of the candidate pairs (i, j), sorted on i, in tiles of
+        consecutive own aircraft with at most dbconf.blocksize pairs each
+        (or a single own aircraft, if it has more). If symmetric, only the
+        pairs with i < j. The free slots of deleted aircraft are left out. """
+    if dbconf.swadaptive:
+        if dbconf.schedule is None or not dbconf.schedule.valid(dbconf, traf, simt, symmetric):
+            dbconf.schedule = PairSchedule(dbconf, traf, simt, symmetric)
+        pairs = PairList(traf.ntraf, *dbconf.schedule.due(dbconf, traf, simt))
+    elif dbconf.swbroadphase:
+        pairs = BroadPhase(dbconf, traf, symmetric)
+    else:
+        pairs = AllPairs(traf.ntraf, symmetric)
+
+    # Start of the pairs of each own aircraft
+    end   = np.cumsum(pairs.count)
+    start = end - pairs.count
+
+    i0 = 0
+    while i0 < traf.ntraf:
+        i1 = max(i0 + 1, np.searchsorted(end, start[i0] + dbconf.blocksize, "right"))
+        i, j = pairs.rows(i0, i1)
+        if traf.freeslots:
+            swactive = traf.active[i] * traf.active[j]
+            i, j = i[swactive], j[swactive]
+        yield i, j
+        i0 = i1
+
+
+class AllPairs:
+    """ All pairs (i, j) of different aircraft, or with i < j if symmetric """
+    def __init__(self, ntraf, symmetric=False):
+        self.ntraf     = ntraf
+        self.symmetric = symmetric
+        if symmetric:
+            self.count = ntraf - 1 - np.arange(ntraf)          # pairs per own aircraft
+        else:
+            self.count = np.ones(ntraf, dtype=int) * ntraf  # pairs per own aircraft, incl. itself
+
+    def rows(self, i0, i1):
+        """ Pairs of own aircraft i0 up to i1, sorted on i """
+        if self.symmetric:
+            i = np.repeat(np.arange(i0, i1), self.count[i0:i1])
+            j = np.arange(len(i)) - np.repeat(np.cumsum(self.count[i0:i1]) - self.ntraf, self.count[i0:i1])
+            return i, j
+
+        i = np.repeat(np.arange(i0, i1), self.ntraf)
+        j = np.tile(np.arange(self.ntraf), i1 - i0)
+        swdiff = i != j
+        return i[swdiff], j[swdiff]
+
+
+class PairList:
+    """ Given pairs (i, j), sorted on i """
+    def __init__(self, ntraf, i, j):
+        self.i     = i
+        self.j     = j
+        self.start = np.searchsorted(i, np.arange(ntraf + 1))
+        self.count = np.diff(self.start)  # pairs per own aircraft
+
+    def rows(self, i0, i1):
+        """ Pairs of own aircraft i0 up to i1 """
+        k0, k1 = self.start[i0], self.start[i1]
+        return self.i[k0:k1], self.j[k0:k1]
+
+
+class PairSchedule:
+    """ Schedule of the pair checks of the adaptive CD.
+
+        A pair can only be in conflict within the lookahead time when it is
+        within reach: its distance minus the PZ radius is at most the
+        lookahead time times the closure rate. Each pair is re-checked at
+        the earliest time that it can get within reach, given its distance
+        and the bounds on the speeds of both aircraft, or earlier when an
+        aircraft changes intent or exceeds its speed bound.
+
+        Only the pairs that can get within reach within dbconf.dthorizon
+        seconds are tracked. The schedule is made anew after that time,
+        when an aircraft is created, deleted or moved, or when the fastest
+        aircraft exceeds the speed bound of the untracked pairs.
+
+        The pairs that are not checked cannot be in conflict, so the
+        conflicts, and the resolutions that follow from them only, are those
+        of a check of all pairs (see utils/adaptivecheck.py). """
+    def __init__(self, dbconf, traf, simt, symmetric):
+        self.ids       = list(traf.id)
+        self.symmetric = symmetric
+        self.R         = dbconf.R
+        self.dtlook    = dbconf.dtlookahead
+        self.tend      = simt + settings.asas_dthorizon
+
+        # Speed bound per aircraft, own and as received through ADSB
+        self.vbound = (1. + vmargin) * np.maximum(np.abs(traf.gs), np.abs(traf.adsb.gs)) + 1.
+        self.vlim   = 2. * self.vbound.max()
+
+        # Tracked pairs, all due for a check
+        reach = self.margin(dbconf, traf) + self.vlim * (self.dtlook + settings.asas_dthorizon)
+        self.i, self.j = BroadPhase(dbconf, traf, symmetric, reach).rows(0, traf.ntraf)
+        self.tdue      = np.ones(len(self.i)) * simt
+
+    def margin(self, dbconf, traf):
+        """ Distance between the positions of a pair at which it is always
+            within reach: PZ radius, and the ADSB distance error """
+        margin = dbconf.R + 1.0
+        if traf.adsb.transnoise:
+            margin += 6.0 * traf.adsb.transerror[1]
+        if traf.adsb.truncated:
+            margin += self.vlim * traf.adsb.trunctime
+        return margin
+
+    def valid(self, dbconf, traf, simt, symmetric):
+        return simt < self.tend and symmetric == self.symmetric and \
+            self.R == dbconf.R and self.dtlook == dbconf.dtlookahead and \
+            self.ids == traf.id and \
+            2. * max(np.abs(traf.gs).max(), np.abs(traf.adsb.gs).max()) <= self.vlim
+
+    def due(self, dbconf, traf, simt):
+        """ Pairs (i, j), sorted on i, that are within reach and need a check.
+            Sets the time of the next check of the checked pairs. """
+
+        # Aircraft with a new intent or a speed above its bound
+        vnow  = np.maximum(np.abs(traf.gs), np.abs(traf.adsb.gs))
+        swnew = dbconf.newintent + (vnow > self.vbound)
+        self.vbound[swnew] = np.maximum(self.vbound[swnew], (1. + vmargin) * vnow[swnew] + 1.)
+        dbconf.newintent.fill(False)
+
+        # Pairs of which the check is due
+        idx = np.where((self.tdue <= simt) + swnew[self.i] + swnew[self.j])[0]
+        i   = self.i[idx]
+        j   = self.j[idx]
+
+        # Time left until the pair can be within reach, at the closure rate bound
+        xyz1   = ecef(traf.lat[i], traf.lon[i])
+        xyz2   = ecef(traf.adsb.lat[j], traf.adsb.lon[j])
+        chord  = np.sqrt(((xyz1 - xyz2)**2).sum(axis=0))
+        vclose = self.vbound[i] + self.vbound[j]
+        tleft  = (chord - self.margin(dbconf, traf)) / vclose - self.dtlook
+
+        self.tdue[idx] = simt + np.maximum(0., tleft)
+        swin = tleft <= 0.
+        return i[swin], j[swin]
+
+
+class BroadPhase:
+    """ Candidate pairs (i, j) that can get in conflict within the lookahead
+        time. Pairs further apart than the reach (PZ radius + lookahead time *
+        maximum relative speed) cannot, and are skipped.
+
+        Aircraft are sorted in cubes with the size of the reach, in earth-
+        centered coordinates, so each aircraft is only compared with the
+        intruders in its own and the 26 neighbouring cubes. The coordinates
+        are on a sphere with the WGS'84 minor axis as radius, so distances
+        between them are never larger than the WGS'84 distance of the CD.
+        If symmetric, only the pairs with i < j are given. The default reach
+        can be replaced by a larger one. """
+    def __init__(self, dbconf, traf, symmetric=False, reach=None):
+        ntraf = traf.ntraf
+        self.symmetric = symmetric
+        if reach is None:
+            vmax  = np.max(np.abs(traf.gs)) + np.max(np.abs(traf.adsb.gs))
+            reach = dbconf.R + dbconf.dtlookahead * vmax + 1.0
+            if traf.adsb.transnoise:
+                reach += 6.0 * traf.adsb.transerror[1]
+        self.reach = reach
+
+        # Own positions and positions of intruders as received through ADSB
+        self.xyz1 = ecef(traf.lat, traf.lon)
+        self.xyz2 = ecef(traf.adsb.lat, traf.adsb.lon)
+
+        # Number of each cube along the axes, and key of each cube
+        size  = max(self.reach, 1000.)
+        ncube = int(b / size) + 2
+        base  = 2 * ncube + 1
+        cube1 = np.floor(self.xyz1 / size).astype(np.int64) + ncube
+        cube2 = np.floor(self.xyz2 / size).astype(np.int64) + ncube
+        key1  = (cube1[0] * base + cube1[1]) * base + cube1[2]
+        key2  = (cube2[0] * base + cube2[1]) * base + cube2[2]
+
+        # Range of intruders in each of the 27 neighbouring cubes of each aircraft
+        self.order = np.argsort(key2, kind="mergesort")
+        sorted2    = key2[self.order]
+        offsets    = np.array([(dx * base + dy) * base + dz for dx in (-1, 0, 1)
+                               for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+        keys       = key1.reshape(ntraf, 1) + offsets
+        self.lo    = np.searchsorted(sorted2, keys.ravel(), "left").reshape(ntraf, 27)
+        self.cnt   = np.searchsorted(sorted2, keys.ravel(), "right").reshape(ntraf, 27) - self.lo
+        self.count = self.cnt.sum(axis=1)  # pairs per own aircraft, incl. itself
+
+    def rows(self, i0, i1):
+        """ Pairs of own aircraft i0 up to i1, sorted on i """
+        lo  = self.lo[i0:i1].ravel()
+        cnt = self.cnt[i0:i1].ravel()
+
+        # Expand the ranges to pairs
+        i = np.repeat(np.arange(i0, i1), self.count[i0:i1])
+        j = self.order[np.arange(len(i)) + np.repeat(lo - np.cumsum(cnt) + cnt, cnt)]
+
+        # Keep the pairs within reach, without the aircraft itself
+        dxyz = self.xyz1[:, i] - self.xyz2[:, j]
+        swin = ((j > i) if self.symmetric else (i != j)) * \
+            ((dxyz * dxyz).sum(axis=0) <= self.reach * self.reach)
+        return i[swin], j[swin]
+
+
+def ecef(lat, lon):
+    """ Earth-centered coordinates [m] (3 x n array) on a sphere with radius b """
+    latrad = np.radians(lat)
+    lonrad = np.radians(lon)
+    coslat = np.cos(latrad)
+    return b * np.array([coslat * np.cos(lonrad),
+                         coslat * np.sin(lonrad),
+                         np.sin(latrad)])
+
+
+def wgsqdrdist(lat1, lon1, lat2, lon2, back=False):
+    """ Bearing [deg] and distance [m] from 1 to 2 (arrays of pairs), with
+        the formulas of geo.qdrdist_matrix (CDGEOM WGS84), but element-wise
+        for the pairs instead of for all combinations, and without np.mat.
+        Also used when geo is the compiled cgeo, which only gives matrices.
+        If back, also the bearing from 2 to 1, as a third result. """
+    # Earth radius: at the sum of the latitudes, or a weighted mean for pairs
+    # on different sides of the equator
+    r = np.where(lat1 * lat2 < 0,
+                 0.5 * (np.abs(lat1) * (rwgs84(lat1) + a) + np.abs(lat2) * (rwgs84(lat2) + a)) /
+                 (np.abs(lat1) + (np.abs(lat2) + (lat1 == 0.) * 0.000001)),
+                 rwgs84(lat1 + lat2))
+
+    dlat    = np.radians(lat2 - lat1)
+    dlon    = np.radians(lon2 - lon1)
+    latrad1 = np.radians(lat1)
+    latrad2 = np.radians(lat2)
+    sinlat1 = np.sin(latrad1)
+    sinlat2 = np.sin(latrad2)
+    coslat1 = np.cos(latrad1)
+    coslat2 = np.cos(latrad2)
+
+    # Haversine distance
+    sindlat = np.sin(dlat / 2.)
+    sindlon = np.sin(dlon / 2.)
+    root    = sindlat * sindlat + (coslat1 * coslat2) * (sindlon * sindlon)
+    dist    = r * (2. * np.arctan2(np.sqrt(root), np.sqrt(1. - root)))
+
+    # Initial bearing
+    sinlon = np.sin(dlon)
+    coslon = np.cos(dlon)
+    qdr = np.degrees(np.arctan2(sinlon * coslat2,
+                                coslat1 * sinlat2 - (sinlat1 * coslat2) * coslon))
+    if not back:
+        return qdr, dist
+
+    # Initial bearing from 2 to 1: the same formula with 1 and 2 swapped
+    qdrback = np.degrees(np.arctan2(-sinlon * coslat1,
+                                    coslat2 * sinlat1 - (sinlat2 * coslat1) * coslon))
+    return qdr, dist, qdrback
+
+
+def rwgs84(lat):
+    """ Earth radius [m] of geo.rwgs84_matrix at latitudes lat [deg] """
+    latrad = np.radians(lat)
+    an     = a * a * np.cos(latrad)
+    bn     = b * b * np.sin(latrad)
+    ad     = a * np.cos(latrad)
+    bd     = b * np.sin(latrad)
+    return np.sqrt((an * an + bn * bn) / (ad * ad + bd * bd))
+
+
+def flatqdrdist(lat1, lon1, lat2, lon2, back=False):
+    """ Bearing [deg] and distance [m] from 1 to 2 (arrays of pairs) in the
+        local tangent plane at the mean latitude of each pair (CDGEOM FLAT).
+
+        The earth radius is the one of geo.qdrdist_matrix, and the bearing is
+        corrected for the convergence of the meridians, so that it is the
+        bearing at position 1, like that of qdrdist_matrix. The difference
+        with qdrdist_matrix is the error of the projection: for a distance d
+        at latitude lat, both the error in distance and the error in position
+        across the bearing are below d**3 / (8 R**2 cos(lat)**2), with R the
+        earth radius: 7 m at 50 nm and 53 degrees latitude. The largest
+        differences found for random pairs were 0.01 m at 10 nm and 2 m at
+        50 nm up to 53 degrees, and 8 m at 50 nm at 71 degrees. Pairs on
+        opposite sides of the equator use the radius of the other pairs,
+        which differs less than 1e-5 from that of qdrdist_matrix there.
+        If back, also the bearing from 2 to 1, as a third result. """
+    r     = rwgs84(lat1 + lat2)
+    latm  = np.radians(0.5 * (lat1 + lat2))
+    dlon  = np.radians((lon2 - lon1 + 180.) % 360. - 180.)
+    north = np.radians(lat2 - lat1) * r
+    east  = dlon * np.cos(latm) * r
+
+    sinlatm = np.sin(latm)
+    qdr = np.degrees(np.arctan2(east, north) - 0.5 * dlon * sinlatm)
+    if not back:
+        return qdr, np.sqrt(north * north + east * east)
+
+    # Bearing from 2 to 1: the opposite direction in the plane, corrected for
+    # the convergence of the meridians at position 2
+    qdrback = np.degrees(np.arctan2(-east, -north) + 0.5 * dlon * sinlatm)
+    return qdr, np.sqrt(north * north + east * east), qdrback
 
 
 def APorASAS(dbconf, traf):
@@ -228,80 +599,61 @@ def APorASAS(dbconf, traf):
     dbconf.active.fill(False)
 
     # Look at all conflicts, also the ones that are solved but CPA is yet to come
-    for conflict in dbconf.conflist_all:
-        ac1, ac2 = conflict.split(" ")
-        id1, id2 = traf.id2idx(ac1), traf.id2idx(ac2)
-        if id1 >= 0 and id2 >= 0:
-            # Check if conflict is past CPA
-            d = np.array([traf.lon[id2] - traf.lon[id1], traf.lat[id2] - traf.lat[id1]])
-
-            # write velocities as vectors
-            v1 = np.array([traf.gseast[id1], traf.gsnorth[id1]])
-            v2 = np.array([traf.gseast[id2], traf.gsnorth[id2]])
-            
-            # Compute pastCPA
-            pastCPA = np.dot(d,v2-v1)>0.
-            
-            # hLOS:
-            # Aircraft should continue to resolve until there is no horizontal 
-            # LOS. This is particularly relevant when vertical resolutions
-            # are used. 
-            dx = (traf.lat[id1] - traf.lat[id2]) * 111319.
-            dy = (traf.lon[id1] - traf.lon[id2]) * 111319.    
-            hdist2 = dx**2 + dy**2
-            hLOS   = hdist2 < dbconf.R**2          
-            
-            # Bouncing conflicts:
-            # If two aircraft are getting in and out of conflict continously, 
-            # then they it is a bouncing conflict. ASAS should stay active until 
-            # the bouncing stops.
-            bouncingConflict = (abs(traf.trk[id1] - traf.trk[id2]) < 30.) & (hdist2<dbconf.Rm**2)         
-            
-            # Decide if conflict is over or not. 
-            # If not over, turn active to true. 
-            # If over, then initiate recovery
-            if not pastCPA or hLOS or bouncingConflict:
-                # Aircraft haven't passed their CPA: must follow their ASAS
-                dbconf.active[id1] = True
-                dbconf.active[id2] = True
-            
-            else:
-                # Waypoint recovery after conflict
-                # Find the next active waypoint and send the aircraft to that 
-                # waypoint.             
-                iwpid1 = traf.ap.route[id1].findact(traf,id1)
-                if iwpid1 != -1: # To avoid problems if there are no waypoints
-                    traf.ap.route[id1].direct(traf, id1, traf.ap.route[id1].wpname[iwpid1])
-                iwpid2 = traf.ap.route[id2].findact(traf,id2)
-                if iwpid2 != -1: # To avoid problems if there are no waypoints
-                    traf.ap.route[id2].direct(traf, id2, traf.ap.route[id2].wpname[iwpid2])
-                
-                # If conflict is solved, remove it from conflist_all list
-                # This is so that if a conflict between this pair of aircraft 
-                # occurs again, then that new conflict should be detected, logged
-                # and solved (if reso is on)
-                dbconf.conflist_all.remove(conflict)
-        
-        # If aircraft id1 cannot be found in traffic because it has finished its
-        # flight (and has been deleted), start trajectory recovery for aircraft id2
-        # And remove the conflict from the conflict_all list
-        elif id1 < 0 and id2 >= 0:
-             iwpid2 = traf.ap.route[id2].findact(traf,id2)
-             if iwpid2 != -1: # To avoid problems if there are no waypoints
-                 traf.ap.route[id2].direct(traf, id2, traf.ap.route[id2].wpname[iwpid2])
-             dbconf.conflist_all.remove(conflict)
-
-        # If aircraft id2 cannot be found in traffic because it has finished its
-        # flight (and has been deleted) start trajectory recovery for aircraft id1
-        # And remove the conflict from the conflict_all list
-        elif id2 < 0 and id1 >= 0:
-            iwpid1 = traf.ap.route[id1].findact(traf,id1)
-            if iwpid1 != -1: # To avoid problems if there are no waypoints
-                traf.ap.route[id1].direct(traf, id1, traf.ap.route[id1].wpname[iwpid1])
-            dbconf.conflist_all.remove(conflict)
-        
-        # if both ids are unknown, then delete this conflict, because both aircraft
-        # have completed their flights (and have been deleted)
-        else:
-            dbconf.conflist_all.remove(conflict)        
-            
+    conflicts = list(dbconf.conflist_act)
+    if len(conflicts) == 0:
+        return
+
+    # Index pair table of the conflicts, -1 for aircraft that have been deleted
+    id1 = np.array([traf.idmap.get(ac1, -1) for ac1, ac2 in conflicts], dtype=int)
+    id2 = np.array([traf.idmap.get(ac2, -1) for ac1, ac2 in conflicts], dtype=int)
+    swboth = (id1 >= 0) * (id2 >= 0)
+    i1 = id1[swboth]
+    i2 = id2[swboth]
+
+    # Check if conflict is past CPA
+    dlon = traf.lon[i2] - traf.lon[i1]
+    dlat = traf.lat[i2] - traf.lat[i1]
+    pastCPA = dlon * (traf.gseast[i2] - traf.gseast[i1]) + \
+        dlat * (traf.gsnorth[i2] - traf.gsnorth[i1]) > 0.
+
+    # hLOS:
+    # Aircraft should continue to resolve until there is no horizontal
+    # LOS. This is particularly relevant when vertical resolutions
+    # are used.
+    dx = (traf.lat[i1] - traf.lat[i2]) * 111319.
+    dy = (traf.lon[i1] - traf.lon[i2]) * 111319.
+    hdist2 = dx**2 + dy**2
+    hLOS   = hdist2 < dbconf.R**2
+
+    # Bouncing conflicts:
+    # If two aircraft are getting in and out of conflict continously,
+    # then they it is a bouncing conflict. ASAS should stay active until
+    # the bouncing stops.
+    bouncingConflict = (np.abs(traf.trk[i1] - traf.trk[i2]) < 30.) * (hdist2 < dbconf.Rm**2)
+
+    # Decide if conflict is over or not.
+    # If not over, turn active to true: aircraft haven't passed their CPA,
+    # so they must follow their ASAS
+    swactive = np.logical_not(pastCPA) + hLOS + bouncingConflict
+    dbconf.active[i1[swactive]] = True
+    dbconf.active[i2[swactive]] = True
+
+    # If over, then initiate recovery. If one of the aircraft has finished its
+    # flight (and has been deleted), start trajectory recovery for the other.
+    swdone = np.logical_not(swboth)
+    swdone[swboth] = np.logical_not(swactive)
+    recover = np.union1d(id1[swdone], id2[swdone])
+
+    # Waypoint recovery after conflict
+    # Find the next active waypoint and send the aircraft to that
+    # waypoint.
+    for i in recover[recover >= 0]:
+        iwp = traf.ap.route[i].findact(traf, i)
+        if iwp != -1:  # To avoid problems if there are no waypoints
+            traf.ap.route[i].direct(traf, i, traf.ap.route[i].wpname[iwp])
+
+    # If conflict is solved, or an aircraft has been deleted, remove it from
+    # conflist_act. This is so that if a conflict between this pair of
+    # aircraft occurs again, then that new conflict should be detected,
+    # logged and solved (if reso is on)
+    dbconf.conflist_act.difference_update([conflicts[k] for k in np.where(swdone)[0]])
@@ -8,6 +8,7 @@ Created on Wed Mar 04 14:27:44 2015
 import numpy as np
 from ...tools.aero import nm, ft
 import MVP
+import StateBasedCD
 
 
 def start(dbconf):
@@ -18,79 +19,119 @@ def start(dbconf):
     pass
 
 def resolve(dbconf, traf):
-    # Find matrix of neighbouring aircraft withing swarm distance
-    dx=dbconf.dx
-    dy=dbconf.dy-np.eye(traf.ntraf)*1e9 #setting distance of A/C to itself to 0,\
-                                    #correcting the distance from CASAS line 109
-    
-    close=np.logical_and(dx**2+dy**2<dbconf.Rswarm**2,\
-                    np.abs(dbconf.dalt)     <dbconf.dhswarm)
-                    
-    trkdif=traf.trk.reshape(1,traf.ntraf)-traf.trk.reshape(traf.ntraf,1)
-    dtrk=(trkdif+180)%360-180
-    samedirection=np.abs(dtrk)<90
-    
-    selected=np.logical_and(close,samedirection)
-    own=np.eye(traf.ntraf,dtype='bool')
-    
-    Swarming=np.logical_or(selected,own)
+    if not dbconf.swasas:
+        return
+
+    # Find the neighbouring aircraft within swarm distance, flying in the same
+    # direction, and their relative position and track
+    swarm, dx, dy, dtrk = Neighbours.find(dbconf, traf)
     
     # First do conflict resolution following MVP
-    MVP.resolve(dbconf)    
+    MVP.resolve(dbconf, traf)
     
     # Find desired speed vector after Collision Avoidance or Autopilot 
-    ca_trk = dbconf.active*dbconf.hdg+(1-dbconf.active)*traf.ahdg
-    ca_cas = dbconf.active*dbconf.spd+(1-dbconf.active)*traf.aspd
-    ca_vs = dbconf.active*dbconf.vs+(1-dbconf.active)*traf.avs
+    ca_trk = np.where(dbconf.active, dbconf.trk, traf.ap.trk)
+    ca_spd = np.where(dbconf.active, dbconf.spd, traf.ap.tas)
+    ca_vs  = np.where(dbconf.active, dbconf.vs, traf.ap.vs)
     
     # Add factor of Velocity Alignment to speed vector
-    hspeed=np.ones((traf.ntraf,traf.ntraf))*traf.cas
-    va_cas=np.average(hspeed,axis=1,weights=Swarming)
+    va_spd = swarm.average(traf.gs[swarm.indices])
+    va_vs  = swarm.average(traf.vs[swarm.indices])
     
-    vspeed=np.ones((traf.ntraf,traf.ntraf))*traf.vs
-    va_vs=np.average(vspeed,axis=1,weights=Swarming)
-    
-    avgdtrk=np.average(dtrk,axis=1,weights=Swarming)    
-    va_trk = traf.trk+avgdtrk
+    avgdtrk = swarm.average(dtrk)
+    va_trk  = traf.trk+avgdtrk
     
     # Add factor of Flock Centering to speed vector
-    dxflock=dx+np.eye(traf.ntraf)*dbconf.u/100.
-    dyflock=dy+np.eye(traf.ntraf)*dbconf.v/100.
-    
-    fc_dx=np.average(dxflock,axis=1,weights=Swarming)
-    fc_dy=np.average(dyflock,axis=1,weights=Swarming)
-    
-    z=np.ones((traf.ntraf,traf.ntraf))*traf.alt
-    fc_dz=np.average(z,axis=1,weights=Swarming)-traf.alt
+    fc_dx = swarm.average(dx)
+    fc_dy = swarm.average(dy)
+    fc_dz = swarm.average(traf.alt[swarm.indices])-traf.alt
     
     fc_trk=np.degrees(np.arctan2(fc_dx,fc_dy))
-    fc_cas=traf.cas
-    ttoreach=np.sqrt(fc_dx**2+fc_dy**2)/fc_cas
+    fc_spd=traf.gs
+    ttoreach=np.sqrt(fc_dx**2+fc_dy**2)/fc_spd
     fc_vs=np.where(ttoreach==0,0,fc_dz/ttoreach)
     
     # Find final Swarming directions
     trks=np.array([ca_trk,va_trk,fc_trk])
-    cass=np.array([ca_cas,va_cas,fc_cas])
+    spds=np.array([ca_spd,va_spd,fc_spd])
     vss=np.array([ca_vs,va_vs,fc_vs])
     
     trksrad=np.radians(trks)
-    vxs=cass*np.sin(trksrad)
-    vys=cass*np.cos(trksrad)
+    vxs=spds*np.sin(trksrad)
+    vys=spds*np.cos(trksrad)
     
     Swarmvx=np.average(vxs,axis=0,weights=dbconf.Swarmweights)
     Swarmvy=np.average(vys,axis=0,weights=dbconf.Swarmweights)
-    Swarmhdg=np.degrees(np.arctan2(Swarmvx,Swarmvy))
-    Swarmcas=np.average(cass,axis=0,weights=dbconf.Swarmweights)
+    Swarmtrk=np.degrees(np.arctan2(Swarmvx,Swarmvy))
+    Swarmspd=np.average(spds,axis=0,weights=dbconf.Swarmweights)
     Swarmvs=np.average(vss,axis=0,weights=dbconf.Swarmweights)
 
     # Cap the velocity
-    Swarmcascapped=np.maximum(dbconf.vmin,np.minimum(dbconf.vmax,Swarmcas))    
+    Swarmspdcapped=np.maximum(dbconf.vmin,np.minimum(dbconf.vmax,Swarmspd))
     # Assign Final Swarming directions to traffic
-    dbconf.hdg=Swarmhdg
-    dbconf.spd=Swarmcascapped
+    dbconf.trk=Swarmtrk
+    dbconf.spd=Swarmspdcapped
     dbconf.vs =Swarmvs
     dbconf.alt=np.sign(Swarmvs)*1e5
     
     # Make sure that all aircraft follow these directions
-    dbconf.active.fill(True)
+    dbconf.active[:] = traf.active
     pass
+
+
+class Neighbours:
+    """ Sparse matrix (CSR) of the swarm of each aircraft: the neighbours of
+        aircraft i are indices[indptr[i]:indptr[i+1]], with their weights.
+        Each aircraft is part of its own swarm, the free slots of deleted
+        aircraft have an empty swarm. """
+    def __init__(self, ntraf, iown, ioth, weights=None):
+        self.ntraf   = ntraf
+        self.iown    = iown
+        self.indptr  = np.searchsorted(iown, np.arange(ntraf + 1))
+        self.indices = ioth
+        self.weights = np.ones(len(ioth)) if weights is None else weights
+        self.wsum    = np.bincount(iown, self.weights, ntraf)
+
+    def average(self, values):
+        """ Weighted average per aircraft of values (one per neighbour),
+            zero for an empty swarm """
+        return np.bincount(self.iown, self.weights * values, self.ntraf) / \
+            np.where(self.wsum > 0., self.wsum, 1.)
+
+    @staticmethod
+    def find(dbconf, traf):
+        """ Swarm of each aircraft: the aircraft within dbconf.Rswarm and
+            dbconf.dhswarm, with a track difference below 90 degrees, from a
+            radius query on the positions received through ADSB. Returns the
+            swarms, and per neighbour the relative position dx, dy [m] and the
+            track difference [deg]. For the aircraft itself, the relative
+            position is its speed vector / 100. """
+        i, j = StateBasedCD.BroadPhase(dbconf, traf, reach=dbconf.Rswarm).rows(0, traf.ntraf)
+
+        # Leave out the free slots of deleted aircraft
+        if traf.freeslots:
+            swactive = traf.active[i] * traf.active[j]
+            i, j = i[swactive], j[swactive]
+
+        qdr, dist = StateBasedCD.flatqdrdist(traf.lat[i], traf.lon[i],
+                                             traf.adsb.lat[j], traf.adsb.lon[j])
+        qdrrad = np.radians(qdr)
+        dx     = dist * np.sin(qdrrad)
+        dy     = dist * np.cos(qdrrad)
+        dtrk   = (traf.trk[j] - traf.trk[i] + 180) % 360 - 180
+
+        close = (dx**2 + dy**2 < dbconf.Rswarm**2) * \
+            (np.abs(traf.adsb.alt[j] - traf.alt[i]) < dbconf.dhswarm)
+        samedirection = np.abs(dtrk) < 90
+        selected = np.where(close * samedirection)[0]
+
+        # Add the aircraft themselves, and sort on own aircraft
+        own   = np.where(traf.active)[0]
+        iown  = np.concatenate((i[selected], own))
+        order = np.argsort(iown, kind="mergesort")
+        ioth  = np.concatenate((j[selected], own))[order]
+        dx    = np.concatenate((dx[selected], traf.gseast[own] / 100.))[order]
+        dy    = np.concatenate((dy[selected], traf.gsnorth[own] / 100.))[order]
+        dtrk  = np.concatenate((dtrk[selected], np.zeros(len(own))))[order]
+
+        return Neighbours(traf.ntraf, iown[order], ioth), dx, dy, dtrk
@@ -4,14 +4,9 @@ from ...tools.aero import ft, nm
 from ...tools.dynamicarrays import DynamicArrays, RegisterElementParameters
 
 
-# Import default CD methods
-try:
-    import casas as StateBasedCD
-except ImportError:
-    StateBasedCD = False
-
-if not settings.prefer_compiled or not StateBasedCD:
-    import StateBasedCD
+# Import default CD methods (StateBasedCD uses the compiled casas module, if
+# preferred and available)
+import StateBasedCD
 
 # Import default CR methods
 import DoNothing
@@ -19,6 +14,10 @@ import Eby
 import MVP
 import Swarm
 
+# Priority rules and cache of conflict resolution
+import PrioRules
+from ResoCache import ResoCache
+
 
 class ASAS(DynamicArrays):
     """ Central class for ASAS conflict detection and resolution.
@@ -38,6 +37,10 @@ class ASAS(DynamicArrays):
     def addCRMethod(asas, name, module):
         asas.CRmethods[name] = module
 
+    @classmethod
+    def addPrioRule(asas, priocode, rule, description=""):
+        PrioRules.addRule(priocode, rule, description)
+
     def __init__(self, traf):
         self.traf = traf
         with RegisterElementParameters(self):
@@ -45,6 +48,7 @@ class ASAS(DynamicArrays):
             self.iconf    = []            # index in 'conflicting' aircraft database
 
             self.active   = np.array([], dtype=bool)  # whether the autopilot follows ASAS or not
+            self.newintent = np.array([], dtype=bool) # whether the aircraft changed intent since the last CD
             self.trk      = np.array([])  # heading provided by the ASAS [deg]
             self.spd      = np.array([])  # speed provided by the ASAS (eas) [m/s]
             self.alt      = np.array([])  # speed alt by the ASAS [m]
@@ -71,6 +75,13 @@ class ASAS(DynamicArrays):
         self.dhm          = self.dh * self.mar         # [m] Vertical separation minimum for resolution
         self.swasas       = True                       # [-] whether to perform CD&R
         self.tasas        = 0.0                        # Next time ASAS should be called
+        self.swbroadphase = settings.asas_broadphase   # [-] whether CD only checks pairs within reach
+        self.blocksize    = settings.asas_blocksize    # [-] maximum number of pairs per CD tile
+        self.swadaptive   = settings.asas_adaptive     # [-] whether CD only re-checks pairs when they can be in conflict
+        self.cdgeom       = settings.asas_cdgeom       # [-] geometry of the CD: WGS84 or FLAT (local tangent plane)
+        self.schedule     = None                       # [-] schedule of the pair checks of the adaptive CD
+        self.swresocache  = settings.asas_resocache    # [-] whether CR reuses the resolutions of unchanged conflicts
+        self.resocache    = ResoCache()                # [-] cache of the resolutions, per conflict pair
 
         self.vmin         = 51.4                       # [m/s] Minimum ASAS velocity (100 kts)
         self.vmax         = 308.6                      # [m/s] Maximum ASAS velocity (600 kts)
@@ -84,7 +95,7 @@ class ASAS(DynamicArrays):
         self.swresocoop   = False                      # [-] switch to limit resolution magnitude to half (cooperative resolutions) 
         
         self.swprio       = False                      # [-] switch to activate priority rules for conflict resolution
-        self.priocode     = "FF1"                      # [-] Code of the priority rule that is to be used (FF1, FF2, FF3, LAY1, LAY2)
+        self.priocode     = "FF1"                      # [-] Code of the priority rule that is to be used (see PrioRules)
         
         self.swnoreso     = False                      # [-] switch to activate the NORESO command. Nobody will avoid conflicts with  NORESO aircraft 
         self.noresolst    = []                         # [-] list for NORESO command. Nobody will avoid conflicts with aircraft in this list
@@ -101,21 +112,72 @@ class ASAS(DynamicArrays):
         self.lonowncpa    = np.array([])
         self.altowncpa    = np.array([])
 
-        self.conflist_all = []  # List of all Conflicts
-        self.LOSlist_all  = []  # List of all Losses Of Separation
-        self.conflist_exp = []  # List of all Conflicts in experiment time
-        self.LOSlist_exp  = []  # List of all Losses Of Separation in experiment time
-        self.conflist_now = []  # List of current Conflicts
-        self.LOSlist_now  = []  # List of current Losses Of Separation
-
-        # For keeping track of locations with most severe intrusions
-        self.LOSmaxsev    = []
-        self.LOShmaxsev   = []
-        self.LOSvmaxsev   = []
-
-    def toggle(self, flag=None):
+        # Data per conflict, in the same order as confpairs
+        self.iown         = np.array([], dtype=int)    # [-] index of own aircraft
+        self.ioth         = np.array([], dtype=int)    # [-] index of intruder
+        self.qdr          = np.array([])               # [deg] bearing from own aircraft to intruder
+        self.dist         = np.array([])               # [m] distance between own aircraft and intruder
+        self.tcpa         = np.array([])               # [s] time to CPA
+        self.tinconf      = np.array([])               # [s] time to start of conflict
+        self.toutconf     = np.array([])               # [s] time to end of conflict
+        self.tinconfmin   = np.array([])               # [s] per aircraft: earliest tinconf of its conflicts
+
+        # Registry of conflicts and Losses Of Separation, per aircraft pair.
+        # Key of a pair is the tuple of both aircraft ids, in sorted order.
+        self.conflist_all = dict()  # All Conflicts: pair -> time of first detection
+        self.conflist_act = set()   # Conflicts of which the aircraft follow ASAS until
+                                    # past CPA (see APorASAS)
+        self.LOSlist_all  = dict()  # All LOS: pair -> [time of first LOS, max severity,
+                                    #                   horizontal and vertical severity]
+        self.conflist_exp = set()   # Pairs in conflict within experiment time
+        self.LOSlist_exp  = set()   # Pairs in LOS within experiment time
+        self.conflist_now = []      # Current Conflicts: (id1, id2) of own aircraft and intruder
+        self.LOSlist_now  = []      # Current Losses Of Separation: (id1, id2)
+
+        # Counters of conflicts and LOS, for the statistics
+        self.nconf_tot    = 0       # Number of pairs with a conflict
+        self.nlos_tot     = 0       # Number of pairs with a LOS
+        self.nconf_exp    = 0       # Number of conflicts within experiment time
+        self.nlos_exp     = 0       # Number of LOS within experiment time
+
+    def toggle(self, flag=None, value=None):
         if flag is None:
-            return True, "ASAS is currently " + ("ON" if self.swasas else "OFF")
+            return True, "ASAS ON/OFF, ASAS BROADPHASE/ADAPTIVE/RESOCACHE ON/OFF or ASAS BLOCKSIZE npairs" + \
+                         "\nASAS is currently " + ("ON" if self.swasas else "OFF") + \
+                         "\nBroad phase is currently " + ("ON" if self.swbroadphase else "OFF") + \
+                         "\nAdaptive CD is currently " + ("ON" if self.swadaptive else "OFF") + \
+                         "\nBlock size is currently %d pairs" % self.blocksize + \
+                         "\nResolution cache is currently " + ("ON" if self.swresocache else "OFF") + \
+                         ", hit rate %.1f%% (%d of %d aircraft in conflict)" % \
+                         (self.resocache.hitrate(), self.resocache.nhit, self.resocache.nlookup)
+        if flag == "BROADPHASE":
+            if value not in ["ON", "OFF"]:
+                return False, "ASAS BROADPHASE ON/OFF"
+            self.swbroadphase = value == "ON"
+            return True
+        if flag == "ADAPTIVE":
+            if value not in ["ON", "OFF"]:
+                return False, "ASAS ADAPTIVE ON/OFF"
+            self.swadaptive = value == "ON"
+            self.schedule   = None
+            return True
+        if flag == "RESOCACHE":
+            if value not in ["ON", "OFF"]:
+                return False, "ASAS RESOCACHE ON/OFF"
+            self.swresocache = value == "ON"
+            self.resocache   = ResoCache()
+            return True
+        if flag == "BLOCKSIZE":
+            try:
+                blocksize = int(value)
+            except (TypeError, ValueError):
+                blocksize = 0
+            if blocksize < 1:
+                return False, "ASAS BLOCKSIZE npairs"
+            self.blocksize = blocksize
+            return True
+        if flag not in [True, False]:
+            return False, "ASAS ON/OFF, ASAS BROADPHASE/ADAPTIVE/RESOCACHE ON/OFF or ASAS BLOCKSIZE npairs"
         self.swasas = flag
         return True
 
@@ -129,6 +191,15 @@ class ASAS(DynamicArrays):
         self.cd_name = method
         self.cd = ASAS.CDmethods[method]
 
+    def SetCDgeom(self, geom=""):
+        if geom == "":
+            return True, ("CDGEOM [WGS84/FLAT]\nCurrent CD geometry: " + self.cdgeom)
+        if geom not in ["WGS84", "FLAT"]:
+            return False, "CDGEOM WGS84/FLAT"
+
+        self.cdgeom = geom
+        return True
+
     def SetCRmethod(self, method=""):
         if method is "":
             return True, ("Current CR method: " + self.cr_name +
@@ -266,15 +337,12 @@ class ASAS(DynamicArrays):
                      
     def SetPrio(self, flag=None, priocode="FF1"):
         '''Set the prio switch and the type of prio '''
-        options = ["FF1","FF2","FF3","LAY1","LAY2"]        
+        options = PrioRules.rules.keys()
         if flag is None:
             return True, "PRIORULES [ON/OFF] [PRIOCODE]"  + \
                          "\nAvailable priority codes: " + \
-                         "\n     FF1:  Free Flight Primary (No Prio) " + \
-                         "\n     FF2:  Free Flight Secondary (Cruising has priority)" + \
-                         "\n     FF3:  Free Flight Tertiary (Climbing/descending has priority)" + \
-                         "\n     LAY1: Layers Primary (Cruising has priority + horizontal resolutions)" + \
-                         "\n     LAY2: Layers Secondary (Climbing/descending has priority + horizontal resolutions)" + \
+                         "".join("\n     %-5s %s" % (code + ":", PrioRules.rules[code][1])
+                                 for code in options) + \
                          "\nPriority is currently " + ("ON" if self.swprio else "OFF") + \
                          "\nPriority code is currently: " + str(self.priocode)                        
         self.swprio = flag         
@@ -324,13 +392,94 @@ class ASAS(DynamicArrays):
         # active the switch, if there are acids in the list
         self.swresooff = len(self.resoofflst)>0  
 
-    def create(self):
-        super(ASAS, self).create()
+    def create(self, n=1):
+        super(ASAS, self).create(n)
 
         # ASAS output commanded values
-        self.trk[-1] = self.traf.trk[-1]
-        self.spd[-1] = self.traf.tas[-1]
-        self.alt[-1] = self.traf.alt[-1]
+        self.trk[-n:] = self.traf.trk[-n:]
+        self.spd[-n:] = self.traf.tas[-n:]
+        self.alt[-n:] = self.traf.alt[-n:]
+
+    def delete(self, idx):
+        super(ASAS, self).delete(idx)
+
+        # Remove the current conflicts of the deleted aircraft. Traffic deletes
+        # its own lists before those of its submodules, so traf.id only contains
+        # the remaining aircraft. conflist_act is kept: APorASAS uses it to
+        # start the waypoint recovery of the other aircraft in the conflict.
+        ids  = set(self.traf.id)
+        keep = [k for k, pair in enumerate(self.confpairs)
+                if pair[0] in ids and pair[1] in ids]
+
+        # Aircraft indices of the remaining conflicts, after the deletion
+        if len(self.iown) == len(self.confpairs):
+            idx = np.atleast_1d(idx)
+            self.iown = self.iown[keep] - np.searchsorted(idx, self.iown[keep])
+            self.ioth = self.ioth[keep] - np.searchsorted(idx, self.ioth[keep])
+
+        if len(keep) == len(self.confpairs):
+            return
+
+        # New conflict index of the remaining conflicts
+        newidx = dict(zip(keep, range(len(keep))))
+        self.iconf     = [[newidx[k] for k in ic if k in newidx] for ic in self.iconf]
+        self.confpairs = [self.confpairs[k] for k in keep]
+        self.nconf     = len(keep)
+        self.latowncpa = np.array(self.latowncpa)[keep]
+        self.lonowncpa = np.array(self.lonowncpa)[keep]
+        self.altowncpa = np.array(self.altowncpa)[keep]
+        self.qdr       = self.qdr[keep]
+        self.dist      = self.dist[keep]
+        self.tcpa      = self.tcpa[keep]
+        self.tinconf   = self.tinconf[keep]
+        self.toutconf  = self.toutconf[keep]
+
+        self.conflist_now = [pair for pair in self.conflist_now if set(pair) <= ids]
+        self.LOSlist_now  = [pair for pair in self.LOSlist_now if set(pair) <= ids]
+
+    def moveslots(self, src, dst):
+        super(ASAS, self).moveslots(src, dst)
+
+        # Conflicts of the moved aircraft
+        newidx = np.arange(len(self.active))
+        newidx[src] = dst
+        self.iown = newidx[self.iown]
+        self.ioth = newidx[self.ioth]
+
+    def intent(self, idx):
+        """ Aircraft idx changes intent (autopilot command or next waypoint):
+            the adaptive CD re-checks its pairs at the next update """
+        self.newintent[idx] = True
+
+    def register(self, simt, experimenttime, conflicts, los, severity):
+        """ Register the current conflicts and LOS, given as lists of (id1, id2)
+            with one entry per pair. severity contains (severity, horizontal
+            severity, vertical severity) of each LOS pair. """
+        self.conflist_now = conflicts
+        self.LOSlist_now  = los
+
+        for pair in conflicts:
+            key = pair if pair[0] < pair[1] else (pair[1], pair[0])
+            if key not in self.conflist_all:
+                self.conflist_all[key] = simt
+                self.nconf_tot += 1
+            self.conflist_act.add(key)
+            if experimenttime and key not in self.conflist_exp:
+                self.conflist_exp.add(key)
+                self.nconf_exp += 1
+
+        # Keep the most severe intrusion of each LOS pair
+        for pair, sevs in zip(los, severity):
+            key = pair if pair[0] < pair[1] else (pair[1], pair[0])
+            record = self.LOSlist_all.get(key)
+            if record is None:
+                record = self.LOSlist_all[key] = [simt, 0., 0., 0.]
+                self.nlos_tot += 1
+            if experimenttime and key not in self.LOSlist_exp:
+                self.LOSlist_exp.add(key)
+                self.nlos_exp += 1
+            if sevs[0] > record[1]:
+                record[1:] = list(sevs)
 
     def update(self, simt):
         iconf0 = np.array(self.iconf)
@@ -341,10 +490,15 @@ class ASAS(DynamicArrays):
 
             # Conflict detection and resolution
             self.cd.detect(self, self.traf, simt)
-            self.cr.resolve(self, self.traf)
+            if self.swresocache and getattr(self.cr, "cacheable", False):
+                self.resocache.resolve(self, self.traf, simt)
+            else:
+                self.cr.resolve(self, self.traf)
 
         # Change labels in interface
         if settings.gui == "pygame":
             for i in range(self.traf.ntraf):
+                if not self.traf.active[i]:
+                    continue  # free slot of a deleted aircraft
                 if np.any(iconf0[i] != self.iconf[i]):
                     self.traf.label[i] = [" ", " ", " ", " "]
\ No newline at end of file
@@ -1,110 +1,142 @@
-#include <cmath>
 #include <pyhelpers.hpp>
 #include <geo.hpp>
-#include <iostream>
 #include <cmath>
+#include <string.h>
 #include <algorithm>
 
+#define DEG2RAD 0.017453292519943295
+#define RAD2DEG 57.29577951308232
+
 struct Dbconf {
-    PyObject* self;
     double dtlookahead, R, R2, dh;
-    int nconf;
-    // Per aircraft arrays/lists
-    PyBoolArrayAttr asasactive;// not recreated with each call to detect
-    PyListAttr  iconf;// iconf is a list of (empty) lists
-    // Per conflict lists
-    PyListAttr latowncpa, lonowncpa, altowncpa, confpairs,
-               LOSlist_now, LOSlist_exp, LOSlist_all, 
-               conflist_now, conflist_exp, conflist_all;
-    // Also used in CR methods, but not yet created here:
-    // qdr, dist, u, v, dx, dy, tcpa, dalt, tinconf, toutconf
-    // LOSmaxsev, LOShmaxsev, LOSvmaxsev
-
-    Dbconf(PyObject* self) : self(self),
+    bool flat;  // CDGEOM FLAT: local tangent plane instead of WGS'84
+
+    Dbconf(PyObject* self) :
         dtlookahead(GetAttrDouble(self, "dtlookahead")), R(GetAttrDouble(self, "R")),
-        dh(GetAttrDouble(self, "dh")), nconf(0), asasactive(self, "asasactive")
-        {R2 = R * R;}
-
-    void copyback() {
-        PyObject_SetAttrString(self, "latowncpa", latowncpa.attr);
-        PyObject_SetAttrString(self, "lonowncpa", lonowncpa.attr);
-        PyObject_SetAttrString(self, "altowncpa", altowncpa.attr);
-        PyObject_SetAttrString(self, "confpairs", confpairs.attr);
-        PyObject_SetAttrString(self, "iconf", iconf.attr);
-        PyObject_SetAttrString(self, "nconf", PyInt_FromLong(nconf));
+        dh(GetAttrDouble(self, "dh"))
+    {
+        R2 = R * R;
+        PyAttr cdgeom(self, "cdgeom");
+        if (cdgeom.attr == NULL)
+            PyErr_Clear();  // No geometry given: WGS'84
+        flat = cdgeom.attr != NULL && PyString_Check(cdgeom.attr) &&
+               strcmp(PyString_AsString(cdgeom.attr), "FLAT") == 0;
     }
 };
 
-struct conflict {double tin, tout, latcpa, loncpa; bool LOS; };
-inline bool detect_hor(const Dbconf& params, conflict& conf,
-                       const qdr_d_in& ll1, const double& gs1, const double& trk1,
-                       const qdr_d_in& ll2, const double& gs2, const double& trk2)
+// Results of the conflict detection of one pair, see StateBasedCD.pairconflicts
+struct PairConf {
+    double qdr, dist, tcpa, tinconf, toutconf;
+    bool   swconfl;
+};
+
+// Earth radius [m] at latitude latd [deg], with the operations of geo.rwgs84_matrix
+inline double rwgs84d(const double& latd)
+{
+    double lat = latd * DEG2RAD;
+    double an  = a * a * cos(lat),
+           bn  = b * b * sin(lat),
+           ad  = a * cos(lat),
+           bd  = b * sin(lat);
+    return sqrt((an * an + bn * bn) / (ad * ad + bd * bd));
+}
+
+// Bearing [deg] and distance [m] from 1 to 2, and if qdrback is given the
+// bearing from 2 to 1, see StateBasedCD.wgsqdrdist
+inline void wgsqdrdist(const double& lat1, const double& lon1,
+                       const double& lat2, const double& lon2,
+                       double& qdr, double& dist, double* qdrback = NULL)
 {
-    double u1        = gs1 * sin(trk1),
-           v1        = gs1 * cos(trk1),
-           u2        = gs2 * sin(trk2),
-           v2        = gs2 * cos(trk2);
-    double du        = u1 - u2,
-           dv        = v1 - v2;
-
-   // First a coarse flat-earth check to skip the most unlikely candidates for a conflict
-   if (std::max((fabs(ll2.lon - ll1.lon) * std::min(ll1.coslat, ll2.coslat) * re - params.R) / fabs(du),
-                 (fabs(ll2.lat - ll1.lat) * re - params.R) / fabs(dv))
-        > 1.05 * params.dtlookahead)
-     return false;
-
-    double d         = dist(ll1, ll2),
-           q         = qdr(ll1, ll2);
-    double dx        = d * sin(q),
-           dy        = d * cos(q);
-           
-
-    double vreldotdx = du * dx + dv * dy;
-    conf.LOS         = d < params.R;
-    
-    // If diverging and separated, no horizontal conflict
-    if (vreldotdx < 0.0 && !conf.LOS) return false;
-
-    double vrel2     = (du * du + dv * dv);
-    if (conf.LOS) {
-        // Horizontal separation is already lost: calculate PZ exit time
-        conf.tin     = 0.0;
-        conf.tout    = (sqrt(vreldotdx * vreldotdx - d * d * vrel2) - vreldotdx) / (d * d);
-        conf.latcpa  = ll1.lat;
-        conf.loncpa  = ll1.lon;
-        return true;
+    double r;
+    if (lat1 * lat2 < 0.0) {
+        r = 0.5 * (fabs(lat1) * (rwgs84d(lat1) + a) + fabs(lat2) * (rwgs84d(lat2) + a)) /
+            (fabs(lat1) + (fabs(lat2) + (lat1 == 0.0) * 0.000001));
     } else {
-        double t_cpa = vreldotdx / vrel2;
-        double CPA2  = d * d - vreldotdx * t_cpa;
-        double dt    = sqrt((params.R2 - CPA2) / vrel2);
-        conf.tin     = t_cpa - dt;
-        conf.tout    = t_cpa + dt;
-        // Calculate CPA position of AC1 if conflict is in detection range
-        if (conf.tin <= params.dtlookahead) {
-          conf.latcpa = ll1.lat + v1 * t_cpa / re;
-          conf.loncpa = ll1.lon + u1 * t_cpa / re / ll1.coslat;
-          return true;
-        }
+        r = rwgs84d(lat1 + lat2);
     }
-    return false;
+
+    double dlat    = (lat2 - lat1) * DEG2RAD,
+           dlon    = (lon2 - lon1) * DEG2RAD,
+           latrad1 = lat1 * DEG2RAD,
+           latrad2 = lat2 * DEG2RAD,
+           sinlat1 = sin(latrad1),
+           sinlat2 = sin(latrad2),
+           coslat1 = cos(latrad1),
+           coslat2 = cos(latrad2);
+
+    double sindlat = sin(dlat / 2.0),
+           sindlon = sin(dlon / 2.0),
+           root    = sindlat * sindlat + (coslat1 * coslat2) * (sindlon * sindlon);
+    dist = r * (2.0 * atan2(sqrt(root), sqrt(1.0 - root)));
+
+    double sinlon = sin(dlon),
+           coslon = cos(dlon);
+    qdr  = atan2(sinlon * coslat2,
+                 coslat1 * sinlat2 - (sinlat1 * coslat2) * coslon) * RAD2DEG;
+    if (qdrback)
+        *qdrback = atan2(-sinlon * coslat1,
+                         coslat2 * sinlat1 - (sinlat2 * coslat1) * coslon) * RAD2DEG;
 }
 
-inline bool detect_ver(const Dbconf& params, conflict& conf,
-                       const double& dalt, const double& dvs)
+// Bearing [deg] and distance [m] from 1 to 2 in the local tangent plane, and
+// if qdrback is given the bearing from 2 to 1, see StateBasedCD.flatqdrdist
+inline void flatqdrdist(const double& lat1, const double& lon1,
+                        const double& lat2, const double& lon2,
+                        double& qdr, double& dist, double* qdrback = NULL)
 {
-    conf.LOS = fabs(dalt) < params.dh;
-    if (fabs(dvs) > 1e-6) {
-        double tcrosshi = (dalt + params.dh) / -dvs,
-               tcrosslo = (dalt - params.dh) / -dvs;
+    // Longitude difference in [-180, 180), with the modulo of numpy
+    double dlond = fmod(lon2 - lon1 + 180.0, 360.0);
+    if (dlond < 0.0) dlond += 360.0;
 
-        conf.tin  = std::max(0.0, std::min(tcrosslo, tcrosshi));
-        conf.tout = std::max(tcrosslo, tcrosshi);
+    double r     = rwgs84d(lat1 + lat2),
+           latm  = (0.5 * (lat1 + lat2)) * DEG2RAD,
+           dlon  = (dlond - 180.0) * DEG2RAD,
+           north = (lat2 - lat1) * DEG2RAD * r,
+           east  = dlon * cos(latm) * r;
 
-        // Vertical conflict if t_in is within lookahead horizon, and t_out > 0
-        return (conf.tin <= params.dtlookahead && conf.tout > 0.0);
-    } else {
-        conf.tin  = 0.0;
-        conf.tout = 1e4;
-        return conf.LOS;
-    }
+    double sinlatm = sin(latm);
+    qdr  = (atan2(east, north) - 0.5 * dlon * sinlatm) * RAD2DEG;
+    dist = sqrt(north * north + east * east);
+    if (qdrback)
+        *qdrback = (atan2(-east, -north) + 0.5 * dlon * sinlatm) * RAD2DEG;
+}
+
+// Conflict detection of one pair, with the operations of
+// StateBasedCD.pairdetect: horizontal CPA and PZ crossing times, and vertical
+// crossing times.
+inline void detect_pair(const Dbconf& params, PairConf& conf,
+                        const double& qdr, const double& dist,
+                        const double& du, const double& dv,
+                        const double& dalt, const double& dvs)
+{
+    conf.qdr  = qdr;
+    conf.dist = dist;
+
+    // Horizontal conflict
+    double qdrrad = qdr * DEG2RAD;
+    double dx     = dist * sin(qdrrad),
+           dy     = dist * cos(qdrrad);
+
+    double dv2    = du * du + dv * dv;
+    if (fabs(dv2) < 1e-6) dv2 = 1e-6;  // limit lower absolute value
+    double vrel   = sqrt(dv2);
+
+    conf.tcpa     = -(du * dx + dv * dy) / dv2;
+    double dcpa2  = dist * dist - conf.tcpa * conf.tcpa * dv2;
+
+    bool swhorconf = dcpa2 < params.R2;
+    double dtinhor = sqrt(std::max(0.0, params.R2 - dcpa2)) / vrel;
+    double tinhor  = swhorconf ? conf.tcpa - dtinhor : 1e8,
+           touthor = swhorconf ? conf.tcpa + dtinhor : -1e8;
+
+    // Vertical conflict
+    double vs       = fabs(dvs) < 1e-6 ? 1e-6 : dvs;
+    double tcrosshi = (dalt + params.dh) / -vs,
+           tcrosslo = (dalt - params.dh) / -vs;
+
+    conf.tinconf  = std::max(std::min(tcrosshi, tcrosslo), tinhor);
+    conf.toutconf = std::min(std::max(tcrosshi, tcrosslo), touthor);
+
+    conf.swconfl = swhorconf && conf.tinconf <= conf.toutconf &&
+                   conf.toutconf > 0.0 && conf.tinconf < params.dtlookahead;
 }
@@ -1,111 +1,155 @@
-#include <iostream>
-#include <vector>
 #include "asas.hpp"
-#define DEG2RAD 0.017453292519943295
-#define RAD2DEG 57.29577951308232
-#define M2NM 0.0005399568034557236
-#define NM2M 1852.0
-#define KTS2MS 0.514444
-#define FT2M 0.3048
-#define FPM2MS 0.00508
-
-static PyObject* casas_detect(PyObject* self, PyObject* args)
+#include <vector>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// Minimum number of pairs for the parallel loop over the pairs (OpenMP)
+#define OMP_MINPAIRS 10000
+
+// New reference to a borrowed object, for the attribute wrappers that
+// release their reference when done
+inline PyObject* borrowed(PyObject* obj) {Py_XINCREF(obj); return obj;}
+
+static PyObject* casas_pairconflicts(PyObject* self, PyObject* args)
 {
-    PyObject *pyasas = NULL,
-             *traf   = NULL;
-    double   simt;
-    if (!PyArg_ParseTuple(args, "OOd", &pyasas, &traf, &simt))
+    PyObject *pyasas = NULL, *traf = NULL, *pyi = NULL, *pyj = NULL,
+             *own    = NULL, *noise = NULL;
+    int symmetric = 0;
+    if (!PyArg_ParseTuple(args, "OOOOOO|i", &pyasas, &traf, &pyi, &pyj, &own,
+                          &noise, &symmetric))
         return NULL;
 
-    PyDoubleArrayAttr lat1(traf, "lat"),     lon1(traf, "lon"),     trk1(traf, "trk"),
-                      gs1 (traf, "gs"),      alt1(traf, "alt"),     vs1 (traf, "vs"),
-                      lat2(traf, "adsblat"), lon2(traf, "adsblon"), trk2(traf, "adsbtrk"),
-                      gs2 (traf, "adsbgs"),  alt2(traf, "adsbalt"), vs2 (traf, "adsbvs");
+    if (!PyTuple_Check(own) || PyTuple_Size(own) != 5) {
+        PyErr_SetString(PyExc_TypeError, "own should be (u, v, adsbu, adsbv, adsbalt)");
+        return NULL;
+    }
+    bool swnoise = noise != Py_None;
+    if (swnoise && (!PyTuple_Check(noise) || PyTuple_Size(noise) != 2)) {
+        PyErr_SetString(PyExc_TypeError, "noise should be None or (bearingerror, disterror)");
+        return NULL;
+    }
 
-    PyListAttr  acid(traf, "id");
+    PyAttr adsb(traf, "adsb");
+    if (adsb.attr == NULL)
+        return NULL;
+
+    // Own state, and state of the intruders as received through ADSB
+    PyDoubleArrayAttr lat1(traf, "lat"),       lon1(traf, "lon"),
+                      alt (traf, "alt"),       vs  (traf, "vs"),
+                      lat2(adsb.attr, "lat"),  lon2(adsb.attr, "lon"),
+                      adsbvs(adsb.attr, "vs"),
+                      u      (borrowed(PyTuple_GET_ITEM(own, 0))),
+                      v      (borrowed(PyTuple_GET_ITEM(own, 1))),
+                      adsbu  (borrowed(PyTuple_GET_ITEM(own, 2))),
+                      adsbv  (borrowed(PyTuple_GET_ITEM(own, 3))),
+                      adsbalt(borrowed(PyTuple_GET_ITEM(own, 4))),
+                      bearingerror(borrowed(swnoise ? PyTuple_GET_ITEM(noise, 0) : NULL)),
+                      disterror   (borrowed(swnoise ? PyTuple_GET_ITEM(noise, 1) : NULL));
+    PyIntpArrayAttr   i(borrowed(pyi)), j(borrowed(pyj));
 
     // Only continue if all arrays exist
-    if (lat1 && lon1 && trk1 && gs1  && alt1 && vs1  && lat2 && lon2 && trk2 && gs2  && alt2 && vs2)
-    {
-        // Assume all arrays are the same size; only get the size of lat1
-        npy_intp  size  = lat1.size();
-
-        // Wrap dbconf in C struct
-        Dbconf dbconf(pyasas);
-
-        // Loop over all combinations of aircraft to detect conflicts
-        conflict confhor, confver;
-        double tin, tout;
-        double dalt, dvs;
-        qdr_d_in ll1;
-        std::vector<qdr_d_in> ll2(size);
-        std::vector<qdr_d_in>::iterator pll2 = ll2.begin();
-        npy_bool asasactive = NPY_FALSE;
-
-        // Pre-calculate intruder data
-        for (unsigned int i = 0; i < size; ++i) {
-            pll2->init(*lat2.ptr * DEG2RAD, *lon2.ptr * DEG2RAD);
-            lat2.ptr++; lon2.ptr++; pll2++;
+    if (!(lat1 && lon1 && alt && vs && lat2 && lon2 && adsbvs && u && v &&
+          adsbu && adsbv && adsbalt && i && j) ||
+        (swnoise && !(bearingerror && disterror)))
+        return NULL;
+
+    Dbconf    dbconf(pyasas);
+    npy_intp  npairs = i.size(),
+              nconf  = 0;
+
+    // Results of the pairs (i, j), followed by those of the mirrored pairs
+    // (j, i) if symmetric
+    std::vector<PairConf> confs(symmetric ? 2 * npairs : npairs);
+
+    Py_BEGIN_ALLOW_THREADS
+
+    // Conflict detection of all pairs, optionally in parallel
+    #pragma omp parallel for schedule(static) if (npairs > OMP_MINPAIRS)
+    for (npy_intp k = 0; k < npairs; ++k) {
+        npy_intp ik = i.ptr[k],
+                 jk = j.ptr[k];
+        PairConf& conf = confs[k];
+
+        // qdr and dist from i to j, from perception of ADSB and own
+        // coordinates, and the bearing from j to i of the mirrored pair
+        double qdr, dist, qdrback;
+        double* pqdrback = symmetric ? &qdrback : NULL;
+        if (dbconf.flat)
+            flatqdrdist(lat1.ptr[ik], lon1.ptr[ik], lat2.ptr[jk], lon2.ptr[jk], qdr, dist, pqdrback);
+        else
+            wgsqdrdist(lat1.ptr[ik], lon1.ptr[ik], lat2.ptr[jk], lon2.ptr[jk], qdr, dist, pqdrback);
+
+        // Transmission noise
+        if (swnoise) {
+            qdr  += bearingerror.ptr[k];
+            dist += disterror.ptr[k];
         }
-        
-        for (unsigned int i = 0; i < size; ++i) {
-            ll1.init(*lat1.ptr * DEG2RAD, *lon1.ptr * DEG2RAD);
-            pll2 = ll2.begin();
-            PyListAttr acconfids;
-            for (unsigned int j = 0; j < size; ++j) {
-                if (i != j) {
-                    // Vectical detection first
-                    dalt = *alt1.ptr - *alt2.ptr;
-                    dvs  = *vs1.ptr  - *vs2.ptr;
-                    if (detect_ver(dbconf, confver, dalt, dvs)) {
-                        // Horizontal detection
-                        if (detect_hor(dbconf, confhor, 
-                                       ll1,   *gs1.ptr, *trk1.ptr * DEG2RAD,
-                                       *pll2, *gs2.ptr, *trk2.ptr * DEG2RAD)) {
-                            tin  = std::max(confhor.tin, confver.tin);
-                            tout = std::min(confhor.tout, confver.tout);
-                            // Combined conflict?
-                            if (tin <= dbconf.dtlookahead && tin < tout && tout > 0.0) {
-                                // Add AC id to conflict list
-                                dbconf.confpairs.append(PyTuple_Pack(2, acid[i], acid[j]));
-                                dbconf.latowncpa.append(confhor.latcpa * RAD2DEG);
-                                dbconf.lonowncpa.append(confhor.loncpa * RAD2DEG);
-
-                                // Keep index for current ownship and increase conflict count
-                                acconfids.append(dbconf.nconf);
-                                dbconf.nconf++;
-                                asasactive = NPY_TRUE;// ASAS should be active for this aircraft
-                            }
-                        }
-                    }
-                }
-                pll2++; trk2.ptr++; gs2.ptr++; alt2.ptr++; vs2.ptr++;
-            }
-            dbconf.iconf.append(acconfids.attr);
-            *dbconf.asasactive.ptr = asasactive;
-            dbconf.asasactive.ptr++;
-            asasactive = NPY_FALSE;
-            trk2.ptr = trk2.ptr_start; gs2.ptr  = gs2.ptr_start;
-            alt2.ptr = alt2.ptr_start; vs2.ptr  = vs2.ptr_start;
-            lat1.ptr++; lon1.ptr++; trk1.ptr++; gs1.ptr++; alt1.ptr++; vs1.ptr++;
+
+        detect_pair(dbconf, conf, qdr, dist,
+                    u.ptr[jk] - adsbu.ptr[ik], v.ptr[jk] - adsbv.ptr[ik],
+                    alt.ptr[jk] - adsbalt.ptr[ik], vs.ptr[jk] - adsbvs.ptr[ik]);
+
+        // Mirrored pair (j, i): the opposite relative velocity and altitude
+        // as perceived by j
+        if (symmetric)
+            detect_pair(dbconf, confs[npairs + k], qdrback, dist,
+                        u.ptr[ik] - adsbu.ptr[jk], v.ptr[ik] - adsbv.ptr[jk],
+                        alt.ptr[ik] - adsbalt.ptr[jk], vs.ptr[ik] - adsbvs.ptr[jk]);
+    }
+
+    // Number of conflicts
+    for (npy_intp k = 0; k < (npy_intp)confs.size(); ++k)
+        nconf += confs[k].swconfl;
+
+    Py_END_ALLOW_THREADS
+
+    // Results of the conflicting pairs, those of (i, j) followed by those of
+    // the mirrored pairs (j, i) if symmetric
+    npy_intp size   = nconf;
+    PyObject *iown     = PyArray_SimpleNew(1, &size, NPY_INTP),
+             *ioth     = PyArray_SimpleNew(1, &size, NPY_INTP),
+             *qdr      = PyArray_SimpleNew(1, &size, NPY_DOUBLE),
+             *dist     = PyArray_SimpleNew(1, &size, NPY_DOUBLE),
+             *tcpa     = PyArray_SimpleNew(1, &size, NPY_DOUBLE),
+             *tinconf  = PyArray_SimpleNew(1, &size, NPY_DOUBLE),
+             *toutconf = PyArray_SimpleNew(1, &size, NPY_DOUBLE);
+    npy_intp *piown     = (npy_intp*)PyArray_DATA((PyArrayObject*)iown),
+             *pioth     = (npy_intp*)PyArray_DATA((PyArrayObject*)ioth);
+    double   *pqdr      = (double*)PyArray_DATA((PyArrayObject*)qdr),
+             *pdist     = (double*)PyArray_DATA((PyArrayObject*)dist),
+             *ptcpa     = (double*)PyArray_DATA((PyArrayObject*)tcpa),
+             *ptinconf  = (double*)PyArray_DATA((PyArrayObject*)tinconf),
+             *ptoutconf = (double*)PyArray_DATA((PyArrayObject*)toutconf);
+
+    npy_intp n = 0;
+    for (npy_intp k = 0; k < (npy_intp)confs.size(); ++k) {
+        const PairConf& conf = confs[k];
+        if (!conf.swconfl) continue;
+        if (k < npairs) {
+            piown[n] = i.ptr[k];            pioth[n] = j.ptr[k];
+        } else {
+            piown[n] = j.ptr[k - npairs];   pioth[n] = i.ptr[k - npairs];
         }
-        // Copy new lists back to python dbconf object
-        dbconf.copyback();
+        pqdr[n]  = conf.qdr;       pdist[n] = conf.dist;
+        ptcpa[n] = conf.tcpa;
+        ptinconf[n] = conf.tinconf; ptoutconf[n] = conf.toutconf;
+        n++;
     }
 
-    Py_INCREF(Py_None);
-    return Py_None;
+    return Py_BuildValue("(NNNNNNN)", iown, ioth, qdr, dist, tcpa, tinconf, toutconf);
 };
 
 static PyMethodDef methods[] = {
-    {"detect", casas_detect, METH_VARARGS, "Detect conflicts for traffic"},
+    {"pairconflicts", casas_pairconflicts, METH_VARARGS,
+     "Conflict detection of candidate pairs, see StateBasedCD.pairconflicts"},
     {NULL}  /* Sentinel */
 };
 
 #ifndef PyMODINIT_FUNC  /* declarations for DLL import/export */
 #define PyMODINIT_FUNC void
 #endif
-PyMODINIT_FUNC initcasas(void) 
+PyMODINIT_FUNC initcasas(void)
 {
     Py_InitModule("casas", methods);
     import_array();
@@ -1,10 +1,23 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
+# Build with: python setup.py build_ext --inplace [--no-openmp]
+# and copy casas.so (casas.pyd) to bluesky/traf/asas. With OpenMP, the number
+# of threads of the loop over the pairs is set with OMP_NUM_THREADS.
 
 from distutils.core import setup, Extension
+import sys
 import numpy as np
 
-ext_modules = [Extension('casas', sources=['casas.cpp'])]
+# OpenMP parallel loop over the pairs, unless --no-openmp is given
+if '--no-openmp' in sys.argv:
+    sys.argv.remove('--no-openmp')
+    openmp = []
+else:
+    openmp = ['/openmp'] if sys.platform == 'win32' else ['-fopenmp']
+
+ext_modules = [Extension('casas', sources=['casas.cpp'],
+                         extra_compile_args=openmp,
+                         extra_link_args=[] if sys.platform == 'win32' else openmp)]
 
 setup(name='casas', version='1.0', include_dirs=[np.get_include(), '../../../tools/ctools'],
-      ext_modules=ext_modules)
\ No newline at end of file
+      ext_modules=ext_modules)
@@ -40,25 +40,35 @@ class Autopilot(DynamicArrays):
         # Route objects
         self.route = []
 
-    def create(self):
-        super(Autopilot, self).create()
+    def create(self, n=1):
+        super(Autopilot, self).create(n)
 
         # FMS directions
-        self.tas[-1] = self.traf.tas[-1]
-        self.trk[-1] = self.traf.trk[-1]
-        self.alt[-1] = self.traf.alt[-1]
-        self.spd[-1] = vtas2cas(self.tas[-1], self.alt[-1])
+        self.tas[-n:] = self.traf.tas[-n:]
+        self.trk[-n:] = self.traf.trk[-n:]
+        self.alt[-n:] = self.traf.alt[-n:]
+        self.spd[-n:] = vtas2cas(self.tas[-n:], self.alt[-n:])
 
         # VNAV Variables
-        self.dist2vs[-1] = -999.
+        self.dist2vs[-n:] = -999.
 
         # Route objects
-        self.route.append(Route(self.traf.navdb))
+        self.route.extend([Route(self.traf.navdb) for i in range(n)])
 
     def delete(self, idx):
         super(Autopilot, self).delete(idx)
         # Route objects
-        del self.route[idx]
+        if np.isscalar(idx):
+            del self.route[idx]
+        else:
+            for i in reversed(idx):
+                del self.route[i]
+
+    def moveslots(self, src, dst):
+        super(Autopilot, self).moveslots(src, dst)
+        # Route objects
+        for s, d in zip(src, dst):
+            self.route[d] = self.route[s]
 
     def update(self, simt):
         # Scheduling: when dt has passed or restart
@@ -76,6 +86,7 @@ class Autopilot(DynamicArrays):
                 # Get next wp (lnavon = False if no more waypoints)
                 lat, lon, alt, spd, xtoalt, toalt, lnavon, flyby, self.traf.actwp.next_qdr[i] =  \
                        self.route[i].getnextwp()  # note: xtoalt,toalt in [m]
+                self.traf.asas.intent(i)
 
                 # End of route/no more waypoints: switch off LNAV
                 self.traf.swlnav[i] = self.traf.swlnav[i] and lnavon
@@ -196,6 +207,7 @@ class Autopilot(DynamicArrays):
         """ Select altitude command: ALT acid, alt, [vspd] """
         self.traf.apalt[idx]    = alt
         self.traf.swvnav[idx]   = False
+        self.traf.asas.intent(idx)
 
         # Check for optional VS argument
         if vspd:
@@ -212,6 +224,7 @@ class Autopilot(DynamicArrays):
         self.traf.avs[idx] = vspd
         # self.traf.vs[idx] = vspd
         self.traf.swvnav[idx] = False
+        self.traf.asas.intent(idx)
 
     def selhdg(self, idx, hdg):  # HDG command
         """ Select heading command: HDG acid, hdg """
@@ -229,6 +242,7 @@ class Autopilot(DynamicArrays):
 
         self.trk[idx]  = trk
         self.traf.swlnav[idx] = False
+        self.traf.asas.intent(idx)
         # Everything went ok!
         return True
 
@@ -237,6 +251,7 @@ class Autopilot(DynamicArrays):
         dummy, self.traf.aspd[idx], self.traf.ama[idx] = casormach(casmach, self.traf.alt[idx])
         # Switch off VNAV: SPD command overrides
         self.traf.swvnav[idx]   = False
+        self.traf.asas.intent(idx)
         return True
 
     def setdestorig(self, cmd, idx, *args):
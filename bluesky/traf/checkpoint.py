@@ -0,0 +1,201 @@
+""" Binary checkpoint of the simulation state
+
+    CHECKPOINT writes the state of the traffic (all arrays and lists of the
+    traffic and its submodules, the routes and the wind field) and the
+    simulation time to one binary file. RESTORE reads the arrays of this file
+    back in one pass each, so restoring a checkpoint with many aircraft takes
+    no parsing of scenario commands like an IC of a SAVEIC file.
+
+    File layout: magic string, header length, pickled header, raw array data.
+    The header lists the dtype, shape and offset of each array, and contains
+    the remaining (plain) attributes.
+"""
+import os
+import struct
+import cPickle as pickle
+import numpy as np
+
+from route import Route
+from asas.ResoCache import ResoCache
+from .. import settings
+
+magic     = "BSCHKPT1"
+alignment = 64   # [bytes] alignment of the arrays in the file
+
+# Types of the attributes that are stored in the header
+plaintypes = (bool, int, long, float, str, list, tuple, dict, set, type(None))
+
+# Attributes that are rebuilt instead of stored: the dynamic array storage,
+# the routes (stored separately), the references between the modules, and
+# the ASAS method modules, adaptive CD schedule and resolution cache
+skipkeys = set(["Vars", "Bufs", "Views", "ArrDefs", "Block", "route",
+                "traf", "navdb", "asas", "ap", "pilot", "adsb", "trails",
+                "actwp", "perf", "rewind", "area", "Turbulence", "wind",
+                "cd", "cr", "schedule", "resocache"])
+
+
+def modules(traf):
+    """ Objects of which the state is stored, by name """
+    return [("traf", traf), ("asas", traf.asas), ("ap", traf.ap),
+            ("pilot", traf.pilot), ("adsb", traf.adsb),
+            ("trails", traf.trails), ("actwp", traf.actwp),
+            ("perf", traf.perf), ("area", traf.area),
+            ("turbulence", traf.Turbulence), ("wind", traf.wind)]
+
+
+def filename(fname):
+    # Add extension .chk if not already present
+    if os.path.splitext(fname)[1] == "":
+        fname = fname + ".chk"
+
+    # If it is with path don't touch it, else add path
+    if fname.find("/") < 0:
+        fname = settings.log_path + "/" + fname
+
+    return fname
+
+
+def getstate(traf):
+    """ State of the traffic: a dict with the plain attributes per module,
+        the routes and the names of the attributes that could not be
+        stored, and a list of (module name, attribute, array) """
+    state  = {"modules": dict(), "routes": [], "notstored": []}
+    arrays = []
+
+    for name, module in modules(traf):
+        plain = dict()
+        for key, value in module.__dict__.iteritems():
+            if key in skipkeys:
+                continue
+
+            # The pairwise (ntraf x ntraf) conflict detection results are
+            # recomputed at each ASAS update before they are used
+            if name == "asas" and type(value) == np.ndarray and value.ndim > 1:
+                continue
+
+            if type(value) == np.ndarray and value.dtype != object:
+                arrays.append((name, key, value))
+            elif isinstance(value, plaintypes) or type(value) == np.ndarray:
+                plain[key] = value
+            else:
+                state["notstored"].append(name + "." + key)
+
+        state["modules"][name] = plain
+
+    # Routes without their references to the navdb and traffic objects
+    for route in traf.ap.route:
+        state["routes"].append(dict([(key, value) for key, value in
+                                     route.__dict__.iteritems()
+                                     if key not in ("navdb", "traf")]))
+
+    return state, arrays
+
+
+def setstate(traf, state, arrays):
+    """ Restore the state of the traffic obtained with getstate """
+    mods = dict(modules(traf))
+    for name, plain in state["modules"].iteritems():
+        mods[name].__dict__.update(plain)
+
+    for name, key, value in arrays:
+        mods[name].__dict__[key] = value
+
+    traf.ap.route = []
+    for routestate in state["routes"]:
+        route = Route(traf.navdb)
+        route.__dict__.update(routestate)
+        traf.ap.route.append(route)
+
+    # Restored arrays are not in the reserved storage of the dynamic arrays
+    for dynarr in [traf] + [traf.Vars[v] for v in traf.DynArrs]:
+        dynarr.Bufs.clear()
+        dynarr.Views.clear()
+        dynarr.Block = None
+
+    traf.idmap = dict([(acid, i) for i, acid in enumerate(traf.id) if acid])
+    traf.asas.cd = traf.asas.CDmethods[traf.asas.cd_name]
+    traf.asas.cr = traf.asas.CRmethods[traf.asas.cr_name]
+    traf.asas.schedule  = None
+    traf.asas.resocache = ResoCache()
+
+
+def save(fname, sim, traf):
+    """ CHECKPOINT: write the simulation state to file fname """
+    fname = filename(fname)
+    state, arrays = getstate(traf)
+
+    # Position of the arrays in the data part of the file
+    header = {"simt": sim.simt, "state": state, "arrays": []}
+    offset = 0
+    for name, key, value in arrays:
+        header["arrays"].append((name, key, value.dtype.str, value.shape, offset))
+        offset += (value.nbytes + alignment - 1) // alignment * alignment
+
+    try:
+        data = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError) as err:
+        return False, "Error writing checkpoint: " + str(err)
+
+    # Start of the array data after the header, aligned
+    start = len(magic) + 8 + len(data)
+    start = (start + alignment - 1) // alignment * alignment
+
+    try:
+        f = open(fname, "wb")
+    except IOError:
+        return False, "Error writing to file " + fname
+
+    f.write(magic)
+    f.write(struct.pack("<Q", len(data)))
+    f.write(data)
+    for (name, key, value), info in zip(arrays, header["arrays"]):
+        f.seek(start + info[-1])
+        f.write(np.ascontiguousarray(value).data)
+    f.truncate(start + offset)
+    f.close()
+
+    msg = "Saved checkpoint of %d aircraft to %s" % (traf.ntraf, fname)
+    if state["notstored"]:
+        msg += "\nNot stored: " + ", ".join(sorted(state["notstored"]))
+    return True, msg
+
+
+def load(fname, sim, traf):
+    """ RESTORE: restore the simulation state from checkpoint file fname """
+    fname = filename(fname)
+    try:
+        f = open(fname, "rb")
+    except IOError:
+        return False, "File not found: " + fname
+
+    if f.read(len(magic)) != magic:
+        f.close()
+        return False, fname + " is not a checkpoint file"
+
+    size   = struct.unpack("<Q", f.read(8))[0]
+    header = pickle.loads(f.read(size))
+    f.close()
+
+    start = len(magic) + 8 + size
+    start = (start + alignment - 1) // alignment * alignment
+
+    # The arrays are copied from the memory mapped file, so the restored
+    # state does not depend on the file, which a later CHECKPOINT with the
+    # same name overwrites
+    if os.path.getsize(fname) > start:
+        data = np.memmap(fname, dtype=np.uint8, mode="r", offset=start)
+    else:
+        data = np.zeros(0, dtype=np.uint8)
+
+    arrays = []
+    for name, key, dtype, shape, offset in header["arrays"]:
+        dtype  = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        arrays.append((name, key, np.array(data[offset:offset + nbytes].view(dtype).reshape(shape),
+                                           copy=True)))
+    del data
+
+    setstate(traf, header["state"], arrays)
+    sim.simt = header["simt"]
+
+    return True, "Restored checkpoint of %d aircraft from %s" % (traf.ntraf, fname)
@@ -469,6 +469,10 @@ class metric_CoCa():
         sim.traf.cell = []
 
         for i in range(sim.traf.ntraf):
+            # Skip the free slots of deleted aircraft
+            if not sim.traf.active[i]:
+                continue
+
             lat = sim.traf.lat[i]
             lon = sim.traf.lon[i]
             fl = sim.traf.alt[i]/ft
@@ -555,7 +559,10 @@ class metric_HB():
        
         # CIRCLE AREA (FIR Circle)
         for i in range(0,sim.traf.ntraf):
-            
+            # Skip the free slots of deleted aircraft
+            if not sim.traf.active[i]:
+                continue
+
             dist = latlondist(sim.metric.fir_circle_point[0],\
                               sim.metric.fir_circle_point[1],\
                               sim.traf.lat[i],sim.traf.lon[i])
@@ -1410,17 +1417,20 @@ class Metric():
         
         deleteAC = []
         for i in range(0,sim.traf.ntraf):
+            # Skip the free slots of deleted aircraft
+            if not sim.traf.active[i]:
+                continue
+
             if sim.traf.avs[i] <= 0 and (sim.traf.aalt[i]/ft) < 750 and sim.traf.aspd[i] < 300:
-                deleteAC.append(sim.traf.id[i])
+                deleteAC.append(i)
 
             elif sim.traf.avs[i] <=0 and (sim.traf.aalt[i]/ft) < 10:
-                deleteAC.append(sim.traf.id[i])
+                deleteAC.append(i)
             
             if sim.traf.avs[i] <=0 and sim.traf.aspd[i] < 10:
-                deleteAC.append(sim.traf.id[i])
+                deleteAC.append(i)
         
-        for i in range(0,len(deleteAC)):
-            sim.traf.delete(deleteAC[i])
+        sim.traf.delete_many(deleteAC)
 
         # Heartbeat for test
         self.write(sim.simt,"NTRAF;"+str(sim.traf.ntraf))
@@ -46,7 +46,15 @@ class CoeffBS:
         return converted 
         
 
+    def take(self, name, idx):
+        """Values of coefficient list name at indices idx (as numpy array)"""
+        if name not in self.arrays:
+            self.arrays[name] = np.array(getattr(self, name))
+        return self.arrays[name][idx]
+
     def coeff(self):
+        # numpy copies of the coefficient lists, see take()
+        self.arrays = dict()
 
         # aircraft
         self.atype     = [] # aircraft type
@@ -347,7 +355,6 @@ class Perf():
         # Flight performance scheduling
         self.dt  = 0.1           # [s] update interval of performance limits
         self.t0  = -self.dt  # [s] last time checked (in terms of simt)
-        self.warned2 = False        # Flag: Did we warn for default engine parameters yet?
 
         return
 
@@ -367,6 +374,7 @@ class Perf():
         self.refcas       = np.array([]) # reference CAS  
         self.gr_acc       = np.array([]) # ground acceleration
         self.gr_dec       = np.array([]) # ground deceleration
+        self.atrans       = np.array([]) # crossover altitude
         
         # limits
         self.vm_to        = np.array([]) # min takeoff spd (w/o mass, density)
@@ -424,126 +432,130 @@ class Perf():
         return
        
 
-    def create(self):
-        actype = self.traf.type[-1]
-        """Create new aircraft"""
+    def create(self, n=1):
+        """Create new aircraft (the last n aircraft in traf)"""
         # note: coefficients are initialized in SI units
-        if actype in coeffBS.atype:
-            # aircraft
-            self.coeffidx = coeffBS.atype.index(actype)
+        coeffidx   = np.zeros(n, dtype=int)
+        propengidx = np.zeros(n, dtype=int)
+        jetengidx  = np.zeros(n, dtype=int)
+        for i, actype in enumerate(self.traf.type[-n:]):
+            if actype in coeffBS.atype:
+                # aircraft
+                coeffidx[i] = coeffBS.atype.index(actype)
+            elif not Perf.warned:
+                print "aircraft is using default aircraft performance (Boeing 747-400)."
+                Perf.warned = True
+
             # engine
-        else:
-            self.coeffidx = 0
-            if not Perf.warned:
-                  print "aircraft is using default aircraft performance (Boeing 747-400)."
-            Perf.warned = True
-        self.coeffidxlist = np.append(self.coeffidxlist, self.coeffidx)
-        self.mass         = np.append(self.mass, coeffBS.MTOW[self.coeffidx]) # aircraft weight
-        self.Sref         = np.append(self.Sref, coeffBS.Sref[self.coeffidx]) # wing surface reference area
-        self.etype        = np.append(self.etype, coeffBS.etype[self.coeffidx]) # engine type of current aircraft
-        self.traf.engines.append(coeffBS.engines[self.coeffidx]) # avaliable engine type per aircraft type   
+            engine = coeffBS.engines[coeffidx[i]][0]
+            if coeffBS.etype[coeffidx[i]] == 2:
+                if engine in coeffBS.propenlist:
+                    propengidx[i] = coeffBS.propenlist.index(engine)
+                elif not Perf.warned2:
+                    print "prop aircraft is using standard engine. Please check valid engine types per aircraft type"
+                    Perf.warned2 = True
+            else:
+                if engine in coeffBS.jetenlist:
+                    jetengidx[i] = coeffBS.jetenlist.index(engine)
+                elif not Perf.warned2:
+                    print " jet aircraft is using standard engine. Please check valid engine types per aircraft type"
+                    Perf.warned2 = True
+
+            self.traf.engines.append(coeffBS.engines[coeffidx[i]]) # avaliable engine type per aircraft type
+
+        self.coeffidx     = coeffidx[-1]
+        self.coeffidxlist = np.append(self.coeffidxlist, coeffidx)
+        self.mass         = np.append(self.mass, coeffBS.take('MTOW', coeffidx)) # aircraft weight
+        self.Sref         = np.append(self.Sref, coeffBS.take('Sref', coeffidx)) # wing surface reference area
+        etype             = coeffBS.take('etype', coeffidx)
+        self.etype        = np.append(self.etype, etype) # engine type of current aircraft
 
         # speeds             
-        self.refma        = np.append(self.refma, coeffBS.cr_Ma[self.coeffidx]) # nominal cruise Mach at 35000 ft
-        self.refcas       = np.append(self.refcas, vtas2cas(coeffBS.cr_spd[self.coeffidx], 35000*ft)) # nominal cruise CAS
-        self.gr_acc       = np.append(self.gr_acc,coeffBS.gr_acc[self.coeffidx]) # ground acceleration
-        self.gr_dec       = np.append(self.gr_dec, coeffBS.gr_dec[self.coeffidx]) # ground acceleration
+        refma             = coeffBS.take('cr_Ma', coeffidx)
+        refcas            = vtas2cas(coeffBS.take('cr_spd', coeffidx), 35000*ft)
+        self.refma        = np.append(self.refma, refma) # nominal cruise Mach at 35000 ft
+        self.refcas       = np.append(self.refcas, refcas) # nominal cruise CAS
+        self.gr_acc       = np.append(self.gr_acc, coeffBS.take('gr_acc', coeffidx)) # ground acceleration
+        self.gr_dec       = np.append(self.gr_dec, coeffBS.take('gr_dec', coeffidx)) # ground acceleration
         
         # calculate the crossover altitude according to the BADA 3.12 User Manual
-        self.atrans       = ((1000/6.5)*(T0*(1-((((1+gamma1*(self.refcas/a0)*(self.refcas/a0))** \
-                                (gamma2))-1) / (((1+gamma1*self.refma*self.refma)** \
+        # (only for the new aircraft, the existing ones keep their value)
+        atrans            = ((1000/6.5)*(T0*(1-((((1+gamma1*(refcas/a0)*(refcas/a0))** \
+                                (gamma2))-1) / (((1+gamma1*refma*refma)** \
                                     (gamma2))-1))**((-(beta)*R)/g0))))
+        self.atrans       = np.append(self.atrans, atrans)
 
         # limits   
-        self.vm_to        = np.append(self.vm_to, coeffBS.vmto[self.coeffidx])
-        self.vm_ld        = np.append(self.vm_ld, coeffBS.vmld[self.coeffidx])   
-        self.vmto         = np.append(self.vmto, 0.0)
-        self.vmic         = np.append(self.vmic, 0.0)        
-        self.vmcr         = np.append(self.vmcr, 0.0)
-        self.vmap         = np.append(self.vmap, 0.0)
-        self.vmld         = np.append(self.vmld, 0.0)
-        self.vmin         = np.append (self.vmin, 0.0)
-        self.mmo          = np.append(self.mmo, coeffBS.max_Ma[self.coeffidx]) # maximum Mach
-        self.vmo          = np.append(self.vmo, coeffBS.max_spd[self.coeffidx]) # maximum CAS
-        self.hmaxact      = np.append(self.hmaxact, coeffBS.max_alt[self.coeffidx]) # maximum altitude  
+        self.vm_to        = np.append(self.vm_to, coeffBS.take('vmto', coeffidx))
+        self.vm_ld        = np.append(self.vm_ld, coeffBS.take('vmld', coeffidx))
+        self.vmto         = np.append(self.vmto, np.zeros(n))
+        self.vmic         = np.append(self.vmic, np.zeros(n))
+        self.vmcr         = np.append(self.vmcr, np.zeros(n))
+        self.vmap         = np.append(self.vmap, np.zeros(n))
+        self.vmld         = np.append(self.vmld, np.zeros(n))
+        self.vmin         = np.append(self.vmin, np.zeros(n))
+        self.mmo          = np.append(self.mmo, coeffBS.take('max_Ma', coeffidx)) # maximum Mach
+        self.vmo          = np.append(self.vmo, coeffBS.take('max_spd', coeffidx)) # maximum CAS
+        self.hmaxact      = np.append(self.hmaxact, coeffBS.take('max_alt', coeffidx)) # maximum altitude  
         
         # aerodynamics
-        self.CD0          = np.append(self.CD0, coeffBS.CD0[self.coeffidx])  # parasite drag coefficient
-        self.k            = np.append(self.k, coeffBS.k[self.coeffidx])  # induced drag factor   
-        self.clmaxcr      = np.append(self.clmaxcr, coeffBS.clmax_cr[self.coeffidx])   # max. cruise lift coefficient
-        self.qS           = np.append(self.qS, 0.0)
+        self.CD0          = np.append(self.CD0, coeffBS.take('CD0', coeffidx))  # parasite drag coefficient
+        self.k            = np.append(self.k, coeffBS.take('k', coeffidx))  # induced drag factor   
+        self.clmaxcr      = np.append(self.clmaxcr, coeffBS.take('clmax_cr', coeffidx))   # max. cruise lift coefficient
+        self.qS           = np.append(self.qS, np.zeros(n))
         # performance - initialise neutrally       
-        self.D            = np.append(self.D, 0.) 
-        self.ESF          = np.append(self.ESF, 1.)
+        self.D            = np.append(self.D, np.zeros(n))
+        self.ESF          = np.append(self.ESF, np.ones(n))
         
         # flight phase
-        self.phase        = np.append(self.phase, 0.)
-        self.bank         = np.append(self.bank, 0.)
-        self.post_flight  = np.append(self.post_flight, False) # for initialisation,
+        self.phase        = np.append(self.phase, np.zeros(n))
+        self.bank         = np.append(self.bank, np.zeros(n))
+        self.post_flight  = np.append(self.post_flight, np.zeros(n, dtype=bool)) # for initialisation,
                                                               # we assume that ac has yet to take off
-        self.pf_flag      = np.append(self.pf_flag, True)
-        # engines
+        self.pf_flag      = np.append(self.pf_flag, np.ones(n, dtype=bool))
 
-        # turboprops
-        if coeffBS.etype[self.coeffidx] ==2:
-            if coeffBS.engines[self.coeffidx][0] in coeffBS.propenlist:
-                self.propengidx = coeffBS.propenlist.index(coeffBS.engines[self.coeffidx][0])
-            else:
-                self.propengidx = 0
-                if not Perf.warned2:
-                    print "prop aircraft is using standard engine. Please check valid engine types per aircraft type"
-                    Perf.warned2 = True
-
-            self.P       = np.append(self.P, coeffBS.P[self.propengidx]*coeffBS.n_eng[self.coeffidx])                     
-            self.PSFC_TO = np.append(self.PSFC_TO, coeffBS.PSFC_TO[self.propengidx]) 
-            self.PSFC_CR = np.append(self.PSFC_CR, coeffBS.PSFC_CR[self.propengidx])
-            self.ff      = np.append(self.ff, 0.) # neutral initialisation            
-            # jet characteristics needed for numpy calculations
-            self.rThr    = np.append(self.rThr, 1.) 
-            self.Thr     = np.append(self.Thr, 1.)        
-            self.maxthr  = np.append (self.maxthr, 1.) 
-            self.SFC     = np.append(self.SFC, 1.)
-            self.ffto    = np.append(self.ffto, 1.)
-            self.ffcl    = np.append(self.ffcl, 1.)
-            self.ffcr    = np.append(self.ffcr, 1.)
-            self.ffid    = np.append(self.ffid, 1.)
-            self.ffap    = np.append(self.ffap, 1.)
-
-
-        # jet (also default)
+        # engines
+        # turboprops use the propeller characteristics, jets (also default) the
+        # jet characteristics. The other set is initialised with ones, as
+        # these are needed for numpy calculations
+        isprop            = etype == 2
+        n_eng             = coeffBS.take('n_eng', coeffidx)
+
+        self.P       = np.append(self.P, np.where(isprop, coeffBS.take('P', propengidx) * n_eng, 1.))
+        self.PSFC_TO = np.append(self.PSFC_TO, np.where(isprop, coeffBS.take('PSFC_TO', propengidx), 1.))
+        self.PSFC_CR = np.append(self.PSFC_CR, np.where(isprop, coeffBS.take('PSFC_CR', propengidx), 1.))
+        self.ff      = np.append(self.ff, np.zeros(n)) # neutral initialisation
+
+        rThr         = np.where(isprop, 1., coeffBS.take('rThr', jetengidx) * n_eng)
+        self.rThr    = np.append(self.rThr, rThr)  # rated thrust (all engines)
+        self.Thr     = np.append(self.Thr, rThr)   # initialize thrust with rated thrust
+        self.maxthr  = np.append(self.maxthr, np.where(isprop, 1., rThr * 1.2))  # maximum thrust - initialize with 1.2*rThr
+        self.SFC     = np.append(self.SFC, np.where(isprop, 1., coeffBS.take('SFC', jetengidx)))
+        self.ffto    = np.append(self.ffto, np.where(isprop, 1., coeffBS.take('ffto', jetengidx) * n_eng))
+        self.ffcl    = np.append(self.ffcl, np.where(isprop, 1., coeffBS.take('ffcl', jetengidx) * n_eng))
+        self.ffcr    = np.append(self.ffcr, np.where(isprop, 1., coeffBS.take('ffcr', jetengidx) * n_eng))
+        self.ffid    = np.append(self.ffid, np.where(isprop, 1., coeffBS.take('ffid', jetengidx) * n_eng))
+        self.ffap    = np.append(self.ffap, np.where(isprop, 1., coeffBS.take('ffap', jetengidx) * n_eng))
 
-        else:      # so coeffBS.etype[self.coeffidx] ==1:
+        return
 
-            if coeffBS.engines[self.coeffidx][0] in coeffBS.jetenlist:
-                self.jetengidx = coeffBS.jetenlist.index(coeffBS.engines[self.coeffidx][0])
-            else:
-                self.jetengidx = 0
-                if not self.warned2:
-                    print " jet aircraft is using standard engine. Please check valid engine types per aircraft type"
-                    self.warned2 = True
-
-            self.rThr    = np.append(self.rThr, coeffBS.rThr[self.jetengidx]*coeffBS.n_eng[self.coeffidx])  # rated thrust (all engines)
-            self.Thr     = np.append(self.Thr, coeffBS.rThr[self.jetengidx]*coeffBS.n_eng[self.coeffidx])  # initialize thrust with rated thrust       
-            self.maxthr  = np.append (self.maxthr, coeffBS.rThr[self.jetengidx]*coeffBS.n_eng[self.coeffidx]*1.2)  # maximum thrust - initialize with 1.2*rThr
-            self.SFC     = np.append(self.SFC, coeffBS.SFC[self.jetengidx])
-            self.ff      = np.append(self.ff, 0.)  # neutral initialisation
-            self.ffto    = np.append(self.ffto, coeffBS.ffto[self.jetengidx]*coeffBS.n_eng[self.coeffidx])
-            self.ffcl    = np.append(self.ffcl, coeffBS.ffcl[self.jetengidx]*coeffBS.n_eng[self.coeffidx])
-            self.ffcr    = np.append(self.ffcr, coeffBS.ffcr[self.jetengidx]*coeffBS.n_eng[self.coeffidx])
-            self.ffid    = np.append(self.ffid, coeffBS.ffid[self.jetengidx]*coeffBS.n_eng[self.coeffidx])
-            self.ffap    = np.append(self.ffap, coeffBS.ffap[self.jetengidx]*coeffBS.n_eng[self.coeffidx])
-
-            # propeller characteristics needed for numpy calculations
-            self.P       = np.append(self.P, 1.)
-            self.PSFC_TO = np.append(self.PSFC_TO, 1.)
-            self.PSFC_CR = np.append(self.PSFC_CR, 1.)
+    def moveslots(self, src, dst):
+        """Copy the parameters of aircraft src to aircraft dst"""
+        for s, d in zip(src, dst):
+            self.traf.engines[d] = self.traf.engines[s]
 
-        return
+        for value in self.__dict__.itervalues():
+            if type(value) == np.ndarray and len(value) == len(self.mass):
+                value[dst] = value[src]
 
     def delete(self, idx):
         """Delete removed aircraft"""
 
-        del self.traf.engines[idx]
+        if np.isscalar(idx):
+            del self.traf.engines[idx]
+        else:
+            for i in reversed(idx):
+                del self.traf.engines[i]
 
         self.coeffidxlist = np.delete(self.coeffidxlist, idx)
         self.mass         = np.delete(self.mass, idx)    # aircraft weight
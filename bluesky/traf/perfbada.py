@@ -531,9 +531,13 @@ class PerfBADA():
        
 
 
-    def create(self):
-        actype = self.traf.type[-1]
-        """CREATE NEW AIRCRAFT"""
+    def create(self, n=1):
+        """CREATE NEW AIRCRAFT (the last n aircraft in traf)"""
+        for actype in self.traf.type[-n:]:
+            self.createac(actype)
+
+    def createac(self, actype):
+        """Append the performance parameters of one aircraft of type actype"""
         # note: coefficients are initialized in SI units
 
         # general        
@@ -634,17 +638,17 @@ class PerfBADA():
 
         # reduced climb coefficient
         #jet
-        if self.etype [self.traf.ntraf-1] == 1:
+        if self.etype[-1] == 1:
             self.cred     = np.append(self.cred, coeff.credj)
         # turboprop
-        elif self.etype [self.traf.ntraf-1]  ==2:
+        elif self.etype[-1] == 2:
             self.cred     = np.append(self.cred, coeff.credt)
         #piston
         else:
             self.cred     = np.append(self.cred, coeff.credp)
 
         # NOTE: model only validated for jet and turbo aircraft
-        if not self.warned2 and self.etype[self.traf.ntraf-1] == 3:
+        if not self.warned2 and self.etype[-1] == 3:
             print "Using piston aircraft performance.",
             print "Not valid for real performance calculations."
             self.warned2 = True        
@@ -708,6 +712,12 @@ class PerfBADA():
         return
 
 
+    def moveslots(self, src, dst):
+        """Copy the parameters of aircraft src to aircraft dst"""
+        for value in self.__dict__.itervalues():
+            if type(value) == np.ndarray and len(value) == len(self.mass):
+                value[dst] = value[src]
+
     def delete(self, idx):
         """Delete REMOVED AIRCRAFT"""        
         
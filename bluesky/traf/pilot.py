@@ -1,5 +1,5 @@
 import numpy as np
-from ..tools.aero import tas2eas, vcas2tas, vcas2mach
+from ..tools.aero import tas2eas, vtas2eas, vcas2tas, vcas2mach
 from ..tools.dynamicarrays import DynamicArrays, RegisterElementParameters
 
 
@@ -17,13 +17,18 @@ class Pilot(DynamicArrays):
             self.vs  = np.array([])  # desired vertical speed [m/s]
             self.spd = np.array([])  # desired speed [m/s]
 
-    def create(self):
-        super(Pilot, self).create()
+    def create(self, n=1):
+        super(Pilot, self).create(n)
 
-        self.alt[-1] = self.traf.alt[-1]
-        self.spd[-1] = tas2eas(self.traf.tas[-1], self.traf.alt[-1])
-        self.hdg[-1] = self.traf.hdg[-1]
-        self.trk[-1] = self.traf.trk[-1]
+        self.alt[-n:] = self.traf.alt[-n:]
+        # A single aircraft with the full ISA model of the scalar tas2eas, as
+        # the speeds of traffic.create_many
+        if n == 1:
+            self.spd[-1] = tas2eas(self.traf.tas[-1], self.traf.alt[-1])
+        else:
+            self.spd[-n:] = vtas2eas(self.traf.tas[-n:], self.traf.alt[-n:])
+        self.hdg[-n:] = self.traf.hdg[-n:]
+        self.trk[-n:] = self.traf.trk[-n:]
 
     def FMSOrAsas(self):
         #--------- Input to Autopilot settings to follow: destination or ASAS ----------
@@ -0,0 +1,155 @@
+""" Rewind buffer: periodic copies of the traffic state in memory
+
+    With REWIND ON, a frame with the state of the traffic is stored every dt
+    seconds of simulation time, in a ring buffer that holds the last span
+    seconds. REWIND sec restores the frame nearest to sec seconds ago.
+
+    Arrays that did not change since the previous frame (aircraft types,
+    performance coefficients, route data, etc.) are not copied but shared
+    with the previous frame, so only the changing part of the state takes
+    memory per frame. The memory of the frames is bounded by
+    settings.rewind_maxmb: when a new frame exceeds it, the oldest frames are
+    dropped, so the buffer then holds less than span seconds.
+"""
+from math import ceil
+import cPickle as pickle
+import numpy as np
+
+import checkpoint
+from .. import settings
+
+
+class Rewind:
+    def __init__(self, traf):
+        self.traf   = traf
+        self.active = False
+        self.dt     = settings.rewind_dt     # [s] interval of the frames
+        self.span   = settings.rewind_span   # [s] time span of the buffer
+        self.maxmb  = settings.rewind_maxmb  # [MB] maximum memory of the frames
+        self.clear()
+
+    def clear(self):
+        # Preallocated ring buffer of frames (simt, pickled plain state, arrays)
+        self.frames = [None] * max(1, int(ceil(self.span / self.dt)))
+        self.iframe = 0       # Slot of the next frame
+        self.tnext  = -1e9    # Time of the next frame
+
+    def update(self, simt):
+        if not self.active or simt < self.tnext:
+            return
+
+        self.tnext = simt + self.dt
+        state, arrays = checkpoint.getstate(self.traf)
+
+        # Share the arrays that are equal to those in the previous frame
+        prev = self.frames[self.iframe - 1]
+        prevarrays = dict() if prev is None else \
+            dict([((name, key), arr) for name, key, arr in prev[2]])
+
+        stored = []
+        for name, key, value in arrays:
+            old = prevarrays.get((name, key))
+            if old is not None and old.dtype == value.dtype and \
+                    old.shape == value.shape and np.array_equal(old, value):
+                stored.append((name, key, old))
+            else:
+                stored.append((name, key, value.copy()))
+
+        self.frames[self.iframe] = (simt, pickle.dumps(state, pickle.HIGHEST_PROTOCOL), stored)
+        self.iframe = (self.iframe + 1) % len(self.frames)
+        self.limit()
+
+    def limit(self):
+        """ Drop the oldest frames while the frames use more than maxmb,
+            always keeping the newest frame """
+        # Stored frames from oldest to newest, and the number of frames that
+        # refer to each array
+        order = [k % len(self.frames) for k in range(self.iframe, self.iframe + len(self.frames))
+                 if self.frames[k % len(self.frames)] is not None]
+        nrefs = dict()
+        for k in order:
+            for name, key, arr in self.frames[k][2]:
+                nrefs[id(arr)] = nrefs.get(id(arr), 0) + 1
+
+        nbytes = self.nbytes()
+        for k in order[:-1]:
+            if nbytes <= self.maxmb * 1048576.:
+                break
+
+            # The arrays of the dropped frame that no other frame refers to
+            # are freed
+            simt, state, arrays = self.frames[k]
+            nbytes -= len(state)
+            for name, key, arr in arrays:
+                nrefs[id(arr)] -= 1
+                if nrefs[id(arr)] == 0:
+                    nbytes -= arr.nbytes
+            self.frames[k] = None
+
+    def nbytes(self):
+        """ Memory used by the frames [bytes] """
+        arrays = dict()
+        nbytes = 0
+        for frame in self.frames:
+            if frame is not None:
+                nbytes += len(frame[1])
+                for name, key, arr in frame[2]:
+                    arrays[id(arr)] = arr.nbytes
+        return nbytes + sum(arrays.itervalues())
+
+    def restore(self, sim, sec):
+        # Frame nearest to sec seconds ago
+        stored = [i for i in range(len(self.frames)) if self.frames[i] is not None]
+        if len(stored) == 0:
+            return False, "REWIND: no frames stored"
+
+        target = sim.simt - sec
+        i      = min(stored, key=lambda i: abs(self.frames[i][0] - target))
+        simt, state, arrays = self.frames[i]
+
+        # Copies, so the frame itself is not changed by the simulation
+        checkpoint.setstate(self.traf, pickle.loads(state),
+                            [(name, key, arr.copy()) for name, key, arr in arrays])
+        sim.simt = simt
+
+        # Frames after the restored one belong to the discarded future
+        for j in stored:
+            if self.frames[j][0] > simt:
+                self.frames[j] = None
+        self.iframe = (i + 1) % len(self.frames)
+        self.tnext  = simt + self.dt
+
+        return True, "Rewound to t = %.1f s" % simt
+
+    def setcmd(self, sim, cmd=None, dt=None, span=None):
+        """ REWIND ON [dt,span] / OFF / sec """
+        if cmd is None:
+            stored = [frame[0] for frame in self.frames if frame is not None]
+            return True, ("REWIND ON/OFF [dt,span] or REWIND sec\n" +
+                          "Rewind is " + ("ON" if self.active else "OFF") +
+                          ", %d frames every %g s" % (len(stored), self.dt) +
+                          (", t = %.1f - %.1f s" % (min(stored), max(stored)) if stored else "") +
+                          ", %.1f MB (max %g MB)" % (self.nbytes() / 1048576., self.maxmb))
+
+        cmd = cmd.upper()
+        if cmd == "ON":
+            if dt is not None:
+                self.dt = dt
+            if span is not None:
+                self.span = span
+            if dt is not None or span is not None or not self.active:
+                self.clear()
+            self.active = True
+
+        elif cmd == "OFF":
+            self.active = False
+            self.clear()
+
+        else:
+            try:
+                sec = float(cmd)
+            except ValueError:
+                return False, "REWIND: ON, OFF or number of seconds expected"
+            return self.restore(sim, sec)
+
+        return True
@@ -384,6 +384,7 @@ class Route():
             self.iactwp = wpidx
             traf.actwp.lat[i] = self.wplat[wpidx]
             traf.actwp.lon[i] = self.wplon[wpidx]
+            traf.asas.intent(i)
 
             self.calcfp()
             traf.ap.ComputeVNAV(i,self.wptoalt[wpidx],self.wpxtoalt[wpidx])
@@ -1,9 +1,9 @@
 import numpy as np
 from math import *
 from random import random, randint
-from ..tools import datalog
-from ..tools.aero import fpm, kts, ft, g0, Rearth, \
-                         vatmos,  vtas2cas, vtas2mach, casormach
+from ..tools import datalog, profiler
+from ..tools.aero import fpm, kts, ft, g0, Rearth, R, p0, rho0, gamma, \
+                         vatmos,  vtas2cas, vtas2mach, casormach, vcasormach
 
 from ..tools.dynamicarrays import DynamicArrays, RegisterElementParameters
 
@@ -17,6 +17,7 @@ from autopilot import Autopilot
 from activewpdata import ActiveWaypoint
 from turbulence import Turbulence
 from area import Area
+from rewind import Rewind
 
 from .. import settings
 
@@ -40,7 +41,11 @@ class Traffic(DynamicArrays):
         Traffic()            :  constructor
         reset()              :  Reset traffic database w.r.t a/c data
         create(acid,actype,aclat,aclon,achdg,acalt,acspd) : create aircraft
+        create_many(...)     : create a batch of aircraft from sequences
         delete(acid)         : delete an aircraft from traffic data
+        delete_many(idx)     : delete the aircraft with indices idx
+        removeslots(idx)     : remove slots from the traffic arrays
+        snapshot()           : copy of the float state (see settings.traf_block)
         deletall()           : delete all traffic
         update(sim)          : do a numerical integration step
         id2idx(name)         : return index in traffic database of given call sign
@@ -58,6 +63,7 @@ class Traffic(DynamicArrays):
         datalog.definePeriodicLogger('SNAPLOG', 'SNAPLOG logfile.', settings.snapdt)
         datalog.definePeriodicLogger('INSTLOG', 'INSTLOG logfile.', settings.instdt)
         datalog.definePeriodicLogger('SKYLOG', 'SKYLOG logfile.', settings.skydt)
+        profiler.init()
 
         with RegisterElementParameters(self):
 
@@ -96,6 +102,9 @@ class Traffic(DynamicArrays):
                 self.apalt  = np.array([])  # selected alt[m]
                 self.avs    = np.array([])  # selected vertical speed [m/s]
 
+            # Whether the slot holds an aircraft (see settings.traf_slots)
+            self.active   = np.array([], dtype=np.bool)
+
             # Whether to perform LNAV and VNAV
             self.swlnav   = np.array([], dtype=np.bool)
             self.swvnav   = np.array([], dtype=np.bool)
@@ -133,9 +142,26 @@ class Traffic(DynamicArrays):
             self.coslat = np.array([])  # Cosine of latitude for computations
             self.eps    = np.array([])  # Small nonzero numbers
 
+            # Kinematics state, updated in place
+            self.delspd   = np.array([])  # speed difference with pilot setting [m/s]
+            self.swspdsel = np.array([], dtype=np.bool)  # whether to accelerate
+            self.swaltsel = np.array([], dtype=np.bool)  # whether to climb/descend
+            self.turnrate = np.array([])  # turn rate [deg/s]
+            self.delhdg   = np.array([])  # heading difference with pilot setting [deg]
+
+            # Scratch buffers for the in-place computations in update
+            self.tmp1   = np.array([])
+            self.tmp2   = np.array([])
+
         # Default bank angles per flight phase
         self.bphase = np.deg2rad(np.array([15, 35, 35, 35, 15, 45]))
 
+        # Optional contiguous storage of the float state
+        self.useblock(settings.traf_block)
+
+        # In-memory frames of the state for REWIND
+        self.rewind = Rewind(self)
+
         self.reset(navdb)
 
     def reset(self, navdb):
@@ -144,8 +170,19 @@ class Traffic(DynamicArrays):
         super(Traffic, self).reset()
         self.ntraf = 0
 
+        # Index of each aircraft id in the traffic arrays, see id2idx
+        self.idmap = dict()
+
+        # Slots of deleted aircraft that can be reused (see settings.traf_slots)
+        self.freeslots = []
+
+        # Measurement of the bytes of arrays allocated per update
+        self.swallocstat = False
+        self.allocbytes  = 0
+
         # Reset models
         self.wind.clear()
+        self.rewind.clear()
 
         # Build new modules for area and turbulence
         self.area       = Area(self)
@@ -168,27 +205,28 @@ class Traffic(DynamicArrays):
         if actype is None:
             actype = 'B744'
 
+        acid, aclat, aclon, achdg, acalt, acspd = [], [], [], [], [], []
         for i in xrange(count):
-            acid  = idbase + '%05d' % i
-            aclat = random() * (area[1] - area[0]) + area[0]
-            aclon = random() * (area[3] - area[2]) + area[2]
-            achdg = float(randint(1, 360))
-            acalt = (randint(2000, 39000) * ft) if alt is None else alt
-            acspd = (randint(250, 450) * kts) if spd is None else spd
+            acid.append(idbase + '%05d' % i)
+            aclat.append(random() * (area[1] - area[0]) + area[0])
+            aclon.append(random() * (area[3] - area[2]) + area[2])
+            achdg.append(float(randint(1, 360)))
+            acalt.append((randint(2000, 39000) * ft) if alt is None else alt)
+            acspd.append((randint(250, 450) * kts) if spd is None else spd)
 
-            self.create(acid, actype, aclat, aclon, achdg, acalt, acspd)
+        self.create_many(acid, [actype] * count, aclat, aclon, achdg, acalt, acspd)
 
     def create(self, acid=None, actype=None, aclat=None, aclon=None, achdg=None, acalt=None, casmach=None):
         """Create an aircraft"""
         # Check if not already exist
-        if self.id.count(acid.upper()) > 0:
+        if self.id2idx(acid) >= 0:
             return False, acid + " already exists."  # already exists do nothing
 
         # Catch missing acid, repalce by a default
         if acid == None or acid =="*":
             acid = "KL204"
             flno = 204
-            while self.id.count(acid)>0:
+            while acid in self.idmap:
                 flno = flno+1
                 acid ="KL"+str(flno)
         
@@ -199,73 +237,128 @@ class Traffic(DynamicArrays):
             return False,"Missing one or more arguments:"\
                          "acid,actype,aclat,aclon,achdg,acalt,acspd"
 
-        super(Traffic, self).create()
+        return self.create_many([acid], [actype], [aclat], [aclon], [achdg], [acalt], [casmach])
+
+    def create_many(self, acid, actype, aclat, aclon, achdg, acalt, casmach):
+        """Create a batch of aircraft in one pass
+
+           All arguments are sequences with one element per aircraft. Aircraft
+           with a callsign that already exists (or occurs earlier in the batch)
+           are skipped, the others are created."""
+        # Select the new callsigns
+        known = set()
+        sel   = []
+        skip  = []
+        for i, a in enumerate(acid):
+            if a.upper() in self.idmap or a.upper() in known:
+                skip.append(a)
+            else:
+                known.add(a.upper())
+                sel.append(i)
+
+        n = len(sel)
+        if n == 0:
+            return False, ", ".join(skip) + " already exist."
+
+        acid    = [acid[i].upper() for i in sel]
+        actype  = [actype[i] for i in sel]
+        aclat   = np.asarray(aclat, dtype=float)[sel]
+        aclon   = np.asarray(aclon, dtype=float)[sel]
+        achdg   = np.asarray(achdg, dtype=float)[sel]
+        acalt   = np.asarray(acalt, dtype=float)[sel]
+        casmach = np.asarray(casmach, dtype=float)[sel]
+
+        super(Traffic, self).create(n)
 
         # Increase number of aircraft
-        self.ntraf = self.ntraf + 1
+        self.ntraf = self.ntraf + n
 
         # Aircraft Info
-        self.id[-1]   = acid.upper()
-        self.type[-1] = actype
+        self.id[-n:]   = acid
+        self.idmap.update(zip(acid, range(self.ntraf - n, self.ntraf)))
+        self.active[-n:] = True
+        self.type[-n:] = actype
 
         # Positions
-        self.lat[-1]  = aclat
-        self.lon[-1]  = aclon
-        self.alt[-1]  = acalt
-
-        self.hdg[-1]  = achdg
-        self.trk[-1]  = achdg
-
-        # Velocities
-        self.tas[-1], self.cas[-1], self.M[-1] = casormach(casmach, acalt)
-        self.gs[-1]      = self.tas[-1]
-        self.gsnorth[-1] = self.tas[-1] * cos(radians(self.hdg[-1]))
-        self.gseast[-1]  = self.tas[-1] * sin(radians(self.hdg[-1]))
+        self.lat[-n:]  = aclat
+        self.lon[-n:]  = aclon
+        self.alt[-n:]  = acalt
+
+        self.hdg[-n:]  = achdg
+        self.trk[-n:]  = achdg
+
+        # Velocities (a single aircraft with the full ISA model of the scalar
+        # casormach, as before; a batch with the vectorized ISA troposphere
+        # and lower stratosphere model, which differs up to a few cm/s)
+        if n == 1:
+            self.tas[-1], self.cas[-1], self.M[-1] = casormach(casmach[0], acalt[0])
+        else:
+            self.tas[-n:], self.cas[-n:], self.M[-n:] = vcasormach(casmach, acalt)
+        self.gs[-n:]      = self.tas[-n:]
+        self.gsnorth[-n:] = self.tas[-n:] * np.cos(np.radians(achdg))
+        self.gseast[-n:]  = self.tas[-n:] * np.sin(np.radians(achdg))
 
-        # Atmosphere
-        self.Temp[-1], self.rho[-1], self.p[-1] = vatmos(acalt)
+        # Atmosphere (vatmos returns p, rho, T; the single create used to
+        # assign these in the order T, rho, p until the next update)
+        self.p[-n:], self.rho[-n:], self.Temp[-n:] = vatmos(acalt)
 
         # Wind
         if self.wind.winddim > 0:
-            vnwnd, vewnd     = self.wind.getdata(self.lat[-1], self.lon[-1], self.alt[-1])
-            self.gsnorth[-1] = self.gsnorth[-1] + vnwnd
-            self.gseast[-1]  = self.gseast[-1]  + vewnd
-            self.trk[-1]     = np.degrees(np.arctan2(self.gseast[-1], self.gsnorth[-1]))
-            self.gs[-1]      = np.sqrt(self.gsnorth[-1]**2 + self.gseast[-1]**2)
+            vnwnd, vewnd      = self.wind.getdata(aclat, aclon, acalt)
+            self.gsnorth[-n:] = self.gsnorth[-n:] + vnwnd
+            self.gseast[-n:]  = self.gseast[-n:]  + vewnd
+            self.trk[-n:]     = np.degrees(np.arctan2(self.gseast[-n:], self.gsnorth[-n:]))
+            self.gs[-n:]      = np.sqrt(self.gsnorth[-n:]**2 + self.gseast[-n:]**2)
 
         # Traffic performance data
         #(temporarily default values)
-        self.avsdef[-1] = 1500. * fpm   # default vertical speed of autopilot
-        self.aphi[-1]   = radians(25.)  # bank angle setting of autopilot
-        self.ax[-1]     = kts           # absolute value of longitudinal accelleration
-        self.bank[-1]   = radians(25.)
+        self.avsdef[-n:] = 1500. * fpm   # default vertical speed of autopilot
+        self.aphi[-n:]   = radians(25.)  # bank angle setting of autopilot
+        self.ax[-n:]     = kts           # absolute value of longitudinal accelleration
+        self.bank[-n:]   = radians(25.)
 
         # Crossover altitude
-        self.abco[-1]   = 0  # not necessary to overwrite 0 to 0, but leave for clarity
-        self.belco[-1]  = 1
+        self.abco[-n:]   = 0  # not necessary to overwrite 0 to 0, but leave for clarity
+        self.belco[-n:]  = 1
 
         # Traffic autopilot settings
-        self.aspd[-1]  = self.cas[-1]
-        self.aptas[-1] = self.tas[-1]
-        self.apalt[-1] = self.alt[-1]
+        self.aspd[-n:]  = self.cas[-n:]
+        self.aptas[-n:] = self.tas[-n:]
+        self.apalt[-n:] = self.alt[-n:]
 
         # Display information on label
-        self.label[-1] = ['', '', '', 0]
+        self.label[-n:] = [['', '', '', 0] for i in range(n)]
 
         # Miscallaneous
-        self.coslat[-1] = cos(radians(aclat))  # Cosine of latitude for flat-earth aproximations
-        self.eps[-1] = 0.01
+        self.coslat[-n:] = np.cos(np.radians(aclat))  # Cosine of latitude for flat-earth aproximations
+        self.eps[-n:] = 0.01
 
         # ----- Submodules of Traffic -----
-        self.ap.create()
-        self.actwp.create()
-        self.pilot.create()
-        self.adsb.create()
-        self.area.create()
-        self.asas.create()
-        self.perf.create()
-        self.trails.create()
-
+        self.ap.create(n)
+        self.actwp.create(n)
+        self.pilot.create(n)
+        self.adsb.create(n)
+        self.area.create(n)
+        self.asas.create(n)
+        self.perf.create(n)
+        self.trails.create(n)
+
+        # Move the new aircraft into the free slots of deleted aircraft
+        nfree = min(n, len(self.freeslots))
+        if nfree > 0:
+            src = np.arange(self.ntraf - nfree, self.ntraf)
+            dst = np.array(self.freeslots[-nfree:])
+            del self.freeslots[-nfree:]
+
+            self.moveslots(src, dst)
+            self.perf.moveslots(src, dst)
+            self.area.moveslots(src, dst)
+            self.removeslots(src)
+            for i in dst:
+                self.idmap[self.id[i]] = i
+
+        if skip:
+            return True, ", ".join(skip) + " already exist."
         return True
 
     def delete(self, acid):
@@ -276,104 +369,255 @@ class Traffic(DynamicArrays):
         # Do nothing if not found
         if idx < 0:
             return False
+
+        return self.delete_many([idx])
+
+    def delete_many(self, idx):
+        """Delete the aircraft with indices idx in one pass"""
+        # Sorted and without duplicates, skip slots that are already free
+        idx = np.unique(np.asarray(idx, dtype=int))
+        idx = idx[self.active[idx]]
+        if len(idx) == 0:
+            return False
+
+        for i in idx:
+            del self.idmap[self.id[i]]
+
+        if not settings.traf_slots:
+            self.removeslots(idx)
+            return True
+
+        # Slot mode: only mark the slots as free, they are reused by create_many
+        self.active[idx]      = False
+        self.asas.active[idx] = False
+        for i in idx:
+            self.id[i] = ""
+        self.freeslots.extend(idx)
+
+        # Compact the arrays when too many slots are free
+        if len(self.freeslots) > settings.traf_compact * self.ntraf:
+            self.removeslots(np.sort(self.freeslots))
+            self.freeslots = []
+        return True
+
+    def removeslots(self, idx):
+        """Remove slots idx (sorted array) from all traffic arrays"""
         # Decrease number of aircraft
-        self.ntraf = self.ntraf - 1
+        self.ntraf = self.ntraf - len(idx)
 
         # Delete all aircraft parameters
         super(Traffic, self).delete(idx)
 
+        # Aircraft after the first deleted one have moved
+        for i in xrange(idx[0], self.ntraf):
+            if self.active[i]:
+                self.idmap[self.id[i]] = i
+
         # ----- Submodules of Traffic -----
         self.perf.delete(idx)
         self.area.delete(idx)
-        return True
 
     def update(self, simt, simdt):
         # Update only if there is traffic ---------------------
         if self.ntraf == 0:
             return
 
+        # Store a frame of the state for REWIND when it is time
+        with profiler.stage("rewind"):
+            self.rewind.update(simt)
+
+        # Keep the current arrays, to find the ones replaced during this update
+        if self.swallocstat:
+            arrays = self.arrays()
+            before = set(id(arr) for arr in arrays)
+
         #---------- Atmosphere --------------------------------
-        self.p, self.rho, self.Temp = vatmos(self.alt)
+        with profiler.stage("atmos"):
+            self.UpdateAtmosphere()
 
         #---------- ADSB Update -------------------------------
-        self.adsb.update(simt)
+        with profiler.stage("adsb"):
+            self.adsb.update(simt)
 
         #---------- Fly the Aircraft --------------------------
-        self.ap.update(simt)
-        self.asas.update(simt)
-        self.pilot.FMSOrAsas()
+        with profiler.stage("ap"):
+            self.ap.update(simt)
+        with profiler.stage("asas"):
+            self.asas.update(simt)
+        with profiler.stage("pilot"):
+            self.pilot.FMSOrAsas()
 
-        #---------- Limit Speeds ------------------------------
-        self.pilot.FlightEnvelope()
+            #---------- Limit Speeds --------------------------
+            self.pilot.FlightEnvelope()
 
         #---------- Kinematics --------------------------------
-        self.UpdateAirSpeed(simdt, simt)
-        self.UpdateGroundSpeed(simdt)
-        self.UpdatePosition(simdt)
+        with profiler.stage("kinematics"):
+            self.UpdateAirSpeed(simdt, simt)
+            self.UpdateGroundSpeed(simdt)
+            self.UpdatePosition(simdt)
 
         #---------- Performance Update ------------------------
-        self.perf.perf(simt)
+        with profiler.stage("perf"):
+            self.perf.perf(simt)
 
         #---------- Simulate Turbulence -----------------------
-        self.Turbulence.Woosh(simdt)
+        with profiler.stage("turbulence"):
+            self.Turbulence.Woosh(simdt)
 
         #---------- Aftermath ---------------------------------
-        self.trails.update(simt)
-        self.area.check(simt)
+        with profiler.stage("trails"):
+            self.trails.update(simt)
+        with profiler.stage("area"):
+            self.area.check(simt)
+
+        if self.swallocstat:
+            self.allocbytes = sum(arr.nbytes for arr in self.arrays()
+                                  if id(arr) not in before)
         return
 
+    def arrays(self):
+        """All numpy arrays of traffic and its submodules"""
+        modules = [self, self.asas, self.ap, self.pilot, self.adsb, self.trails,
+                   self.actwp, self.perf, self.area]
+        return [value for module in modules for value in module.__dict__.itervalues()
+                if type(value) == np.ndarray]
+
+    # The kinematics below are computed in place with ufunc out= arguments and
+    # the scratch buffers tmp1 and tmp2, so no new arrays are allocated per
+    # update. The order of operations is the same as in the aero functions, so
+    # the results are identical.
+
+    def UpdateAtmosphere(self):
+        vatmos(self.alt, out=(self.p, self.rho, self.Temp))
+
     def UpdateAirSpeed(self, simdt, simt):
+        tmp1, tmp2 = self.tmp1, self.tmp2
+
         # Acceleration
-        self.delspd = self.pilot.spd - self.tas
-        swspdsel = np.abs(self.delspd) > 0.4  # <1 kts = 0.514444 m/s
+        np.subtract(self.pilot.spd, self.tas, out=self.delspd)
+        np.abs(self.delspd, out=tmp1)
+        np.greater(tmp1, 0.4, out=self.swspdsel)  # <1 kts = 0.514444 m/s
         ax = self.perf.acceleration(simdt)
 
         # Update velocities
-        self.tas = self.tas + swspdsel * ax * np.sign(self.delspd) * simdt
-        self.cas = vtas2cas(self.tas, self.alt)
-        self.M   = vtas2mach(self.tas, self.alt)
+        np.multiply(self.swspdsel, ax, out=tmp1)
+        np.sign(self.delspd, out=tmp2)
+        tmp1 *= tmp2
+        tmp1 *= simdt
+        self.tas += tmp1
+
+        # CAS (vtas2cas) and Mach (vtas2mach) with the atmosphere of this update
+        np.multiply(self.rho, self.tas, out=tmp1)
+        tmp1 *= self.tas
+        np.multiply(7., self.p, out=tmp2)
+        tmp1 /= tmp2
+        tmp1 += 1.
+        tmp1 **= 3.5
+        tmp1 -= 1.
+        tmp1 *= self.p
+        tmp1 /= p0
+        tmp1 += 1.
+        tmp1 **= 2. / 7.
+        tmp1 -= 1.
+        tmp1 *= 7. * p0 / rho0
+        np.sqrt(tmp1, out=self.cas)
+
+        np.multiply(gamma * R, self.Temp, out=tmp1)
+        np.sqrt(tmp1, out=tmp1)
+        np.divide(self.tas, tmp1, out=self.M)
 
         # Turning
-        turnrate = np.degrees(g0 * np.tan(self.bank) / np.maximum(self.tas, self.eps))
-        delhdg   = (self.pilot.hdg - self.hdg + 180.) % 360 - 180.  # [deg]
-        self.hdgsel = np.abs(delhdg) > np.abs(2. * simdt * turnrate)
+        np.tan(self.bank, out=tmp1)
+        tmp1 *= g0
+        np.maximum(self.tas, self.eps, out=tmp2)
+        tmp1 /= tmp2
+        np.degrees(tmp1, out=self.turnrate)
+
+        np.subtract(self.pilot.hdg, self.hdg, out=tmp1)
+        tmp1 += 180.
+        np.remainder(tmp1, 360., out=tmp1)
+        np.subtract(tmp1, 180., out=self.delhdg)  # [deg]
+
+        np.multiply(2. * simdt, self.turnrate, out=tmp2)
+        np.abs(tmp2, out=tmp2)
+        np.abs(self.delhdg, out=tmp1)
+        np.greater(tmp1, tmp2, out=self.hdgsel)
 
         # Update heading
-        self.hdg = (self.hdg + simdt * turnrate * self.hdgsel * np.sign(delhdg)) % 360.
+        np.multiply(simdt, self.turnrate, out=tmp1)
+        tmp1 *= self.hdgsel
+        np.sign(self.delhdg, out=tmp2)
+        tmp1 *= tmp2
+        tmp1 += self.hdg
+        np.remainder(tmp1, 360., out=self.hdg)
 
         # Update vertical speed
-        delalt   = self.pilot.alt - self.alt
-        self.swaltsel = np.abs(delalt) > np.maximum(10 * ft, np.abs(2 * simdt * np.abs(self.vs)))
-        self.vs  = self.swaltsel * np.sign(delalt) * self.pilot.vs
+        np.abs(self.vs, out=tmp1)
+        tmp1 *= 2 * simdt
+        np.abs(tmp1, out=tmp1)
+        np.maximum(10 * ft, tmp1, out=tmp1)
+        np.subtract(self.pilot.alt, self.alt, out=tmp2)  # delalt
+        np.sign(tmp2, out=self.vs)
+        np.abs(tmp2, out=tmp2)
+        np.greater(tmp2, tmp1, out=self.swaltsel)
+        self.vs *= self.swaltsel
+        self.vs *= self.pilot.vs
 
     def UpdateGroundSpeed(self, simdt):
+        tmp1, tmp2 = self.tmp1, self.tmp2
+
         # Compute ground speed and track from heading, airspeed and wind
-        if self.wind.winddim == 0:  # no wind
-            self.gsnorth  = self.tas * np.cos(np.radians(self.hdg))
-            self.gseast   = self.tas * np.sin(np.radians(self.hdg))
+        np.radians(self.hdg, out=tmp1)
+        np.cos(tmp1, out=tmp2)
+        np.multiply(self.tas, tmp2, out=self.gsnorth)
+        np.sin(tmp1, out=tmp2)
+        np.multiply(self.tas, tmp2, out=self.gseast)
 
-            self.gs  = self.tas
-            self.trk = self.hdg
+        if self.wind.winddim == 0:  # no wind
+            self.gs[:]  = self.tas
+            self.trk[:] = self.hdg
 
         else:
             windnorth, windeast = self.wind.getdata(self.lat, self.lon, self.alt)
-            self.gsnorth  = self.tas * np.cos(np.radians(self.hdg)) + windnorth
-            self.gseast   = self.tas * np.sin(np.radians(self.hdg)) + windeast
+            self.gsnorth += windnorth
+            self.gseast  += windeast
 
-            self.gs  = np.sqrt(self.gsnorth**2 + self.gseast**2)
-            self.trk = np.degrees(np.arctan2(self.gseast, self.gsnorth)) % 360.
+            np.square(self.gsnorth, out=tmp1)
+            np.square(self.gseast, out=tmp2)
+            tmp1 += tmp2
+            np.sqrt(tmp1, out=self.gs)
+
+            np.arctan2(self.gseast, self.gsnorth, out=tmp1)
+            np.degrees(tmp1, out=tmp1)
+            np.remainder(tmp1, 360., out=self.trk)
 
     def UpdatePosition(self, simdt):
+        tmp1 = self.tmp1
+
         # Update position
-        self.alt = np.where(self.swaltsel, self.alt + self.vs * simdt, self.pilot.alt)
-        self.lat = self.lat + np.degrees(simdt * self.gsnorth / Rearth)
-        self.coslat = np.cos(np.deg2rad(self.lat))
-        self.lon = self.lon + np.degrees(simdt * self.gseast / self.coslat / Rearth)
+        np.multiply(self.vs, simdt, out=tmp1)
+        tmp1 += self.alt
+        np.copyto(self.alt, self.pilot.alt)
+        np.copyto(self.alt, tmp1, where=self.swaltsel)
+
+        np.multiply(simdt, self.gsnorth, out=tmp1)
+        tmp1 /= Rearth
+        np.degrees(tmp1, out=tmp1)
+        self.lat += tmp1
+
+        np.deg2rad(self.lat, out=tmp1)
+        np.cos(tmp1, out=self.coslat)
+
+        np.multiply(simdt, self.gseast, out=tmp1)
+        tmp1 /= self.coslat
+        tmp1 /= Rearth
+        np.degrees(tmp1, out=tmp1)
+        self.lon += tmp1
 
     def id2idx(self, acid):
         """Find index of aircraft id"""
         try:
-            return self.id.index(acid.upper())
+            return self.idmap.get(acid.upper(), -1)
         except:
             return -1
 
@@ -395,6 +639,9 @@ class Traffic(DynamicArrays):
         self.lat[idx]      = lat
         self.lon[idx]      = lon
 
+        # Jump in position: new schedule for the adaptive CD
+        self.asas.schedule = None
+
         if alt:
             self.alt[idx]   = alt
             self.apalt[idx] = alt
@@ -415,7 +662,7 @@ class Traffic(DynamicArrays):
         self.ax[idx] = kts
 
     def acinfo(self, acid):
-        idx           = self.id.index(acid)
+        idx           = self.id2idx(acid)
         actype        = self.type[idx]
         lat, lon      = self.lat[idx], self.lon[idx]
         alt, hdg, trk = self.alt[idx] / ft, self.hdg[idx], round(self.trk[idx])
@@ -56,24 +56,24 @@ class Trails(DynamicArrays):
             self.lasttim = np.array([])
         return
 
-    def create(self):
-        super(Trails, self).create()
+    def create(self, n=1):
+        super(Trails, self).create(n)
 
-        self.accolor[-1] = self.defcolor
-        self.lastlat[-1] = self.traf.lat[-1]
-        self.lastlon[-1] = self.traf.lon[-1]
+        self.accolor[-n:] = [self.defcolor] * n
+        self.lastlat[-n:] = self.traf.lat[-n:]
+        self.lastlon[-n:] = self.traf.lon[-n:]
 
     def update(self, t):
         if not self.active:
-            self.lastlat = self.traf.lat
-            self.lastlon = self.traf.lon
+            self.lastlat[:] = self.traf.lat
+            self.lastlon[:] = self.traf.lon
             self.lasttim[:] = t
             return
         """Add linepieces for trails based on traffic data"""
 
         # Check for update
         delta = t - self.lasttim
-        idxs = np.where(delta > self.dt)[0]
+        idxs = np.where((delta > self.dt) * self.traf.active)[0]
 
         # Use temporary list for fast append
         lstlat0 = []
@@ -35,6 +35,6 @@ class Turbulence:
 		turblon=np.sin(trkrad)*turbhf+np.cos(trkrad)*turbhw #[m]
 
 		# Update the aircraft locations
-		self.traf.alt = self.traf.alt + turbalt
-		self.traf.lat = self.traf.lat + np.degrees(turblat/Rearth)
-		self.traf.lon = self.traf.lon + np.degrees(turblon/Rearth/self.traf.coslat)
\ No newline at end of file
+		self.traf.alt += turbalt
+		self.traf.lat += np.degrees(turblat/Rearth)
+		self.traf.lon += np.degrees(turblon/Rearth/self.traf.coslat)
\ No newline at end of file
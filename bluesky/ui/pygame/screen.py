@@ -611,7 +611,8 @@ class Screen:
 
             # Select which aircraft are within screen area
             trafsel = np.where((traf.lat > self.lat0) * (traf.lat < self.lat1) * \
-                               (traf.lon > self.lon0) * (traf.lon < self.lon1))[0]
+                               (traf.lon > self.lon0) * (traf.lon < self.lon1) * \
+                               traf.active)[0]
 
             # ------------------- Draw aircraft -------------------
             # Convert lat,lon to x,y
@@ -811,11 +812,11 @@ class Screen:
             self.fontsys.printat(self.win, 10+240, 2, \
                                  "#LOS      = " + str(len(traf.asas.LOSlist_now)))
             self.fontsys.printat(self.win, 10+240, 18, \
-                                 "Total LOS = " + str(len(traf.asas.LOSlist_all)))
+                                 "Total LOS = " + str(traf.asas.nlos_tot))
             self.fontsys.printat(self.win, 10+240, 34, \
                                  "#Con      = " + str(len(traf.asas.conflist_now)))
             self.fontsys.printat(self.win, 10+240, 50, \
-                                 "Total Con = " + str(len(traf.asas.conflist_all)))                                 
+                                 "Total Con = " + str(traf.asas.nconf_tot))                                 
 
             # Frame ready, flip to screen
             pg.display.flip()
@@ -53,7 +53,7 @@ def radarclick(cmdline, lat, lon, traf, navdb):
 
     # -------- Process click --------
     # Double click on aircraft = POS command
-    if numargs == 0 and traf.id.count(cmd) > 0:
+    if numargs == 0 and traf.id2idx(cmd) >= 0:
         todisplay = "\n"          # Clear the current command
         tostack   = "POS " + cmd  # And send a pos command to the stack
 
@@ -106,8 +106,8 @@ def radarclick(cmdline, lat, lon, traf, navdb):
                         todisplay += navdb.aptid[idx] + " "
 
                 elif clicktype == "wpinroute": # Find nearets waypoint in route
-                    if traf.id.count(args[0]) > 0:
-                        itraf      = traf.id.index(args[0])
+                    itraf = traf.id2idx(args[0])
+                    if itraf >= 0:
                         reflat = traf.lat[itraf]
                         reflon = traf.lon[itraf]
                         synerr = False
@@ -140,8 +140,8 @@ def radarclick(cmdline, lat, lon, traf, navdb):
                         except:
                             synerr = True
                     else:
-                        if traf.id.count(args[0]) > 0:
-                            idx    = traf.id.index(args[0])
+                        idx = traf.id2idx(args[0])
+                        if idx >= 0:
                             reflat = traf.lat[idx]
                             reflon = traf.lon[idx]
                             synerr = False
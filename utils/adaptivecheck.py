@@ -0,0 +1,76 @@
+""" Check of the CD options that only leave out pairs (ASAS BROADPHASE and
+    ADAPTIVE, bluesky/traf/asas/StateBasedCD.py): the conflicts and the MVP
+    resolutions have to be the same as with all pairs checked.
+
+    Random traffic is flown with MVP for a number of ASAS intervals, with
+    both options on and off. At every interval the conflicting pairs,
+    tinconfmin and the resolutions are compared with those of the run with
+    both options off. The exit status is 1 if any of them differs.
+
+    Usage (from the BlueSky folder): python utils/adaptivecheck.py [ntraf] [nsteps]
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bluesky.traf import Traffic
+from bluesky.tools.aero import ft, kts
+
+dt = 0.5  # [s] time step of the traffic
+
+
+def randomtraffic(ntraf):
+    """ Traffic of ntraf aircraft in a 2 by 3 degree area """
+    traf = Traffic(None)  # No routes, so no navigation database
+    for k in range(ntraf):
+        traf.create("AC%04d" % k, "B744", np.random.uniform(52., 54.),
+                    np.random.uniform(4., 7.), np.random.uniform(0., 360.),
+                    np.random.uniform(20000., 24000.) * ft,
+                    np.random.uniform(250., 300.) * kts)
+    traf.vs[:] = np.random.choice([0., 0., 5., -5.], ntraf)
+    return traf
+
+
+def run(ntraf, nsteps, broadphase, adaptive):
+    """ Conflicting pairs and MVP state per ASAS interval """
+    np.random.seed(1)
+    traf   = randomtraffic(ntraf)
+    dbconf = traf.asas
+    dbconf.swbroadphase = broadphase
+    dbconf.swadaptive   = adaptive
+    dbconf.SetCRmethod("MVP")
+
+    results = []
+    simt = 0.0
+    for step in range(nsteps):
+        traf.adsb.update(simt)
+        dbconf.cd.detect(dbconf, traf, simt)
+        dbconf.cr.resolve(dbconf, traf)
+        results.append((sorted(zip(dbconf.iown, dbconf.ioth)),
+                        np.concatenate([dbconf.tinconfmin, dbconf.trk, dbconf.spd,
+                                        dbconf.vs, dbconf.alt])))
+        for k in range(int(round(dbconf.dtasas / dt))):
+            traf.update(simt, dt)
+            simt += dt
+    return results
+
+
+def main(ntraf, nsteps):
+    reference = run(ntraf, nsteps, False, False)
+    nfail = 0
+    for broadphase, adaptive in ((True, False), (False, True), (True, True)):
+        results = run(ntraf, nsteps, broadphase, adaptive)
+        npairs  = sum(len(pairs) for pairs, state in reference)
+        ndiffer = sum(pairs != refpairs or not np.array_equal(state, refstate)
+                      for (pairs, state), (refpairs, refstate) in zip(results, reference))
+        print "BROADPHASE %-3s ADAPTIVE %-3s %6d conflicts: %s" % \
+            ("ON" if broadphase else "OFF", "ON" if adaptive else "OFF", npairs,
+             "differ in %d of %d intervals" % (ndiffer, nsteps) if ndiffer else "identical")
+        nfail += ndiffer > 0
+    return 1 if nfail else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -0,0 +1,96 @@
+""" Parity check of the compiled conflict detection (casas.pairconflicts,
+    bluesky/traf/asas/casas/casas.cpp) against the Python version
+    (StateBasedCD.pairconflicts).
+
+    Both are run on the same random traffic, for both CD geometries: with
+    ideal ADS-B (symmetric, as detect does then), with ADS-B positions off
+    the true ones and with transmission noise. All output arrays have to be
+    identical: the exit status is 1 if any of them differs, or if casas is
+    not built.
+
+    Build casas first, in bluesky/traf/asas/casas:
+        python setup.py build_ext --inplace
+    and copy casas.so (casas.pyd) to bluesky/traf/asas. Then run it
+    (from the BlueSky folder): python utils/casasparity.py [ntraf]
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bluesky.traf import Traffic
+from bluesky.traf.asas import StateBasedCD
+from bluesky.tools.aero import ft, kts
+
+try:
+    from bluesky.traf.asas import casas
+except ImportError:
+    casas = None
+
+outputs = ("iown", "ioth", "qdr", "dist", "tcpa", "tinconf", "toutconf")
+
+
+def randomtraffic(ntraf):
+    """ Traffic of ntraf aircraft in a 4 by 6 degree area """
+    traf = Traffic(None)  # No routes, so no navigation database
+    for k in range(ntraf):
+        traf.create("AC%04d" % k, "B744", np.random.uniform(50., 54.),
+                    np.random.uniform(2., 8.), np.random.uniform(0., 360.),
+                    np.random.uniform(15000., 30000.) * ft,
+                    np.random.uniform(200., 300.) * kts)
+    traf.vs[:] = np.random.choice([0., 0., 10., -10.], ntraf)
+    return traf
+
+
+def compare(traf, geom, adsb):
+    """ Runs both versions on all pairs, returns the names of the differing
+        outputs and the number of conflicts """
+    dbconf = traf.asas
+    dbconf.cdgeom = geom
+    traf.adsb.transnoise = adsb == "noise"
+
+    # Intruder state as received through ADS-B
+    for name in ("lat", "lon", "alt", "trk", "tas", "gs", "vs"):
+        getattr(traf.adsb, name)[:] = getattr(traf, name)
+    if adsb == "offset":
+        traf.adsb.lat += np.random.normal(0., 0.01, traf.ntraf)
+        traf.adsb.lon += np.random.normal(0., 0.01, traf.ntraf)
+        traf.adsb.gs  += np.random.normal(0., 5., traf.ntraf)
+    symmetric = adsb == "ideal"
+
+    trkrad     = np.radians(traf.trk)
+    adsbtrkrad = np.radians(traf.adsb.trk)
+    own = (traf.gs * np.sin(trkrad), traf.gs * np.cos(trkrad),
+           traf.adsb.gs * np.sin(adsbtrkrad), traf.adsb.gs * np.cos(adsbtrkrad),
+           traf.adsb.alt)
+    i, j  = StateBasedCD.AllPairs(traf.ntraf, symmetric).rows(0, traf.ntraf)
+    noise = StateBasedCD.transnoise(traf, len(i))
+
+    results = [pairconflicts(dbconf, traf, i, j, own, noise, symmetric)
+               for pairconflicts in (StateBasedCD.pairconflicts, casas.pairconflicts)]
+
+    differ = [name for name, py, cpp in zip(outputs, *results)
+              if not np.array_equal(py, cpp)]
+    return differ, len(results[0][0])
+
+
+def main(ntraf):
+    if casas is None:
+        print "casas is not built (see bluesky/traf/asas/casas/setup.py)"
+        return 1
+
+    np.random.seed(1)
+    traf = randomtraffic(ntraf)
+
+    nfail = 0
+    for geom in ("WGS84", "FLAT"):
+        for adsb in ("ideal", "offset", "noise"):
+            differ, nconf = compare(traf, geom, adsb)
+            print "%-6s %-7s %6d conflicts: %s" % \
+                (geom, adsb, nconf, "differ in " + ", ".join(differ) if differ else "identical")
+            nfail += len(differ) > 0
+    return 1 if nfail else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
@@ -0,0 +1,135 @@
+""" Comparison of the conflict detection geometries (CDGEOM WGS84 and FLAT,
+    bluesky/traf/asas/StateBasedCD.py) on a scenario.
+
+    The aircraft of the CRE commands of the scenario fly without conflict
+    resolution, so both geometries see the same traffic. At every ASAS
+    interval the conflicts are detected with both geometries, and the pairs
+    found by only one of them and the differences of tcpa and dcpa of the
+    pairs found by both are printed. Other commands of the scenario are not
+    executed.
+
+    The exit status is 1 if the geometries differ by more than the
+    tolerances below: more than tol_only of the pairs found by only one
+    geometry, or a difference of tcpa or dcpa above tol_dtcpa or tol_ddcpa.
+    It is also 1 if the scenario creates no aircraft.
+
+    Usage (from the BlueSky folder):
+        python utils/cdgeomcompare.py scenario.scn [duration [s]] [dt [s]]
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bluesky.traf import Traffic
+from bluesky.traf.asas import StateBasedCD
+from bluesky.tools.aero import nm, ft, kts
+from bluesky.tools.misc import cmdsplit, txt2tim, txt2alt, txt2lat, txt2lon
+
+tol_only  = 0.01       # [-] fraction of the pairs found by only one geometry
+tol_dtcpa = 1.0        # [s] difference of tcpa of the pairs found by both
+tol_ddcpa = 0.01 * nm  # [m] difference of dcpa of the pairs found by both
+
+
+def readcreate(fname):
+    """ CRE commands of a scenario file, as (time, create arguments), sorted
+        on time. Also returns the number of other commands. """
+    commands = []
+    nother   = 0
+    for line in open(fname):
+        if line.strip()[:1] in ("", "#") or line.find(">") < 0:
+            continue
+        tim, cmdline = line.split(">", 1)
+        cmd, args = cmdsplit(cmdline)
+        if cmd.upper() not in ("CRE", "CREATE") or len(args) < 7:
+            nother += 1
+            continue
+        try:
+            # Arguments as converted by the stack (lat/lon in degrees only)
+            spd = float(args[6].upper().replace("M", ".").replace("..", "."))
+            if not 0.1 < spd < 1.0:
+                spd *= kts
+            commands.append((txt2tim(tim), (args[0].upper(), args[1].upper(),
+                             txt2lat(args[2]), txt2lon(args[3]),
+                             float(args[4]), txt2alt(args[5]) * ft, spd)))
+        except ValueError:
+            nother += 1
+    commands.sort(key=lambda command: command[0])
+    return commands, nother
+
+
+def conflicts(traf, simt, geom):
+    """ Conflicting pairs with their tcpa [s] and dcpa [m], for geometry geom """
+    dbconf = traf.asas
+    dbconf.cdgeom = geom
+    StateBasedCD.detect(dbconf, traf, simt)
+
+    # Relative position of the intruder at CPA, from the detected geometry
+    qdrrad = np.radians(dbconf.qdr)
+    trkrad = np.radians(traf.trk)
+    u  = traf.gs * np.sin(trkrad)
+    v  = traf.gs * np.cos(trkrad)
+    dx = dbconf.dist * np.sin(qdrrad) + (u[dbconf.ioth] - u[dbconf.iown]) * dbconf.tcpa
+    dy = dbconf.dist * np.cos(qdrrad) + (v[dbconf.ioth] - v[dbconf.iown]) * dbconf.tcpa
+    dcpa = np.sqrt(dx * dx + dy * dy)
+
+    return dict(((traf.id[i], traf.id[j]), (tcpa, d)) for i, j, tcpa, d in
+                zip(dbconf.iown, dbconf.ioth, dbconf.tcpa, dcpa))
+
+
+def main(fname, duration, dt):
+    commands, nother = readcreate(fname)
+    print "Scenario:  %s, %d aircraft (%d other commands not executed)" % \
+        (fname, len(commands), nother)
+    if not commands:
+        return 1
+
+    traf = Traffic(None)  # No routes, so no navigation database
+    traf.asas.SetCRmethod("OFF")  # No resolutions: the same traffic for both
+    traf.asas.swadaptive = False  # Check all pairs at every interval
+
+    print "%8s %7s %7s %7s %7s %12s %12s" % \
+        ("time", "WGS84", "FLAT", "only W", "only F", "max dtcpa", "max ddcpa")
+    npairs = [0, 0, 0, 0]
+    maxdiff = [0., 0.]
+    simt  = 0.0
+    tasas = 0.0
+    while simt <= duration:
+        while commands and commands[0][0] <= simt:
+            traf.create(*commands.pop(0)[1])
+
+        if simt >= tasas and traf.ntraf > 0:
+            tasas += traf.asas.dtasas
+            wgs  = conflicts(traf, simt, "WGS84")
+            flat = conflicts(traf, simt, "FLAT")
+            both = set(wgs) & set(flat)
+            dtcpa = max([abs(wgs[p][0] - flat[p][0]) for p in both] + [0.])
+            ddcpa = max([abs(wgs[p][1] - flat[p][1]) for p in both] + [0.])
+            print "%8.1f %7d %7d %7d %7d %10.3f s %9.4f nm" % \
+                (simt, len(wgs), len(flat), len(wgs) - len(both),
+                 len(flat) - len(both), dtcpa, ddcpa / nm)
+
+            for k, n in enumerate((len(wgs), len(flat), len(wgs) - len(both), len(flat) - len(both))):
+                npairs[k] += n
+            maxdiff = [max(maxdiff[0], dtcpa), max(maxdiff[1], ddcpa)]
+
+        traf.update(simt, dt)
+        simt += dt
+
+    print "%8s %7d %7d %7d %7d %10.3f s %9.4f nm" % \
+        (("total",) + tuple(npairs) + (maxdiff[0], maxdiff[1] / nm))
+
+    fail = npairs[2] + npairs[3] > tol_only * max(npairs[0], npairs[1]) or \
+        maxdiff[0] > tol_dtcpa or maxdiff[1] > tol_ddcpa
+    print "Geometries %swithin tolerances (%g of pairs, %g s, %g nm)" % \
+        ("NOT " if fail else "", tol_only, tol_dtcpa, tol_ddcpa / nm)
+    return 1 if fail else 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    sys.exit(main(sys.argv[1],
+                  float(sys.argv[2]) if len(sys.argv) > 2 else 300.,
+                  float(sys.argv[3]) if len(sys.argv) > 3 else 0.1))
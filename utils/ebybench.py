@@ -0,0 +1,128 @@
+""" Benchmark of the Eby conflict resolution (bluesky/traf/asas/Eby.py):
+    the vectorized Eby.resolution, which resolves all conflicts at once,
+    against the former scalar version, which resolved one conflict at a time.
+
+    Both resolve the conflicts that the CD detects in the same random
+    traffic: with ideal ADS-B each conflicting pair once, with the opposite
+    resolution for the intruder, and with transmission noise each conflict
+    record. The largest relative difference of the change in velocity per
+    aircraft is printed with the timings. The exit status is 1 if it is
+    larger than 1e-9.
+
+    Usage (from the BlueSky folder): python utils/ebybench.py [ntraf]
+"""
+import os
+import sys
+from timeit import default_timer as clock
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bluesky.traf import Traffic
+from bluesky.traf.asas import Eby
+from bluesky.tools.aero import ft, kts
+
+# Largest relative difference of the vectorized and scalar resolutions
+tolerance = 1e-9
+
+
+def randomtraffic(ntraf):
+    """ Traffic of ntraf aircraft in a 2 by 3 degree area """
+    traf = Traffic(None)  # No routes, so no navigation database
+    for k in range(ntraf):
+        traf.create("AC%04d" % k, "B744", np.random.uniform(52., 54.),
+                    np.random.uniform(4., 7.), np.random.uniform(0., 360.),
+                    np.random.uniform(20000., 24000.) * ft,
+                    np.random.uniform(250., 300.) * kts)
+    traf.vs[:] = np.random.choice([0., 0., 5., -5.], ntraf)
+    return traf
+
+
+def Eby_scalar(traf, dbconf, id1, id2, k):
+    """ Former scalar Eby_straight, for conflict k between id1 and id2 """
+    dist = dbconf.dist[k]
+    qdr  = np.radians(dbconf.qdr[k])
+    d = np.array([np.sin(qdr) * dist, np.cos(qdr) * dist, traf.alt[id2] - traf.alt[id1]])
+
+    t1 = np.radians(traf.trk[id1])
+    t2 = np.radians(traf.trk[id2])
+    v1 = np.array([np.sin(t1) * traf.tas[id1], np.cos(t1) * traf.tas[id1], traf.vs[id1]])
+    v2 = np.array([np.sin(t2) * traf.tas[id2], np.cos(t2) * traf.tas[id2], traf.vs[id2]])
+    v  = np.array(v2 - v1)
+
+    R2 = dbconf.Rm**2
+    d2 = np.dot(d, d)
+    v2 = np.dot(v, v)
+    dv = np.dot(d, v)
+
+    a = R2 * v2 - dv**2
+    b = 2 * dv * (R2 - d2)
+    c = R2 * d2 - d2**2
+    discrim = b**2 - 4 * a * c
+    if discrim < 0:
+        discrim = 0
+    time1 = (-b + np.sqrt(discrim)) / (2 * a)
+    time2 = (-b - np.sqrt(discrim)) / (2 * a)
+    tstar = min(abs(time1), abs(time2))
+
+    drelstar = d + v * tstar
+    dstarabs = np.linalg.norm(drelstar)
+    dif = 10 - dstarabs
+    if dif > 0:
+        vperp = np.array([-v[1], v[0], 0])
+        drelstar += dif * vperp / np.linalg.norm(vperp)
+        dstarabs = np.linalg.norm(drelstar)
+
+    i = dbconf.Rm - dstarabs
+    return i * drelstar / (dstarabs * tstar)
+
+
+def resolution_scalar(traf, dbconf):
+    """ Change in velocity per aircraft with the former scalar resolution, of
+        each detected pair once (in order of its first record) with ideal
+        ADS-B, and of each record otherwise """
+    symmetric = not traf.adsb.truncated and not traf.adsb.transnoise
+    dv = np.zeros((traf.ntraf, 3))
+    solved = set()
+    for k in range(dbconf.nconf):
+        id1, id2 = dbconf.iown[k], dbconf.ioth[k]
+        if symmetric:
+            if (id2, id1) in solved:
+                continue
+            solved.add((id1, id2))
+        dv_eby = Eby_scalar(traf, dbconf, id1, id2, k)
+        dv[id1] -= dv_eby
+        if symmetric:
+            dv[id2] += dv_eby
+    return dv
+
+
+def main(ntraf):
+    np.random.seed(1)
+    traf = randomtraffic(ntraf)
+    dbconf = traf.asas
+
+    nfail = 0
+    for noise in (False, True):
+        traf.adsb.transnoise = noise
+        for name in ("lat", "lon", "alt", "trk", "tas", "gs", "vs"):
+            getattr(traf.adsb, name)[:] = getattr(traf, name)
+        dbconf.cd.detect(dbconf, traf, 0.)
+
+        t0 = clock()
+        dv_scalar = resolution_scalar(traf, dbconf)
+        t1 = clock()
+        dv_vector = Eby.resolution(dbconf, traf)
+        t2 = clock()
+
+        error = np.abs(dv_vector - dv_scalar).max() / max(np.abs(dv_scalar).max(), 1e-9)
+        print "ADS-B:               %s" % ("noise" if noise else "ideal")
+        print "Conflict records:    %d" % dbconf.nconf
+        print "Scalar Eby:          %.4f s" % (t1 - t0)
+        print "Vectorized Eby:      %.4f s (%.0f times faster)" % (t2 - t1, (t1 - t0) / max(t2 - t1, 1e-9))
+        print "Max relative diff.:  %.1e%s" % (error, "" if error <= tolerance else " (too large)")
+        nfail += not error <= tolerance
+    return 1 if nfail else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
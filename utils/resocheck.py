@@ -0,0 +1,93 @@
+""" Check of the vectorized conflict resolution methods (MVP and EBY,
+    bluesky/traf/asas): every conflicting pair of the CD gets a resolution.
+
+    On random traffic, the pairs for which MVP.MVP and Eby.Eby_straight
+    compute a resolution are compared with the conflicting pairs of the CD:
+    with ideal ADS-B each pair once, whichever of its records (i, j) and
+    (j, i) are detected, and otherwise each record. The traffic is checked
+    with spread altitudes and on flight levels 1000 ft apart, and with
+    transmission noise. The exit status is 1 if a pair is not resolved or
+    resolved twice, or if a resolution is not finite.
+
+    Usage (from the BlueSky folder): python utils/resocheck.py [ntraf]
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bluesky.traf import Traffic
+from bluesky.traf.asas import MVP, Eby
+from bluesky.tools.aero import ft, kts
+
+# Resolutions computed by the CR method: (id1, id2, dv) of each call
+resolved = []
+
+
+def recorded(function):
+    """ Resolution function that also records its pairs and resolutions """
+    def resolution(traf, dbconf, id1, id2, k):
+        dv = function(traf, dbconf, id1, id2, k)
+        resolved.append((id1, id2, dv))
+        return dv
+    return resolution
+
+
+MVP.MVP           = recorded(MVP.MVP)
+Eby.Eby_straight  = recorded(Eby.Eby_straight)
+
+
+def randomtraffic(ntraf, levels):
+    """ Traffic of ntraf aircraft in a 2 by 3 degree area, with spread
+        altitudes or on flight levels """
+    traf = Traffic(None)  # No routes, so no navigation database
+    for k in range(ntraf):
+        alt = np.random.randint(200, 240) * 100. if levels else np.random.uniform(20000., 24000.)
+        traf.create("AC%04d" % k, "B744", np.random.uniform(52., 54.),
+                    np.random.uniform(4., 7.), np.random.uniform(0., 360.),
+                    alt * ft, np.random.uniform(250., 300.) * kts)
+    traf.vs[:] = np.random.choice([0., 0., 5., -5.], ntraf)
+    return traf
+
+
+def check(traf, method, noise):
+    """ Detects and resolves the conflicts, returns the number of detected
+        pairs and the numbers of those not resolved and resolved twice """
+    dbconf = traf.asas
+    dbconf.SetCRmethod(method)
+    traf.adsb.transnoise = noise
+    for name in ("lat", "lon", "alt", "trk", "tas", "gs", "vs"):
+        getattr(traf.adsb, name)[:] = getattr(traf, name)
+    symmetric = not traf.adsb.truncated and not traf.adsb.transnoise
+
+    del resolved[:]
+    dbconf.cd.detect(dbconf, traf, 0.)
+    dbconf.cr.resolve(dbconf, traf)
+
+    def pair(i, j):
+        return frozenset((i, j)) if symmetric else (i, j)
+
+    detected = set(pair(i, j) for i, j in zip(dbconf.iown, dbconf.ioth))
+    pairs    = [pair(i, j) for id1, id2, dv in resolved for i, j in zip(id1, id2)]
+    finite   = all(np.isfinite(dv).all() for id1, id2, dv in resolved)
+    return len(detected), len(detected - set(pairs)), len(pairs) - len(set(pairs)), finite
+
+
+def main(ntraf):
+    nfail = 0
+    for levels in (False, True):
+        np.random.seed(1)
+        traf = randomtraffic(ntraf, levels)
+        for method in ("MVP", "EBY"):
+            for noise in (False, True):
+                npairs, nmissing, ntwice, finite = check(traf, method, noise)
+                fail = nmissing > 0 or ntwice > 0 or not finite
+                print "%-6s %-3s %-6s %6d pairs: %d not resolved, %d resolved twice%s" % \
+                    ("levels" if levels else "spread", method, "noise" if noise else "ideal",
+                     npairs, nmissing, ntwice, "" if finite else ", not finite")
+                nfail += fail
+    return 1 if nfail else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))